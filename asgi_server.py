@@ -0,0 +1,380 @@
+import asyncio
+import json
+import os
+import pickle
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+import journal
+import metrics
+from lobby import Lobby
+from uno import Game, Player
+from views import (
+  MoveError, apply_moves, json_body, legal_moves_json, lobby_json, move_request, moves_json,
+  play_from_request, player_json, players_from_request, plays_since, public_info_json
+)
+
+# Same routes as webserver.py on asyncio, for any ASGI server, e.g.:
+#
+#   uvicorn asgi_server:app --port 8000
+#
+# Everything runs on one event loop thread, moves on a game are serialized by
+# that game's asyncio lock and waiting clients are woken up as soon as it moves.
+
+LONG_POLL_TIMEOUT = 30
+# Comment lines sent on idle event streams, so proxies keep them open.
+KEEPALIVE_INTERVAL = 15
+JOURNAL_DIR = os.environ.get('PYUNO_JOURNAL_DIR')
+METRICS_ENABLED = os.environ.get('PYUNO_METRICS', '1') != '0'
+
+class HTTPError(Exception):
+  def __init__(self, status: int) -> None:
+    super().__init__(status)
+    self.status = status
+
+class GameEntry(object):
+  def __init__(self, game: Game) -> None:
+    self.game     = game
+    self.lock     = asyncio.Lock()
+    self.views    = {}
+    self._changed = asyncio.Event()
+
+  def notify(self):
+    # Wakes up everyone waiting, the next waiters get a fresh event.
+    LOBBY.update(self.game)
+    self._changed.set()
+    self._changed = asyncio.Event()
+
+  def cached(self, key, build: Callable[[], bytes]) -> bytes:
+    version = self.game.version
+    cached = self.views.get(key)
+    if cached is None or cached[0] != version:
+      cached = (version, build())
+      self.views[key] = cached
+
+    return cached[1]
+
+  def public_json(self, compact: bool = False) -> bytes:
+    return self.cached(('public', compact), lambda: metrics.time_call(metrics.SERIALIZE, ('public',), public_info_json, self.game, compact))
+
+  async def wait_for_version(self, version: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while self.game.version <= version:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        return False
+
+      try:
+        await asyncio.wait_for(self._changed.wait(), remaining)
+      except asyncio.TimeoutError:
+        return False
+
+    return True
+
+GAMES: Dict[str, GameEntry] = {}
+LOBBY = Lobby()
+JOURNAL: Optional[journal.Journal] = None
+
+class Request(object):
+  def __init__(self, scope: dict, receive: Callable[[], Awaitable[dict]]) -> None:
+    self.scope   = scope
+    self.receive = receive
+    self.args    = {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+    self.headers = {k.decode().lower(): v.decode() for k, v in scope.get('headers', [])}
+    # Pattern of the matched route, the metrics label.
+    self.route   = 'unmatched'
+
+  def arg(self, name: str, default=None, type: Callable = str):
+    try:
+      return type(self.args[name])
+    except (KeyError, ValueError):
+      return default
+
+  @property
+  def compact(self) -> bool:
+    # ?format=compact sends cards as [ordinal, code] pairs.
+    return self.args.get('format') == 'compact'
+
+  async def json(self) -> dict:
+    body = b''
+    more_body = True
+    while more_body:
+      message = await self.receive()
+      body += message.get('body', b'')
+      more_body = message.get('more_body', False)
+
+    try:
+      return json.loads(body)
+    except ValueError:
+      raise HTTPError(400)
+
+  async def wait_disconnect(self):
+    while (await self.receive())['type'] != 'http.disconnect':
+      pass
+
+class Response(object):
+  def __init__(self, body: bytes = b'', status: int = 200, headers: List[tuple] = None) -> None:
+    self.body    = body
+    self.status  = status
+    self.headers = headers if headers is not None else [(b'content-type', b'application/json')]
+
+  async def send(self, send: Callable[[dict], Awaitable[None]]):
+    await send({'type': 'http.response.start', 'status': self.status, 'headers': self.headers})
+    await send({'type': 'http.response.body', 'body': self.body})
+
+class StreamingResponse(Response):
+  def __init__(self, stream: Callable, headers: List[tuple]) -> None:
+    super().__init__(headers=headers)
+    self.stream = stream
+
+  async def send(self, send: Callable[[dict], Awaitable[None]]):
+    await send({'type': 'http.response.start', 'status': self.status, 'headers': self.headers})
+    await self.stream(send)
+    await send({'type': 'http.response.body', 'body': b''})
+
+def json_response(view: dict, status: int = 200) -> Response:
+  return Response(json_body(view), status)
+
+def versioned_response(request: Request, entry: GameEntry, render: Callable[[], bytes]) -> Response:
+  etag = f'"{entry.game.version}"'
+  if request.headers.get('if-none-match') == etag:
+    return Response(status=304, headers=[(b'etag', etag.encode())])
+
+  return Response(render(), headers=[(b'content-type', b'application/json'), (b'etag', etag.encode())])
+
+def render_player(player: Player, compact: bool) -> bytes:
+  return metrics.time_call(metrics.SERIALIZE, ('player',), player_json, player, compact)
+
+def get_entry(game_id: str) -> GameEntry:
+  if game_id not in GAMES:
+    raise HTTPError(404)
+
+  return GAMES[game_id]
+
+async def hello(request: Request) -> Response:
+  try:
+    return Response(lobby_json(LOBBY, request.args))
+  except ValueError:
+    raise HTTPError(400)
+
+async def get_metrics(request: Request) -> Response:
+  games = lambda: (entry.game for entry in GAMES.values())
+  return Response(metrics.render(games, len(GAMES)).encode(), headers=[(b'content-type', b'text/plain; version=0.0.4')])
+
+async def set_metrics(request: Request) -> Response:
+  try:
+    enabled = (await request.json())['enabled']
+  except TypeError:
+    raise HTTPError(400)
+
+  if enabled:
+    metrics.enable()
+  else:
+    metrics.disable()
+
+  return json_response({'enabled': metrics.is_enabled()})
+
+async def get_game_public_info(request: Request, game_id: str) -> Response:
+  entry = get_entry(game_id)
+  since = request.arg('since', type=int)
+  delta = plays_since(entry.game, since, request.compact) if since is not None else None
+  if delta is not None:
+    return json_response(delta)
+
+  return versioned_response(request, entry, lambda: entry.public_json(request.compact))
+
+async def wait_game_change(request: Request, game_id: str) -> Response:
+  entry = get_entry(game_id)
+  version = request.arg('version', -1, type=int)
+  timeout = min(request.arg('timeout', LONG_POLL_TIMEOUT, type=float), LONG_POLL_TIMEOUT)
+
+  await entry.wait_for_version(version, timeout)
+  return Response(entry.public_json(request.compact))
+
+async def game_events(request: Request, game_id: str) -> Response:
+  # Server-Sent Events: the public view every time the game moves, until it is finished.
+  entry = get_entry(game_id)
+  version = request.arg('version', -1, type=int)
+
+  async def stream(send):
+    nonlocal version
+    disconnected = asyncio.ensure_future(request.wait_disconnect())
+    try:
+      while not disconnected.done():
+        if entry.game.version > version:
+          version = entry.game.version
+          event = b'id: ' + str(version).encode() + b'\ndata: ' + entry.public_json(request.compact) + b'\n\n'
+          await send({'type': 'http.response.body', 'body': event, 'more_body': True})
+          if entry.game.finished:
+            break
+
+        changed = asyncio.ensure_future(entry.wait_for_version(version, KEEPALIVE_INTERVAL))
+        await asyncio.wait([changed, disconnected], return_when=asyncio.FIRST_COMPLETED)
+        if not changed.done():
+          changed.cancel()
+        elif not changed.result() and not disconnected.done():
+          await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+    finally:
+      disconnected.cancel()
+
+  return StreamingResponse(stream, headers=[(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')])
+
+async def get_player_data(request: Request, game_id: str, player_id: str) -> Response:
+  entry = get_entry(game_id)
+  try:
+    player = entry.game.get_player_by_id(player_id)
+  except KeyError:
+    raise HTTPError(404)
+
+  compact = request.compact
+  return versioned_response(request, entry, lambda: entry.cached(('player', player_id, compact), lambda: render_player(player, compact)))
+
+async def get_legal_moves(request: Request, game_id: str, player_id: str) -> Response:
+  entry = get_entry(game_id)
+  try:
+    player = entry.game.get_player_by_id(player_id)
+  except KeyError:
+    raise HTTPError(404)
+
+  return versioned_response(request, entry, lambda: entry.cached(('moves', player_id), lambda: legal_moves_json(entry.game, player)))
+
+async def start_game(request: Request, game_id: str) -> Response:
+  players = players_from_request(await request.json())
+
+  created = game_id not in GAMES
+  if created:
+    GAMES[game_id] = GameEntry(Game(players, game_id))
+    LOBBY.update(GAMES[game_id].game)
+
+  entry = GAMES[game_id]
+  async with entry.lock:
+    game = entry.game
+    started = not game.started
+    game.start()
+    if started:
+      if JOURNAL is not None:
+        JOURNAL.record_start(game)
+        journal_snapshot()
+      entry.notify()
+
+  return json_response({"status": "created"} if created else {"status": "ok"})
+
+async def play(request: Request, game_id: str) -> Response:
+  entry = get_entry(game_id)
+  content = move_request(await request.json())
+
+  async with entry.lock:
+    game = entry.game
+    play = play_from_request(game, content['player_id'], content)
+    game.progress(play)
+    if JOURNAL is not None:
+      JOURNAL.record_play(game, play)
+      journal_snapshot()
+    entry.notify()
+
+  return json_response({"status": "ok"})
+
+async def moves(request: Request, game_id: str) -> Response:
+  entry = get_entry(game_id)
+  content = move_request(await request.json())
+  compact = request.compact
+
+  async with entry.lock:
+    game = entry.game
+    player_id = content['player_id']
+    plays = apply_moves(game, player_id, content['moves'])
+    if JOURNAL is not None:
+      for i, play in enumerate(plays):
+        JOURNAL.record_play(game, play, game.version - len(plays) + i + 1)
+      journal_snapshot()
+    entry.notify()
+
+    player = game.get_player_by_id(player_id)
+    body = moves_json(
+      entry.public_json(compact),
+      entry.cached(('player', player_id, compact), lambda: render_player(player, compact))
+    )
+
+  return Response(body)
+
+ROUTES = [
+  ('GET',  re.compile(r'^/$'), hello),
+  ('GET',  re.compile(r'^/metrics$'), get_metrics),
+  ('POST', re.compile(r'^/metrics$'), set_metrics),
+  ('GET',  re.compile(r'^/game/(?P<game_id>[^/]+)$'), get_game_public_info),
+  ('GET',  re.compile(r'^/game/(?P<game_id>[^/]+)/wait$'), wait_game_change),
+  ('GET',  re.compile(r'^/game/(?P<game_id>[^/]+)/events$'), game_events),
+  ('GET',  re.compile(r'^/game/(?P<game_id>[^/]+)/player/(?P<player_id>[^/]+)$'), get_player_data),
+  ('GET',  re.compile(r'^/game/(?P<game_id>[^/]+)/player/(?P<player_id>[^/]+)/moves$'), get_legal_moves),
+  ('POST', re.compile(r'^/game/(?P<game_id>[^/]+)/start$'), start_game),
+  ('POST', re.compile(r'^/game/(?P<game_id>[^/]+)/play$'), play),
+  ('POST', re.compile(r'^/game/(?P<game_id>[^/]+)/moves$'), moves),
+]
+
+async def dispatch(request: Request) -> Response:
+  path = request.scope['path']
+  method_allowed = False
+  for method, pattern, handler in ROUTES:
+    match = pattern.match(path)
+    if match is None:
+      continue
+    if method != request.scope['method']:
+      method_allowed = True
+      continue
+
+    request.route = pattern.pattern
+    return await handler(request, **match.groupdict())
+
+  raise HTTPError(405 if method_allowed else 404)
+
+def journal_snapshot():
+  # Nothing else runs on the loop meanwhile, so every game is pickled as is.
+  if JOURNAL.needs_snapshot():
+    JOURNAL.snapshot(lambda: ((game_id, pickle.dumps(entry.game, protocol=pickle.HIGHEST_PROTOCOL)) for game_id, entry in GAMES.items()))
+
+def open_journal(directory: str):
+  global JOURNAL
+  for game in journal.replay(directory).values():
+    GAMES[game.id] = GameEntry(game)
+    LOBBY.update(game)
+
+  JOURNAL = journal.Journal(directory)
+
+async def lifespan(receive, send):
+  while True:
+    message = await receive()
+    if message['type'] == 'lifespan.startup':
+      if JOURNAL_DIR is not None:
+        open_journal(JOURNAL_DIR)
+      if METRICS_ENABLED:
+        metrics.enable()
+      await send({'type': 'lifespan.startup.complete'})
+    elif message['type'] == 'lifespan.shutdown':
+      if JOURNAL is not None:
+        JOURNAL.close()
+      await send({'type': 'lifespan.shutdown.complete'})
+      return
+
+async def app(scope, receive, send):
+  if scope['type'] == 'lifespan':
+    return await lifespan(receive, send)
+
+  if scope['type'] != 'http':
+    return
+
+  request = Request(scope, receive)
+  start = time.perf_counter() if metrics.is_enabled() else None
+  try:
+    response = await dispatch(request)
+  except HTTPError as e:
+    response = json_response({'status': 'error'}, e.status)
+  except MoveError as e:
+    response = json_response({'status': 'error', 'message': str(e)}, e.status)
+  except (KeyError, ValueError) as e:
+    response = json_response({'status': 'error', 'message': str(e)}, 400)
+
+  await response.send(send)
+  if start is not None:
+    metrics.record_request(scope['method'], request.route, response.status, time.perf_counter() - start)
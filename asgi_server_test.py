@@ -0,0 +1,107 @@
+import asyncio
+import json
+import unittest
+
+import asgi_server
+
+START = {
+  'players': [
+    {'name': 'Player 1', 'color': 'red'},
+    {'name': 'Player 2', 'color': 'blue'}
+  ]
+}
+
+async def call(method: str, path: str, body: dict = None, query: str = '', headers: list = None) -> tuple:
+  messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}]
+  sent = []
+
+  async def receive():
+    if messages:
+      return messages.pop(0)
+    await asyncio.sleep(3600)
+
+  async def send(message):
+    sent.append(message)
+
+  scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(), 'headers': headers or []}
+  await asgi_server.app(scope, receive, send)
+
+  status = sent[0]['status']
+  content = b''.join(m.get('body', b'') for m in sent[1:])
+  return status, json.loads(content) if content else None
+
+def run(coroutine):
+  return asyncio.run(coroutine)
+
+class AsgiServerTest(unittest.TestCase):
+  def setUp(self):
+    asgi_server.GAMES.clear()
+
+  def test_startAndPlay(self):
+    async def scenario():
+      self.assertEqual(await call('POST', '/game/test/start', START), (200, {'status': 'created'}))
+      _, game = await call('GET', '/game/test')
+      status, _ = await call('POST', '/game/test/play', {'player_id': game['current_player'], 'action': 'pass', 'card_id': None, 'suit': None})
+      _, delta = await call('GET', '/game/test', query=f"since={game['version']}")
+      return status, delta
+
+    status, delta = run(scenario())
+    self.assertEqual(status, 200)
+    self.assertEqual([p['action'] for p in delta['plays']], ['pass'])
+
+  def test_moves(self):
+    async def scenario():
+      await call('POST', '/game/test/start', START)
+      _, game = await call('GET', '/game/test')
+      moves = [{'action': 'draw'}, {'action': 'pass'}]
+      return game, await call('POST', '/game/test/moves', {'player_id': game['current_player'], 'moves': moves}, query='format=compact')
+
+    game, (status, result) = run(scenario())
+    self.assertEqual(status, 200)
+    self.assertEqual(result['game']['version'], game['version'] + 2)
+    self.assertEqual(len(result['player']['hand']), 8)
+
+  def test_badRequest(self):
+    async def scenario():
+      await call('POST', '/game/test/start', START)
+      play, _ = await call('POST', '/game/test/play', [1])
+      moves, _ = await call('POST', '/game/test/moves', [{'action': 'draw'}])
+      missing_player, _ = await call('POST', '/game/test/moves', {'moves': [{'action': 'draw'}]})
+      metrics_switch, _ = await call('POST', '/metrics', [True])
+      return play, moves, missing_player, metrics_switch
+
+    self.assertEqual(run(scenario()), (400, 400, 400, 400))
+
+  def test_legalMoves(self):
+    async def scenario():
+      await call('POST', '/game/test/start', START)
+      _, game = await call('GET', '/game/test')
+      return await call('GET', f"/game/test/player/{game['current_player']}/moves")
+
+    status, moves = run(scenario())
+    self.assertEqual(status, 200)
+    self.assertEqual([m['action'] for m in moves['moves'][-2:]], ['draw', 'pass'])
+
+  def test_errors(self):
+    async def scenario():
+      await call('POST', '/game/test/start', START)
+      return [
+        (await call('GET', '/game/nope'))[0],
+        (await call('POST', '/game/test/play', {'player_id': 'nope', 'action': 'pass', 'card_id': None, 'suit': None}))[0],
+        (await call('GET', '/game/test', headers=[(b'if-none-match', b'"1"')]))[0],
+        (await call('DELETE', '/game/test'))[0]
+      ]
+
+    self.assertEqual(run(scenario()), [404, 403, 304, 405])
+
+  def test_wait_wokenUpByPlay(self):
+    async def scenario():
+      await call('POST', '/game/test/start', START)
+      _, game = await call('GET', '/game/test')
+      waiter = asyncio.ensure_future(call('GET', '/game/test/wait', query=f"version={game['version']}"))
+      await asyncio.sleep(0.01)
+      await call('POST', '/game/test/play', {'player_id': game['current_player'], 'action': 'pass', 'card_id': None, 'suit': None})
+      return game['version'], await asyncio.wait_for(waiter, 1)
+
+    version, (_, waited) = run(scenario())
+    self.assertEqual(waited['version'], version + 1)
@@ -0,0 +1,261 @@
+import argparse
+import itertools
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import metrics
+import views
+from journal import Journal
+from uno import Card, Deck, Game, Play, Player
+
+BASELINE_FILE = 'bench_baseline.json'
+BENCHMARKS: Dict[str, Callable] = {}
+
+def benchmark(name: str):
+  def register(setup: Callable):
+    BENCHMARKS[name] = setup
+    return setup
+  return register
+
+def new_game(num_players: int = 2) -> Game:
+  players = [Player(f"Player {i + 1}", 'red') for i in range(num_players)]
+  game = Game(players)
+  game.start()
+  return game
+
+# Each benchmark is a setup function returning the zero-argument callable to time,
+# so that state consumed by the operation is rebuilt outside of the measurement.
+# Callables return whatever they build so allocations can be counted.
+
+@benchmark('deck.init_shuffle')
+def bench_deck():
+  def run():
+    deck = Deck(half=False)
+    deck.shuffle()
+    return deck
+  return run
+
+@benchmark('game.start')
+def bench_game_start():
+  game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')])
+  return game.start
+
+@benchmark('game.progress.play')
+def bench_progress_play():
+  game = new_game()
+  player = game.get_current_player()
+  top = game.get_discard_top()
+  card = Card(top.value, top.suit)
+  player.hand.append(card)
+  play = Play(player, 'play', card=card)
+  return lambda: game.progress(play)
+
+@benchmark('game.progress.draw')
+def bench_progress_draw():
+  game = new_game()
+  play = Play(game.get_current_player(), 'draw')
+  return lambda: game.progress(play)
+
+@benchmark('game.progress.pass')
+def bench_progress_pass():
+  game = new_game()
+  play = Play(game.get_current_player(), 'pass')
+  return lambda: game.progress(play)
+
+@benchmark('game.progress.metrics')
+def bench_progress_instrumented():
+  # Same as game.progress.pass with the metrics wrapper, the difference is its overhead.
+  game = new_game()
+  play = Play(game.get_current_player(), 'pass')
+  progress = metrics.timed(Game.progress, metrics.PROGRESS, lambda game, play: (play.action,))
+  return lambda: progress(game, play)
+
+_journal = None
+_journal_dir = None
+
+def shared_journal() -> Journal:
+  global _journal, _journal_dir
+  if _journal is None:
+    _journal_dir = tempfile.TemporaryDirectory()
+    _journal = Journal(_journal_dir.name)
+  return _journal
+
+@benchmark('game.progress.journaled')
+def bench_progress_journaled():
+  game = new_game()
+  play = Play(game.get_current_player(), 'pass')
+  journal = shared_journal()
+  def run():
+    game.progress(play)
+    journal.record_play(game, play)
+  return run
+
+@benchmark('game.legal_moves')
+def bench_legal_moves():
+  game = new_game()
+  player = game.get_current_player()
+  return lambda: game.legal_moves(player)
+
+@benchmark('game.snapshot')
+def bench_snapshot():
+  return new_game().snapshot
+
+@benchmark('game.restore')
+def bench_restore():
+  game = new_game()
+  snapshot = game.snapshot()
+  return lambda: game.restore(snapshot)
+
+@benchmark('game.progress.snapshot')
+def bench_progress_snapshot():
+  # A move made on a snapshot, the game itself stays as it is.
+  game = new_game()
+  snapshot = game.snapshot()
+  play = Play(game.get_current_player(), 'pass')
+  return lambda: game.progress(play, snapshot)
+
+@benchmark('player.as_dict')
+def bench_player_as_dict():
+  player = new_game().players[0]
+  return player.as_dict
+
+@benchmark('player.json')
+def bench_player_json():
+  player = new_game().players[0]
+  return lambda: views.player_json(player)
+
+@benchmark('game.public_info_json')
+def bench_public_info_json():
+  game = new_game()
+  return lambda: views.public_info_json(game)
+
+@benchmark('card.from_dict')
+def bench_card_from_dict():
+  card_dicts = [c.as_dict() for c in new_game().players[0].hand]
+  return lambda: [Card.from_dict(card_dict) for card_dict in card_dicts]
+
+def _webserver_benchmarks():
+  try:
+    import webserver
+  except ImportError as e:
+    print(f"Skipping webserver benchmarks: {e}", file=sys.stderr)
+    return
+
+  # The server switches instrumentation on, the other benchmarks time the bare game.
+  metrics.disable()
+  client = webserver.app.test_client()
+  start_body = {'players': [{'name': 'Player 1', 'color': 'red'}, {'name': 'Player 2', 'color': 'blue'}]}
+
+  # measure builds a whole batch of setups before timing them, each gets a game
+  # of its own. Ids are reused once well past a batch, so games do not pile up.
+  game_numbers = itertools.count()
+
+  def new_server_game() -> Game:
+    game_id = f"bench-{next(game_numbers) % 1000}"
+    webserver.GAMES.remove(game_id)
+    client.post(f"/game/{game_id}/start", json=start_body)
+    return webserver.GAMES[game_id]
+
+  @benchmark('http.game')
+  def bench_http_game():
+    game = new_server_game()
+    return lambda: client.get(f"/game/{game.id}")
+
+  @benchmark('http.play')
+  def bench_http_play():
+    game = new_server_game()
+    player_id = game.get_current_player().id
+    return lambda: client.post(f"/game/{game.id}/play", json={'player_id': player_id, 'action': 'pass', 'card_id': None, 'suit': None})
+
+def measure(setup: Callable, min_time: float, batch_size: int = 100) -> dict:
+  best = float('inf')
+  rounds = 0
+  deadline = time.perf_counter() + min_time
+  while time.perf_counter() < deadline or rounds < 5:
+    runs = [setup() for _ in range(batch_size)]
+    start = time.perf_counter()
+    for run in runs:
+      run()
+    best = min(best, (time.perf_counter() - start) / batch_size)
+    rounds += 1
+
+  # Allocations are measured on a separate run, tracemalloc skews timings.
+  # The result is kept alive so that retained blocks are counted.
+  run = setup()
+  tracemalloc.start()
+  before = tracemalloc.take_snapshot()
+  tracemalloc.reset_peak()
+  result = run()
+  _, peak = tracemalloc.get_traced_memory()
+  after = tracemalloc.take_snapshot()
+  tracemalloc.stop()
+  del result
+
+  ignore_tracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+  stats = after.filter_traces(ignore_tracemalloc).compare_to(before.filter_traces(ignore_tracemalloc), 'filename')
+
+  return {
+    'ops_per_sec': 1 / best,
+    'allocated_blocks': sum(stat.count_diff for stat in stats),
+    'peak_bytes': peak
+  }
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+  regressions = []
+  for name, result in results.items():
+    if name not in baseline:
+      continue
+
+    expected = baseline[name]
+    if result['ops_per_sec'] < expected['ops_per_sec'] * (1 - tolerance):
+      regressions.append(f"{name}: {result['ops_per_sec']:.0f} ops/sec, baseline {expected['ops_per_sec']:.0f}")
+    if result['allocated_blocks'] > expected['allocated_blocks'] * (1 + tolerance) + 1:
+      regressions.append(f"{name}: {result['allocated_blocks']} blocks allocated, baseline {expected['allocated_blocks']}")
+
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the game engine and HTTP layer.')
+  parser.add_argument('-k', '--filter', default='', help='only run benchmarks containing this string')
+  parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds spent on each benchmark')
+  parser.add_argument('--baseline', default=BASELINE_FILE)
+  parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+  parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+  args = parser.parse_args()
+
+  _webserver_benchmarks()
+
+  results = {}
+  for name, setup in BENCHMARKS.items():
+    if args.filter not in name:
+      continue
+    result = measure(setup, args.min_time)
+    results[name] = result
+    print(f"{name:<24} {result['ops_per_sec']:>12.0f} ops/sec {result['allocated_blocks']:>8} blocks {result['peak_bytes']:>10} peak bytes")
+
+  if args.save:
+    with open(args.baseline, 'w') as f:
+      json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Baseline saved to {args.baseline}")
+    return
+
+  try:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+  except FileNotFoundError:
+    print(f"No baseline at {args.baseline}, run with --save to create one.")
+    return
+
+  regressions = compare(results, baseline, args.tolerance)
+  for regression in regressions:
+    print(f"REGRESSION {regression}")
+
+  if regressions:
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
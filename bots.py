@@ -0,0 +1,306 @@
+import math
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from simulator import greedy_policy
+from uno import Card, Deck, Game, GameSnapshot, Play, Player
+
+# Automated players for empty seats. A seat is a bot when its Player.bot names one
+# of BOTS, the server then makes its moves with play_bot_turns.
+#
+# MonteCarloBot is a single observer information set Monte Carlo tree search: the
+# bot can not see the other hands nor the draw pile, so every iteration deals the
+# cards it can not see at random (deal), walks down one tree shared by all
+# those deals and plays the game out greedily from there. With processes > 0 the
+# iterations are spread over a process pool, every process searching its own tree
+# and the root statistics being summed up.
+
+# Seconds MonteCarloBot spends on each move.
+TIME_BUDGET = 0.2
+EXPLORATION = 0.7
+# Moves a rollout plays before the player with the fewest cards is taken as winner.
+MAX_ROLLOUT_MOVES = 300
+# Bot moves made in one go, in case every seat is a bot that never finishes.
+MAX_BOT_MOVES = 2000
+
+MoveKey = Tuple[str, Optional[int], Optional[str]]
+
+def _unwrapped(cls, name: str):
+  method = cls.__dict__[name]
+  return getattr(method, '__wrapped__', method)
+
+# What searches play on. metrics wraps the hot paths on Game and Deck (see
+# metrics.HOT_PATHS), these keep the methods underneath so simulated moves are
+# neither timed nor counted as the server's.
+class SearchDeck(Deck):
+  draw = _unwrapped(Deck, 'draw')
+
+class SearchGame(Game):
+  progress = _unwrapped(Game, 'progress')
+  play     = _unwrapped(Game, 'play')
+
+def drew_this_turn(game: Game, player: Player) -> bool:
+  return bool(game.plays) and game.plays[-1].action == 'draw' and game.plays[-1].player.id == player.id
+
+def bot_moves(game: Game, player: Player) -> List[Play]:
+  # The legal moves worth considering: cards to play, then draw once and pass only after that.
+  moves = [move for move in game.legal_moves(player) if move.action == 'play']
+  moves.append(Play(player, 'pass' if drew_this_turn(game, player) else 'draw', id=''))
+  return moves
+
+def move_key(play: Play) -> MoveKey:
+  # Same for equal cards, so a move means the same in every determinization.
+  return (play.action, play.card.code if play.card is not None else None, play.suit)
+
+def determinize(game: Game, observer_id: str, rng: random.Random) -> Game:
+  # A copy of game to search on, with the cards observer can not see dealt again at
+  # random. Cheaper than deepcopy: cards are rebuilt from their codes, the plays are
+  # dropped but for the last one, there is no history and the random state is new.
+  copy = lambda card: Card.from_code(card.code, card.id)
+
+  hidden = [copy(card) for card in game.deck.cards]
+  hands = []
+  for player in game.players:
+    hand = [copy(card) for card in player.hand]
+    if player.id != observer_id:
+      hidden.extend(hand)
+    hands.append(hand)
+  rng.shuffle(hidden)
+
+  clone = SearchGame.__new__(SearchGame)
+  clone.id        = game.id
+  clone.seed      = game.seed
+  clone.rng       = random.Random(rng.getrandbits(64))
+  clone.id_rng    = clone.rng
+  clone.started   = game.started
+  clone.finished  = game.finished
+  clone.direction = game.direction
+  clone.version   = game.version
+  clone.current_player_index = game.current_player_index
+  clone.top_suit  = game.top_suit
+  clone.history   = []
+  clone.undone    = []
+  clone.undo_version = 0
+
+  clone.players = []
+  for player, hand in zip(game.players, hands):
+    player_copy = Player(player.name, player.color, id=player.id)
+    if player.id != observer_id:
+      hand = hidden[:len(hand)]
+      del hidden[:len(hand)]
+    player_copy.hand = hand
+    clone.players.append(player_copy)
+  clone._players_by_id = {p.id: p for p in clone.players}
+  clone.winner = clone._players_by_id[game.winner.id] if game.winner is not None else None
+
+  clone.deck = SearchDeck.__new__(SearchDeck)
+  clone.deck.id    = game.deck.id
+  clone.deck.half  = game.deck.half
+  clone.deck.rng   = clone.rng
+  clone.deck.cards = hidden
+  clone.deck.cards_by_suit = {}
+  clone.discard_pile = [copy(card) for card in game.discard_pile]
+
+  # Only needed to tell whether the current player has drawn already.
+  last = game.plays[-1] if game.plays else None
+  clone.plays = [Play(clone.get_current_player(), 'draw', id='')] if last is not None and drew_this_turn(game, last.player) else []
+
+  return clone
+
+def deal(snapshot: GameSnapshot, observer: int, rng: random.Random) -> GameSnapshot:
+  # snapshot with the cards the player at index observer can not see dealt again at random.
+  hidden = bytearray(snapshot.deck)
+  for i, hand in enumerate(snapshot.hands):
+    if i != observer:
+      hidden += hand
+  rng.shuffle(hidden)
+
+  hands = []
+  for i, hand in enumerate(snapshot.hands):
+    if i != observer:
+      hand = bytes(hidden[:len(hand)])
+      del hidden[:len(hand)]
+    hands.append(hand)
+
+  return snapshot._replace(deck=bytes(hidden), hands=tuple(hands))
+
+def rollout(game: Game, rng: random.Random) -> Optional[str]:
+  # Plays game out greedily, the winner's id.
+  for _ in range(MAX_ROLLOUT_MOVES):
+    if game.finished:
+      return game.winner.id
+
+    player = game.get_current_player()
+    play = greedy_policy(game, player, rng)
+    if play is None:
+      play = Play(player, 'pass' if drew_this_turn(game, player) else 'draw', id='')
+    game.progress(play)
+
+  return min(game.players, key=lambda p: len(p.hand)).id
+
+class Node(object):
+  def __init__(self, parent: 'Node' = None, mover: str = None) -> None:
+    self.parent   = parent
+    # The player who made the move leading here.
+    self.mover    = mover
+    self.children: Dict[MoveKey, Node] = {}
+    self.visits   = 0
+    self.wins     = 0
+    # How often this node's move was legal when its parent was visited.
+    self.avails   = 1
+
+  def score(self, exploration: float) -> float:
+    return self.wins / self.visits + exploration * math.sqrt(math.log(self.avails) / self.visits)
+
+def search(game: Game, observer_id: str, seconds: float, rng: random.Random, exploration: float = EXPLORATION) -> Dict[MoveKey, Tuple[int, int]]:
+  # (visits, wins) of every move observer can make now, after searching for seconds.
+  deadline = time.monotonic() + seconds
+  # One copy of the game is searched on, every iteration restores it to a new deal
+  # of the same snapshot, reusing its cards.
+  state = determinize(game, observer_id, rng)
+  start = state.snapshot()
+  observer = [p.id for p in game.players].index(observer_id)
+  root = Node()
+  while True:
+    state.restore(deal(start, observer, rng))
+    node = root
+
+    while not state.finished:
+      player = state.get_current_player()
+      moves = {move_key(move): move for move in bot_moves(state, player)}
+      untried = [key for key in moves if key not in node.children]
+      for key in moves:
+        if key in node.children:
+          node.children[key].avails += 1
+
+      if untried:
+        key = rng.choice(untried)
+        state.progress(moves[key])
+        node.children[key] = node = Node(node, player.id)
+        break
+
+      key = max(moves, key=lambda k: node.children[k].score(exploration))
+      state.progress(moves[key])
+      node = node.children[key]
+
+    winner = rollout(state, rng)
+    while node is not None:
+      node.visits += 1
+      if node.mover == winner:
+        node.wins += 1
+      node = node.parent
+
+    if time.monotonic() >= deadline:
+      break
+
+  return {key: (child.visits, child.wins) for key, child in root.children.items()}
+
+def _search_state(state: bytes, observer_id: str, seconds: float, seed: int, exploration: float) -> Dict[MoveKey, Tuple[int, int]]:
+  return search(Game.from_bytes(state), observer_id, seconds, random.Random(seed), exploration)
+
+class GreedyBot(object):
+  def __init__(self, rng: random.Random = None) -> None:
+    self.rng = rng if rng is not None else random.Random()
+
+  def choose(self, game: Game, player: Player) -> Play:
+    play = greedy_policy(game, player, self.rng)
+    if play is None:
+      play = Play(player, 'pass' if drew_this_turn(game, player) else 'draw')
+
+    return play
+
+class MonteCarloBot(object):
+  def __init__(
+    self,
+    time_budget: float = TIME_BUDGET,
+    processes: int = 0,
+    exploration: float = EXPLORATION,
+    rng: random.Random = None
+  ) -> None:
+    self.time_budget = time_budget
+    self.processes   = processes
+    self.exploration = exploration
+    self.rng         = rng if rng is not None else random.Random()
+    self._executor: Optional[ProcessPoolExecutor] = None
+    self._executor_lock = threading.Lock()
+
+  def choose(self, game: Game, player: Player) -> Play:
+    moves = {move_key(move): move for move in bot_moves(game, player)}
+    if len(moves) == 1:
+      best = next(iter(moves))
+    else:
+      stats = self.statistics(game, player)
+      best = max(moves, key=lambda key: stats.get(key, (0, 0)))
+
+    play = moves[best]
+    # bot_moves ids are placeholders.
+    return Play(player, play.action, play.card, play.suit)
+
+  def statistics(self, game: Game, player: Player) -> Dict[MoveKey, Tuple[int, int]]:
+    if self.processes <= 0:
+      return search(game, player.id, self.time_budget, self.rng, self.exploration)
+
+    with self._executor_lock:
+      if self._executor is None:
+        self._executor = ProcessPoolExecutor(max_workers=self.processes)
+
+    state = game.to_bytes()
+    futures = [
+      self._executor.submit(_search_state, state, player.id, self.time_budget, self.rng.getrandbits(64), self.exploration)
+      for _ in range(self.processes)
+    ]
+
+    stats: Dict[MoveKey, Tuple[int, int]] = {}
+    for future in futures:
+      for key, (visits, wins) in future.result().items():
+        total_visits, total_wins = stats.get(key, (0, 0))
+        stats[key] = (total_visits + visits, total_wins + wins)
+
+    return stats
+
+  def close(self):
+    with self._executor_lock:
+      if self._executor is not None:
+        self._executor.shutdown()
+        self._executor = None
+
+BOTS = {
+  'greedy': GreedyBot,
+  'ismcts': MonteCarloBot
+}
+
+def take_turn(bot, game: Game) -> List[Play]:
+  # The bot's moves until its turn is over: a card, or a draw then a card or a pass.
+  player = game.get_current_player()
+  plays = []
+  while not game.finished and game.get_current_player() is player:
+    play = bot.choose(game, player)
+    game.progress(play)
+    plays.append(play)
+    if play.action != 'draw':
+      break
+
+  return plays
+
+def play_bot_turn(game: Game, bots: Dict[str, object]) -> List[Play]:
+  # The current seat's turn if it is a bot, bots being the bot instances by name
+  # as in Player.bot. Nothing when it is a human's turn or the game is over.
+  if not game.started or game.finished:
+    return []
+
+  bot = bots.get(game.get_current_player().bot)
+  return take_turn(bot, game) if bot is not None else []
+
+def play_bot_turns(game: Game, bots: Dict[str, object]) -> List[Play]:
+  # Plays for every bot seat in a row until it is a human's turn or the game is over.
+  plays = []
+  while len(plays) < MAX_BOT_MOVES:
+    turn = play_bot_turn(game, bots)
+    if not turn:
+      break
+    plays.extend(turn)
+
+  return plays
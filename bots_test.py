@@ -0,0 +1,96 @@
+import random
+import unittest
+from collections import Counter
+
+import metrics
+from bots import GreedyBot, MonteCarloBot, determinize, move_key, play_bot_turns
+from uno import Game, Play, Player
+
+def new_game(seed: int = 1, bots: tuple = (None, None)) -> Game:
+  players = [Player(f"Player {i + 1}", 'red', id=str(i), bot=bot) for i, bot in enumerate(bots)]
+  game = Game(players, seed=seed)
+  game.start()
+  return game
+
+class DeterminizeTest(unittest.TestCase):
+  def test_dealsOnlyHiddenCards(self):
+    game = new_game()
+    game.progress(Play(game.get_current_player(), 'draw'))
+    observer = game.players[0]
+
+    clone = determinize(game, observer.id, random.Random(1))
+
+    self.assertEqual([c.id for c in clone.players[0].hand], [c.id for c in observer.hand])
+    self.assertEqual([len(p.hand) for p in clone.players], [len(p.hand) for p in game.players])
+    self.assertEqual([c.code for c in clone.discard_pile], [c.code for c in game.discard_pile])
+    hidden = lambda g: Counter(c.code for c in g.deck.cards + list(g.players[1].hand))
+    self.assertEqual(hidden(clone), hidden(game))
+    self.assertEqual(clone.plays[-1].action, 'draw')
+
+  def test_leavesGameAlone(self):
+    game = new_game()
+    before = game.to_bytes()
+
+    clone = determinize(game, game.players[0].id, random.Random(1))
+    bot = GreedyBot(random.Random(1))
+    while not clone.finished:
+      clone.progress(bot.choose(clone, clone.get_current_player()))
+
+    self.assertEqual(game.to_bytes(), before)
+
+class MonteCarloBotTest(unittest.TestCase):
+  def test_choose_legalMove(self):
+    game = new_game()
+    player = game.get_current_player()
+    legal = {move_key(m) for m in game.legal_moves(player)}
+
+    play = MonteCarloBot(time_budget=0.05, rng=random.Random(1)).choose(game, player)
+
+    self.assertIn(move_key(play), legal)
+    game.progress(play)
+
+  def test_search_notInMetrics(self):
+    game = new_game()
+    was_enabled = metrics.is_enabled()
+    metrics.enable()
+    try:
+      before = sum(h.count for h in metrics.PROGRESS.children.values())
+      MonteCarloBot(time_budget=0.02, rng=random.Random(1)).statistics(game, game.get_current_player())
+      after = sum(h.count for h in metrics.PROGRESS.children.values())
+    finally:
+      if not was_enabled:
+        metrics.disable()
+
+    self.assertEqual(after, before)
+
+  def test_choose_processPool(self):
+    game = new_game()
+    bot = MonteCarloBot(time_budget=0.05, processes=2, rng=random.Random(1))
+    try:
+      stats = bot.statistics(game, game.get_current_player())
+    finally:
+      bot.close()
+
+    self.assertGreater(sum(visits for visits, _ in stats.values()), 0)
+
+class PlayBotTurnsTest(unittest.TestCase):
+  def test_stopsAtHumanSeat(self):
+    game = new_game(bots=('greedy', None))
+    if game.get_current_player().bot is None:
+      game.progress(Play(game.get_current_player(), 'pass'))
+
+    plays = play_bot_turns(game, {'greedy': GreedyBot(random.Random(1))})
+
+    self.assertTrue(plays)
+    self.assertTrue(all(p.player is game.players[0] for p in plays))
+    self.assertTrue(game.finished or game.get_current_player() is game.players[1])
+
+  def test_botsOnly_playUntilFinished(self):
+    game = new_game(bots=('greedy', 'ismcts'))
+
+    play_bot_turns(game, {'greedy': GreedyBot(random.Random(1)), 'ismcts': MonteCarloBot(time_budget=0.002, rng=random.Random(1))})
+
+    self.assertTrue(game.finished)
+
+if __name__ == '__main__':
+  unittest.main()
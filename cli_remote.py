@@ -17,6 +17,10 @@ GAME_URL       = f"{BASE_URL}/game/{GAME_ID}"
 START_GAME_URL = f"{GAME_URL}/start"
 PLAYER_URL     = f"{GAME_URL}/player"
 PLAY_URL       = f"{GAME_URL}/play"
+WAIT_URL       = f"{GAME_URL}/wait"
+MOVES_URL      = f"{GAME_URL}/moves"
+# Cards come as [ordinal, code] pairs, see Card.from_compact.
+COMPACT        = 'format=compact'
 
 player_name_param = sys.argv[1] if len(sys.argv) > 1 else None
 
@@ -33,9 +37,12 @@ PLAYERS = {
   ]
 }
 
+# One keep-alive connection for the whole game instead of a new one per request.
+session = requests.Session()
+
 def post(url : str, data : dict) -> dict:
   console.log(f"Posting {data} to {url}")
-  response = requests.post(url, json=data)
+  response = session.post(url, json=data)
   if response.status_code >= 400:
     console.log(
       f"Got status [yellow]{response.status_code}[/yellow] while posting to [blue]{url}[/blue]",
@@ -48,7 +55,7 @@ def post(url : str, data : dict) -> dict:
 
 def get(url : str) -> dict:
   console.log(f"Getting {url}")
-  response = requests.get(url)
+  response = session.get(url)
   if response.status_code > 400:
     console.log(
       f"Got status [yellow]{response.status_code}[/yellow] while getting to [blue]{url}[/blue]",
@@ -59,16 +66,35 @@ def get(url : str) -> dict:
   else:
     return response.json()
 
+use_long_poll = True
+
+def wait_for_change(version : int) -> dict:
+  global use_long_poll
+  if use_long_poll:
+    try:
+      return get(f"{WAIT_URL}?version={version}&{COMPACT}")
+    except MyException:
+      console.log("Server does not support waiting for changes, polling instead.")
+      use_long_poll = False
+
+  sleep(1)
+  return get(f"{GAME_URL}?{COMPACT}")
+
 def get_player_by_id(local_player_id):
-    current_player_data = get(f"{PLAYER_URL}/{local_player_id}")
+    current_player_data = get(f"{PLAYER_URL}/{local_player_id}?{COMPACT}")
     local_player = Player.from_dict(current_player_data)
     return local_player
 
+def make_moves(local_player_id, moves : list):
+  # The answer carries the new game state, no need to ask for it again.
+  result = post(f"{MOVES_URL}?{COMPACT}", {'player_id': local_player_id, 'moves': moves})
+  return result['game'], Player.from_dict(result['player'])
+
 try:
   game_staus = post(START_GAME_URL, PLAYERS)
   console.log(f"Game status: {game_staus['status']}")
   
-  game_data = get(GAME_URL)
+  game_data = get(f"{GAME_URL}?{COMPACT}")
   
   game_players = {p['id']: p for p in game_data['players']}
   players_by_name = {p['name']: p for p in game_players.values()}
@@ -76,18 +102,13 @@ try:
 
   player_name     = get_input(f"Who are you? {player_names}> ", validator=lambda x: x in player_names) if player_name_param is None else player_name_param
   local_player_id = players_by_name[player_name]['id']
+  local_player    = get_player_by_id(local_player_id)
    
   while not game_data['finished']:
-    game_data = get(GAME_URL)
-    console.log('Got game data.')
-
-
     game_players = {p['id']: p for p in game_data['players']}
-    local_player = get_player_by_id(local_player_id)
-
     current_player_id = game_data['current_player']
     
-    discard_top = Card.from_dict(game_data['discard_top'])
+    discard_top = Card.from_compact(game_data['discard_top'])
     print_table(local_player, discard_top, game_players)
 
     if current_player_id == local_player.id:
@@ -100,40 +121,21 @@ try:
       
         suit = args_list[1].strip() if len(args_list) > 1 else None
 
-        play = {
-          'player_id': local_player.id,
-          'action': 'play',
-          'card_id': card.id,
-          'suit': suit
-        }
-
-        play_status = post(PLAY_URL, play)
-        console.log(play_status)
+        moves = [{'action': 'play', 'card_id': card.id, 'suit': suit}]
       elif command == 'pass':
-        play = {
-          'player_id': local_player.id,
-          'action': 'pass',
-          'card_id': None,
-          'suit': None
-        }
-        
-        play_status = post(PLAY_URL, play)
-        console.log(play_status)
+        moves = [{'action': 'pass'}]
       elif command == 'draw':
-        play = {
-          'player_id': local_player.id,
-          'action': 'draw',
-          'card_id': None,
-          'suit': None
-        }
-        
-        play_status = post(PLAY_URL, play)
-        console.log(play_status)
+        moves = [{'action': 'draw'}]
       elif command == 'exit':
         break
+      else:
+        continue
+
+      game_data, local_player = make_moves(local_player_id, moves)
     else:
       console.log("Not your turn")
-      sleep(1)
+      game_data = wait_for_change(game_data.get('version', -1))
+      local_player = get_player_by_id(local_player_id)
   
   winner_id = game_data['winner_id']
 
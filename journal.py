@@ -0,0 +1,207 @@
+import glob
+import json
+import os
+import pickle
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from uno import Game, Play, Player
+
+SNAPSHOT_FILE    = 'snapshot.pickle'
+SEGMENT_PREFIX   = 'journal-'
+SEGMENT_SUFFIX   = '.jsonl'
+FSYNC_INTERVAL   = 0.05
+FSYNC_BATCH_SIZE = 256
+SNAPSHOT_EVERY   = 10000
+
+def list_segments(directory: str) -> List[Tuple[int, str]]:
+  paths = glob.glob(os.path.join(directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+  return sorted((int(os.path.basename(p)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]), p) for p in paths)
+
+def segment_path(directory: str, segment: int) -> str:
+  return os.path.join(directory, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+def start_entry(game: Game) -> dict:
+  return {
+    'type': 'start',
+    'game_id': game.id,
+    'version': game.version,
+    'seed': game.seed,
+    'players': [{'id': p.id, 'name': p.name, 'color': p.color, 'bot': p.bot} for p in game.players]
+  }
+
+def play_entry(game: Game, play: Play, version: int = None) -> dict:
+  # version is the one the play produced, the game's current one by default.
+  return {
+    'type': 'play',
+    'game_id': game.id,
+    'version': version if version is not None else game.version,
+    'player_id': play.player.id,
+    'action': play.action,
+    'card_id': play.card.id if play.card is not None else None,
+    'suit': play.suit
+  }
+
+def move_play(game: Game, move: dict) -> Play:
+  player = game.get_player_by_id(move['player_id'])
+  card = player.hand.get(move['card_id']) if move['card_id'] is not None else None
+  return Play(player, move['action'], card=card, suit=move['suit'], id=game.new_id())
+
+def apply_entry(games: Dict[str, Game], entry: dict):
+  # Entries carry the version they produced, those already in the game are skipped.
+  game = games.get(entry['game_id'])
+
+  if entry['type'] == 'start':
+    # The same game, already in the snapshot. Another seed is a new game reusing
+    # the id of one that was evicted, it replaces the old one.
+    if game is not None and game.seed == entry['seed']:
+      return
+
+    players = [Player(p['name'], p['color'], id=p['id'], bot=p.get('bot')) for p in entry['players']]
+    game = Game(players, entry['game_id'], seed=entry['seed'])
+    game.start()
+    games[game.id] = game
+  elif entry['type'] == 'play':
+    if game is None or entry['version'] <= game.version:
+      return
+
+    game.progress(move_play(game, entry))
+
+# Append-only log of game starts and plays. Entries are written as they come and
+# fsynced in batches, either every FSYNC_BATCH_SIZE entries or every FSYNC_INTERVAL
+# seconds. The journal is split in segments, a snapshot of every game lets the
+# segments before it be dropped so replay time stays bounded.
+class Journal(object):
+  def __init__(
+    self,
+    directory: str,
+    fsync_interval: float = FSYNC_INTERVAL,
+    fsync_batch_size: int = FSYNC_BATCH_SIZE,
+    snapshot_every: int = SNAPSHOT_EVERY
+  ) -> None:
+    self.directory        = directory
+    self.fsync_interval   = fsync_interval
+    self.fsync_batch_size = fsync_batch_size
+    self.snapshot_every   = snapshot_every
+
+    self._lock           = threading.Lock()
+    self._snapshot_lock  = threading.Lock()
+    self._pending        = 0
+    self._since_snapshot = 0
+    self._closed         = False
+
+    os.makedirs(directory, exist_ok=True)
+    segments = list_segments(directory)
+    self._segment = segments[-1][0] + 1 if segments else 0
+    self._file = open(segment_path(directory, self._segment), 'a')
+
+    self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+    self._flusher.start()
+
+  def record_start(self, game: Game):
+    self.append(start_entry(game))
+
+  def record_play(self, game: Game, play: Play, version: int = None):
+    self.append(play_entry(game, play, version))
+
+  def append(self, entry: dict):
+    line = json.dumps(entry, separators=(',', ':')) + '\n'
+    with self._lock:
+      self._file.write(line)
+      self._pending += 1
+      self._since_snapshot += 1
+      if self._pending >= self.fsync_batch_size:
+        self._sync()
+
+  def _sync(self):
+    # Callers hold self._lock.
+    self._file.flush()
+    os.fsync(self._file.fileno())
+    self._pending = 0
+
+  def flush(self):
+    with self._lock:
+      if self._pending and not self._file.closed:
+        self._sync()
+
+  def _flush_periodically(self):
+    while not self._closed:
+      time.sleep(self.fsync_interval)
+      self.flush()
+
+  def close(self):
+    self._closed = True
+    with self._lock:
+      self._sync()
+      self._file.close()
+
+  def needs_snapshot(self) -> bool:
+    return self._since_snapshot >= self.snapshot_every
+
+  def snapshot(self, games: Callable[[], Iterable[Tuple[str, bytes]]]):
+    # games yields (game_id, pickled game) pairs, pickled under the game's own lock.
+    # Must not be called while holding any game lock.
+    if not self._snapshot_lock.acquire(blocking=False):
+      return
+
+    try:
+      with self._lock:
+        self._sync()
+        self._file.close()
+        first_segment = self._segment + 1
+        self._segment = first_segment
+        self._file = open(segment_path(self.directory, first_segment), 'a')
+        self._since_snapshot = 0
+
+      # Plays journaled after the rotation may already be in the pickled games,
+      # replay skips them by version.
+      snapshot = {
+        'segment': first_segment,
+        'games': dict(games())
+      }
+
+      path = os.path.join(self.directory, SNAPSHOT_FILE)
+      with open(path + '.tmp', 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(path + '.tmp', path)
+
+      for segment, path in list_segments(self.directory):
+        if segment < first_segment:
+          os.remove(path)
+    finally:
+      self._snapshot_lock.release()
+
+def read_entries(directory: str, first_segment: int = 0) -> Iterator[dict]:
+  for segment, path in list_segments(directory):
+    if segment < first_segment:
+      continue
+
+    with open(path) as f:
+      for line in f:
+        # A crash can leave the last line half written.
+        if not line.endswith('\n'):
+          break
+        yield json.loads(line)
+
+def replay(directory: str) -> Dict[str, Game]:
+  games = {}
+  first_segment = 0
+
+  snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+  if os.path.exists(snapshot_path):
+    with open(snapshot_path, 'rb') as f:
+      snapshot = pickle.load(f)
+    games = {game_id: pickle.loads(data) for game_id, data in snapshot['games'].items()}
+    first_segment = snapshot['segment']
+
+  for entry in read_entries(directory, first_segment):
+    try:
+      apply_entry(games, entry)
+    except (KeyError, ValueError, IndexError) as e:
+      # One bad entry loses that play, not the whole journal.
+      print(f"Skipped journal entry {entry}: {e!r}")
+
+  return games
@@ -0,0 +1,92 @@
+import pickle
+import random
+import tempfile
+import unittest
+
+from journal import Journal, list_segments, replay
+from simulator import greedy_policy
+from uno import Game, Play, Player
+
+def new_game(game_id: str) -> Game:
+  return Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], game_id)
+
+def play_turns(game: Game, journal: Journal, turns: int):
+  rng = random.Random(1)
+  for _ in range(turns):
+    if game.is_finished():
+      break
+
+    player = game.get_current_player()
+    play = greedy_policy(game, player, rng) or Play(player, 'draw')
+    game.progress(play)
+    journal.record_play(game, play)
+
+def game_state(game: Game) -> tuple:
+  return (
+    game.version,
+    game.current_player_index,
+    [c.id for c in game.discard_pile],
+    [c.id for c in game.deck.cards],
+    [[c.id for c in p.hand] for p in game.players]
+  )
+
+class JournalTest(unittest.TestCase):
+  def test_replay_rebuildsGames(self):
+    with tempfile.TemporaryDirectory() as directory:
+      journal = Journal(directory)
+      games = [new_game('a'), new_game('b')]
+      for game in games:
+        game.start()
+        journal.record_start(game)
+      for game in games:
+        play_turns(game, journal, 40)
+      journal.close()
+
+      replayed = replay(directory)
+
+      self.assertEqual(sorted(replayed.keys()), ['a', 'b'])
+      for game in games:
+        self.assertEqual(game_state(replayed[game.id]), game_state(game))
+
+  def test_replay_reusedId(self):
+    with tempfile.TemporaryDirectory() as directory:
+      journal = Journal(directory)
+      first = new_game('a')
+      first.start()
+      journal.record_start(first)
+      play_turns(first, journal, 10)
+
+      # Evicted, then started again under the same id.
+      game = Game([Player('Player 3', 'green'), Player('Player 4', 'yellow')], 'a')
+      game.start()
+      journal.record_start(game)
+      play_turns(game, journal, 10)
+      journal.close()
+
+      self.assertEqual(game_state(replay(directory)['a']), game_state(game))
+
+  def test_replay_skipsBadEntry(self):
+    with tempfile.TemporaryDirectory() as directory:
+      journal = Journal(directory)
+      game = new_game('a')
+      game.start()
+      journal.record_start(game)
+      journal.append({'type': 'play', 'game_id': 'a', 'version': 2, 'player_id': 'nobody', 'action': 'pass', 'card_id': None, 'suit': None})
+      journal.close()
+
+      self.assertEqual(game_state(replay(directory)['a']), game_state(game))
+
+  def test_snapshot_dropsOldSegments(self):
+    with tempfile.TemporaryDirectory() as directory:
+      journal = Journal(directory)
+      game = new_game('a')
+      game.start()
+      journal.record_start(game)
+      play_turns(game, journal, 10)
+
+      journal.snapshot(lambda: [(game.id, pickle.dumps(game))])
+      play_turns(game, journal, 10)
+      journal.close()
+
+      self.assertEqual([segment for segment, _ in list_segments(directory)], [1])
+      self.assertEqual(game_state(replay(directory)['a']), game_state(game))
@@ -0,0 +1,338 @@
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+
+import router
+
+# Hammers running servers with the same request mix and compares them, e.g.:
+#
+#   waitress-serve --port=5000 --threads=8 webserver:app
+#   uvicorn asgi_server:app --port 8000
+#   python loadtest.py http://localhost:5000 http://localhost:8000
+#
+# or shows how router.py scales with its number of workers:
+#
+#   python loadtest.py --scale 1 2 4 -c 32 -P 4
+#
+# or soak tests a server with M games of K bot clients each, every client playing
+# its seat through the HTTP API until the duration is over. --serve starts
+# webserver.py on --port first:
+#
+#   python loadtest.py --soak --games 50 --players 4 -d 600 --serve
+
+# Seconds a soak client waits before polling a game again while it is not its turn.
+POLL_INTERVAL = 0.01
+# Games that have not finished by this version are given up on.
+MAX_GAME_VERSION = 2000
+
+START = {
+  'players': [
+    {'name': 'Player 1', 'color': 'red'},
+    {'name': 'Player 2', 'color': 'blue'}
+  ]
+}
+
+class Client(object):
+  # One keep-alive connection, latencies recorded per endpoint.
+  def __init__(self, url: str, latencies: Dict[str, List[float]], errors: Dict[str, int]) -> None:
+    parsed = urlparse(url)
+    self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    self.latencies  = latencies
+    self.errors     = errors
+
+  def request(self, endpoint: str, method: str, path: str, body: dict = None) -> dict:
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    data = json.dumps(body) if body is not None else None
+
+    start = time.perf_counter()
+    try:
+      self.connection.request(method, path, body=data, headers=headers)
+      response = self.connection.getresponse()
+      content = response.read()
+    except (OSError, http.client.HTTPException) as e:
+      # The next request opens a new connection.
+      self.connection.close()
+      self.errors[f"{endpoint} {e.__class__.__name__}"] += 1
+      return {}
+    self.latencies[endpoint].append(time.perf_counter() - start)
+
+    if response.status >= 400:
+      self.errors[f"{endpoint} {response.status}"] += 1
+      return {}
+
+    return json.loads(content) if content else {}
+
+def run_worker(url: str, worker: int, deadline: float, latencies: Dict[str, List[float]], errors: Dict[str, int]):
+  client = Client(url, latencies, errors)
+  game_number = 0
+  while time.perf_counter() < deadline:
+    game_url = f"/game/load-{worker}-{game_number}-{time.time_ns()}"
+    game_number += 1
+    client.request('start', 'POST', f"{game_url}/start", START)
+
+    for _ in range(50):
+      if time.perf_counter() >= deadline:
+        break
+
+      game = client.request('game', 'GET', game_url)
+      if not game:
+        break
+
+      player_id = game['current_player']
+      client.request('player', 'GET', f"{game_url}/player/{player_id}")
+      client.request('play', 'POST', f"{game_url}/play", {'player_id': player_id, 'action': 'pass', 'card_id': None, 'suit': None})
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+  return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def _merge(parts: List[Tuple[dict, dict]]) -> Tuple[Dict[str, List[float]], Dict[str, int]]:
+  latencies = defaultdict(list)
+  errors = defaultdict(int)
+  for part_latencies, part_errors in parts:
+    for endpoint, values in part_latencies.items():
+      latencies[endpoint].extend(values)
+    for key, count in part_errors.items():
+      errors[key] += count
+
+  return dict(latencies), dict(errors)
+
+def _report(url: str, latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> dict:
+  everything = sorted(v for values in latencies.values() for v in values)
+  return {
+    'url': url,
+    'requests': len(everything),
+    'requests_per_sec': len(everything) / elapsed,
+    'p50': percentile(everything, 0.5) if everything else 0,
+    'p99': percentile(everything, 0.99) if everything else 0,
+    'endpoints': {
+      endpoint: {
+        'requests': len(values),
+        'p50': percentile(sorted(values), 0.5),
+        'p90': percentile(sorted(values), 0.9),
+        'p99': percentile(sorted(values), 0.99)
+      }
+      for endpoint, values in latencies.items()
+    },
+    'errors': dict(errors)
+  }
+
+def _run_workers(url: str, first_worker: int, concurrency: int, duration: float) -> Tuple[dict, dict]:
+  per_worker = [(defaultdict(list), defaultdict(int)) for _ in range(concurrency)]
+  deadline = time.perf_counter() + duration
+  threads = [
+    threading.Thread(target=run_worker, args=(url, first_worker + i, deadline, latencies, errors))
+    for i, (latencies, errors) in enumerate(per_worker)
+  ]
+
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  return _merge(per_worker)
+
+def load_test(url: str, concurrency: int, duration: float, processes: int = 1) -> dict:
+  # With processes > 1 the connections are spread over that many client processes,
+  # so the load generator is not held back by a single core either.
+  start = time.perf_counter()
+  if processes <= 1:
+    parts = [_run_workers(url, 0, concurrency, duration)]
+  else:
+    sizes = [concurrency // processes + (1 if i < concurrency % processes else 0) for i in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+      futures = [executor.submit(_run_workers, url, sum(sizes[:i]), size, duration) for i, size in enumerate(sizes) if size > 0]
+      parts = [future.result() for future in futures]
+  elapsed = time.perf_counter() - start
+
+  return _report(url, *_merge(parts), elapsed)
+
+def choose_move(moves: List[dict], drew: bool) -> dict:
+  # A card if there is one, else draw once and pass after that.
+  for move in moves:
+    if move['action'] == 'play':
+      return move
+
+  return {'action': 'pass' if drew else 'draw', 'card_id': None, 'suit': None}
+
+def bot_client(url: str, run: int, slot: int, seat: int, num_players: int, barrier: threading.Barrier, deadline: float, poll_interval: float, stats: dict):
+  # Plays seat of one game after the other in game slot, until deadline. Seat 0
+  # starts each game, the barrier holds the other seats back until it has. run
+  # keeps the game ids apart from those of earlier runs against the same server.
+  client = Client(url, stats['latencies'], stats['errors'])
+  start = {'players': [{'name': f"Bot {i + 1}", 'color': 'white'} for i in range(num_players)]}
+  game_number = 0
+  try:
+    while time.perf_counter() < deadline:
+      game_url = f"/game/soak-{run}-{slot}-{game_number}"
+      game_number += 1
+      if seat == 0:
+        client.request('start', 'POST', f"{game_url}/start", start)
+      barrier.wait(timeout=max(0, deadline - time.perf_counter()) + 30)
+
+      game = client.request('poll', 'GET', f"{game_url}?format=compact")
+      player_id = game['players'][seat]['id'] if game else None
+
+      drew = False
+      while player_id is not None and time.perf_counter() < deadline:
+        if game.get('finished') or game.get('version', 0) > MAX_GAME_VERSION:
+          stats['games'] += game.get('finished', False)
+          break
+
+        if game.get('current_player') == player_id:
+          moves = client.request('moves', 'GET', f"{game_url}/player/{player_id}/moves").get('moves', [])
+          move = choose_move(moves, drew)
+          drew = move['action'] == 'draw'
+          client.request('play', 'POST', f"{game_url}/play", dict(move, player_id=player_id))
+          stats['moves'] += 1
+        else:
+          time.sleep(poll_interval)
+
+        game = client.request('poll', 'GET', f"{game_url}?format=compact")
+
+      # Everyone is done with this game before seat 0 starts the next one.
+      barrier.wait(timeout=max(0, deadline - time.perf_counter()) + 30)
+  except threading.BrokenBarrierError:
+    pass
+  finally:
+    # Seats still waiting for this one give up too.
+    barrier.abort()
+
+def soak_test(url: str, games: int, players: int, duration: float, poll_interval: float = POLL_INTERVAL) -> dict:
+  deadline = time.perf_counter() + duration
+  run = time.time_ns()
+  per_client = []
+  threads = []
+  for slot in range(games):
+    barrier = threading.Barrier(players)
+    for seat in range(players):
+      stats = {'latencies': defaultdict(list), 'errors': defaultdict(int), 'games': 0, 'moves': 0}
+      per_client.append(stats)
+      threads.append(threading.Thread(target=bot_client, args=(url, run, slot, seat, players, barrier, deadline, poll_interval, stats)))
+
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.perf_counter() - start
+
+  result = _report(url, *_merge([(stats['latencies'], stats['errors']) for stats in per_client]), elapsed)
+  moves = sum(stats['moves'] for stats in per_client)
+  result.update({
+    'clients': games * players,
+    # Every seat counts the games it saw finish.
+    'games_finished': sum(stats['games'] for stats in per_client) // players,
+    'moves': moves,
+    'moves_per_sec': moves / elapsed
+  })
+  return result
+
+def start_webserver(port: int) -> subprocess.Popen:
+  # With waitress if it is installed, as webserver.ps1 does, else with flask's own threaded server.
+  if importlib.util.find_spec('waitress') is not None:
+    command = [sys.executable, '-m', 'waitress', f"--port={port}", '--threads=64', 'webserver:app']
+  else:
+    command = [sys.executable, '-m', 'flask', '--app', 'webserver', 'run', '--port', str(port)]
+
+  # Its request log would drown the report.
+  process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  router.wait_for_port('127.0.0.1', port)
+  return process
+
+def scaling_test(worker_counts: List[int], port: int, concurrency: int, duration: float, processes: int) -> List[dict]:
+  # Starts router.py with each number of workers in turn and load tests it.
+  results = []
+  for workers in worker_counts:
+    router_process = subprocess.Popen(
+      [sys.executable, 'router.py', '--workers', str(workers), '--port', str(port)],
+      cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    try:
+      router.wait_for_port('127.0.0.1', port)
+      result = load_test(f"http://127.0.0.1:{port}", concurrency, duration, processes)
+      result['workers'] = workers
+      results.append(result)
+    finally:
+      router_process.terminate()
+      router_process.wait()
+
+  return results
+
+def print_result(result: dict):
+  print(f"{result['url']}: {result['requests']} requests, {result['requests_per_sec']:.0f} req/s, "
+        f"p50 {result['p50'] * 1e3:.2f}ms, p99 {result['p99'] * 1e3:.2f}ms")
+  for endpoint, stats in sorted(result['endpoints'].items()):
+    print(f"  {endpoint:<8} {stats['requests']:>8} p50 {stats['p50'] * 1e3:>7.2f}ms p99 {stats['p99'] * 1e3:>7.2f}ms")
+  for key, count in sorted(result['errors'].items()):
+    print(f"  error {key}: {count}")
+
+def print_soak_result(result: dict):
+  print(f"{result['clients']} clients: {result['games_finished']} games finished, "
+        f"{result['moves']} moves, {result['moves_per_sec']:.0f} moves/s")
+  print_result(result)
+  for endpoint, stats in sorted(result['endpoints'].items()):
+    print(f"  {endpoint:<8} p90 {stats['p90'] * 1e3:>7.2f}ms")
+
+def main():
+  parser = argparse.ArgumentParser(description='Compare requests/sec and latency of running servers.')
+  parser.add_argument('urls', nargs='*', help='base urls of the servers to test, one after the other')
+  parser.add_argument('-c', '--concurrency', type=int, default=8, help='concurrent connections')
+  parser.add_argument('-d', '--duration', type=float, default=10, help='seconds per server')
+  parser.add_argument('-P', '--processes', type=int, default=1, help='client processes to spread the connections over')
+  parser.add_argument('--scale', type=int, nargs='+', metavar='WORKERS', help='start router.py with these worker counts and test each instead')
+  parser.add_argument('--port', type=int, default=5000, help='router port for --scale, webserver port for --serve')
+  parser.add_argument('--soak', action='store_true', help='play bot games through the API instead, see --games and --players')
+  parser.add_argument('-g', '--games', type=int, default=10, help='concurrent games for --soak')
+  parser.add_argument('-k', '--players', type=int, default=2, help='bot clients per game for --soak')
+  parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help='seconds between polls of a client waiting for its turn')
+  parser.add_argument('--serve', action='store_true', help='start webserver.py on --port and test it')
+  args = parser.parse_args()
+
+  if args.soak:
+    server = start_webserver(args.port) if args.serve else None
+    try:
+      urls = args.urls or [f"http://127.0.0.1:{args.port}"]
+      for url in urls:
+        print_soak_result(soak_test(url, args.games, args.players, args.duration, args.poll_interval))
+    finally:
+      if server is not None:
+        server.terminate()
+        server.wait()
+    return
+
+  if args.scale:
+    results = scaling_test(args.scale, args.port, args.concurrency, args.duration, args.processes)
+    for result in results:
+      print(f"{result['workers']} workers:")
+      print_result(result)
+    for result in results:
+      print(f"{result['workers']:>3} workers: {result['requests_per_sec']:>8.0f} req/s, "
+            f"{result['requests_per_sec'] / results[0]['requests_per_sec']:.2f}x")
+    return
+
+  if not args.urls:
+    parser.error('give the urls of the servers to test, --scale or --soak')
+
+  results = [load_test(url, args.concurrency, args.duration, args.processes) for url in args.urls]
+  for result in results:
+    print_result(result)
+
+  if len(results) > 1:
+    baseline = results[0]
+    for result in results[1:]:
+      print(f"{result['url']} vs {baseline['url']}: "
+            f"{result['requests_per_sec'] / baseline['requests_per_sec']:.2f}x req/s, "
+            f"{result['p99'] / baseline['p99']:.2f}x p99")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,38 @@
+import threading
+import unittest
+
+from werkzeug.serving import make_server
+
+import loadtest
+import webserver
+
+def soak_games() -> set:
+  return {game.id for game in webserver.GAMES.games() if game.id.startswith('soak-')}
+
+class SoakTest(unittest.TestCase):
+  def setUp(self):
+    self.server = make_server('127.0.0.1', 0, webserver.app, threaded=True)
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def test_soak_playsWithoutErrors(self):
+    result = loadtest.soak_test(self.url, games=2, players=2, duration=1, poll_interval=0.001)
+
+    self.assertEqual(result['clients'], 4)
+    self.assertGreater(result['moves'], 0)
+    self.assertEqual(dict(result['errors']), {})
+
+  def test_soak_newGamesEveryRun(self):
+    loadtest.soak_test(self.url, games=1, players=2, duration=0.2)
+    first_run = soak_games()
+    result = loadtest.soak_test(self.url, games=1, players=2, duration=0.2)
+
+    self.assertGreater(len(soak_games() - first_run), 0)
+    self.assertEqual(dict(result['errors']), {})
+
+if __name__ == '__main__':
+  unittest.main()
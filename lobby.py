@@ -0,0 +1,151 @@
+import bisect
+import heapq
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from uno import Game
+
+# Summaries of every game for the lobby, updated as games change so listing them
+# never touches the games themselves. Summaries are bucketed by status and number
+# of players, each bucket sorted by last activity, so a page of the most recently
+# active games is read with a binary search and a merge of the matching buckets:
+# it costs the page size, not the number of games.
+
+STATUSES = ('waiting', 'started', 'finished')
+PAGE_SIZE     = 50
+MAX_PAGE_SIZE = 500
+
+def game_status(game: Game) -> str:
+  if game.finished:
+    return 'finished'
+
+  return 'started' if game.started else 'waiting'
+
+# Sorts summaries by last activity, ties broken by id.
+SortKey = Tuple[float, str]
+
+class GameSummary(object):
+  def __init__(self, game: Game, last_activity: float) -> None:
+    self.id             = game.id
+    self.status         = game_status(game)
+    self.players        = len(game.players)
+    self.current_player = game.get_current_player().id if game.started else None
+    self.winner_id      = game.winner.id if game.winner is not None else None
+    self.version        = game.version
+    self.last_activity  = last_activity
+
+  def key(self) -> SortKey:
+    return (self.last_activity, self.id)
+
+  def bucket(self) -> Tuple[str, int]:
+    return (self.status, self.players)
+
+  def as_dict(self) -> dict:
+    return {
+      'id': self.id,
+      'status': self.status,
+      'players': self.players,
+      'current_player': self.current_player,
+      'winner_id': self.winner_id,
+      'version': self.version,
+      'last_activity': self.last_activity
+    }
+
+def encode_cursor(key: SortKey) -> str:
+  return f"{key[0]!r}:{key[1]}"
+
+def decode_cursor(cursor: str) -> SortKey:
+  last_activity, _, game_id = cursor.partition(':')
+  return (float(last_activity), game_id)
+
+class Lobby(object):
+  def __init__(self, clock: Callable[[], float] = time.time) -> None:
+    self.clock = clock
+    self._lock = threading.Lock()
+    self._summaries: Dict[str, GameSummary] = {}
+    # (status, players) -> sort keys of the summaries in that bucket, oldest first.
+    self._buckets: Dict[Tuple[str, int], List[SortKey]] = {}
+
+  def update(self, game: Game):
+    # Called on every change of game, with the game's lock held.
+    summary = GameSummary(game, self.clock())
+    with self._lock:
+      self._discard(game.id)
+      self._summaries[game.id] = summary
+      keys = self._buckets.setdefault(summary.bucket(), [])
+      if not keys or keys[-1] < summary.key():
+        keys.append(summary.key())
+      else:
+        # The clock went back.
+        bisect.insort(keys, summary.key())
+
+  def remove(self, game_id: str):
+    with self._lock:
+      self._discard(game_id)
+
+  def _discard(self, game_id: str):
+    # Callers hold the lock.
+    summary = self._summaries.pop(game_id, None)
+    if summary is None:
+      return
+
+    keys = self._buckets[summary.bucket()]
+    del keys[bisect.bisect_left(keys, summary.key())]
+
+  def get(self, game_id: str) -> Optional[GameSummary]:
+    return self._summaries.get(game_id)
+
+  def counts(self) -> Dict[str, int]:
+    with self._lock:
+      counts = {status: 0 for status in STATUSES}
+      for (status, _), keys in self._buckets.items():
+        counts[status] += len(keys)
+
+    return counts
+
+  def page(
+    self,
+    statuses: Iterable[str] = STATUSES,
+    players: int = None,
+    active_since: float = None,
+    limit: int = PAGE_SIZE,
+    cursor: str = None
+  ) -> dict:
+    # The most recently active games first. cursor is the 'next' of the previous
+    # page, games active since then show up again on the first page, not on later ones.
+    statuses = set(statuses)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    before = decode_cursor(cursor) if cursor is not None else None
+
+    with self._lock:
+      buckets = [
+        keys for (status, num_players), keys in self._buckets.items()
+        if status in statuses and (players is None or num_players == players)
+      ]
+      newest_first = heapq.merge(*[self._newest_first(keys, before) for keys in buckets], reverse=True)
+
+      games = []
+      more = False
+      for key in newest_first:
+        if active_since is not None and key[0] < active_since:
+          break
+        if len(games) == limit:
+          more = True
+          break
+        games.append(self._summaries[key[1]].as_dict())
+
+    return {
+      'games': games,
+      'next': encode_cursor((games[-1]['last_activity'], games[-1]['id'])) if more else None,
+      'counts': self.counts()
+    }
+
+  @staticmethod
+  def _newest_first(keys: List[SortKey], before: Optional[SortKey]) -> Iterator[SortKey]:
+    end = bisect.bisect_left(keys, before) if before is not None else len(keys)
+    for i in range(end - 1, -1, -1):
+      yield keys[i]
+
+  def __len__(self) -> int:
+    return len(self._summaries)
@@ -0,0 +1,64 @@
+import unittest
+
+from lobby import Lobby
+from uno import Game, Play, Player
+
+class FakeClock(object):
+  def __init__(self) -> None:
+    self.now = 1000.0
+
+  def __call__(self) -> float:
+    self.now += 1
+    return self.now
+
+def new_game(game_id: str, num_players: int = 2) -> Game:
+  return Game([Player(f"Player {i + 1}", 'red') for i in range(num_players)], game_id, seed=1)
+
+class LobbyTest(unittest.TestCase):
+  def setUp(self):
+    self.lobby = Lobby(clock=FakeClock())
+    self.games = [new_game(str(i), 2 + i % 2) for i in range(10)]
+    for game in self.games:
+      self.lobby.update(game)
+
+  def ids(self, page: dict) -> list:
+    return [g['id'] for g in page['games']]
+
+  def test_page_newestFirst(self):
+    page = self.lobby.page(limit=3)
+
+    self.assertEqual(self.ids(page), ['9', '8', '7'])
+    self.assertEqual(self.ids(self.lobby.page(limit=3, cursor=page['next'])), ['6', '5', '4'])
+    self.assertEqual(page['counts'], {'waiting': 10, 'started': 0, 'finished': 0})
+
+  def test_page_lastPageHasNoNext(self):
+    page = self.lobby.page(limit=10)
+
+    self.assertEqual(len(page['games']), 10)
+    self.assertIsNone(page['next'])
+
+  def test_update_movesGameToItsStatus(self):
+    game = self.games[2]
+    game.start()
+    self.lobby.update(game)
+    game.progress(Play(game.get_current_player(), 'pass'))
+    self.lobby.update(game)
+
+    started = self.lobby.page(statuses=['started'])
+    self.assertEqual(self.ids(started), ['2'])
+    self.assertEqual(started['games'][0]['version'], 2)
+    self.assertNotIn('2', self.ids(self.lobby.page(statuses=['waiting'])))
+    self.assertEqual(self.ids(self.lobby.page(limit=1)), ['2'])
+
+  def test_filters(self):
+    self.assertEqual(self.ids(self.lobby.page(players=3)), ['9', '7', '5', '3', '1'])
+    self.assertEqual(self.ids(self.lobby.page(active_since=1008)), ['9', '8', '7'])
+
+  def test_remove(self):
+    self.lobby.remove('9')
+
+    self.assertEqual(self.ids(self.lobby.page(limit=1)), ['8'])
+    self.assertEqual(len(self.lobby), 9)
+
+if __name__ == '__main__':
+  unittest.main()
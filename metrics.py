@@ -0,0 +1,194 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from uno import Deck, Game
+
+# Latency histograms and counters, rendered in the Prometheus text format.
+#
+# The game's hot paths (HOT_PATHS) are timed by wrapping the methods on their
+# classes while metrics are enabled. Disabling puts the original methods back,
+# so instrumentation costs nothing while it is off.
+
+# Upper bounds in seconds, from 10us for a single move to a slow request.
+BUCKETS = (
+  0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+  0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+class Histogram(object):
+  def __init__(self, buckets: Tuple[float, ...]) -> None:
+    self.buckets = buckets
+    # One more than the buckets for the values above the last bound (+Inf).
+    self.counts  = [0] * (len(buckets) + 1)
+    self.sum     = 0.0
+    self.count   = 0
+
+  def observe(self, value: float):
+    self.counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.sum   += value
+    self.count += 1
+
+class Family(object):
+  # A metric and all its label combinations, kind is 'histogram' or 'counter'.
+  def __init__(self, name: str, help: str, kind: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...] = BUCKETS) -> None:
+    self.name        = name
+    self.help        = help
+    self.kind        = kind
+    self.label_names = label_names
+    self.buckets     = buckets
+    self.children: Dict[tuple, object] = {}
+    self._lock = threading.Lock()
+
+  def observe(self, labels: tuple, value: float):
+    with self._lock:
+      histogram = self.children.get(labels)
+      if histogram is None:
+        histogram = self.children[labels] = Histogram(self.buckets)
+      histogram.observe(value)
+
+  def inc(self, labels: tuple, amount: float = 1):
+    with self._lock:
+      self.children[labels] = self.children.get(labels, 0) + amount
+
+  def _labels(self, labels: tuple, extra: str = None) -> str:
+    pairs = [f'{name}="{escape(str(value))}"' for name, value in zip(self.label_names, labels)]
+    if extra is not None:
+      pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+  def render(self) -> List[str]:
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+    with self._lock:
+      children = sorted(self.children.items())
+      if self.kind == 'histogram':
+        children = [(labels, (list(h.counts), h.sum, h.count)) for labels, h in children]
+
+    for labels, value in children:
+      if self.kind == 'counter':
+        lines.append(f"{self.name}{self._labels(labels)} {value}")
+        continue
+
+      counts, total, count = value
+      cumulative = 0
+      for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+        cumulative += bucket_count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        bucket_labels = self._labels(labels, 'le="' + le + '"')
+        lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+      lines.append(f"{self.name}_sum{self._labels(labels)} {total}")
+      lines.append(f"{self.name}_count{self._labels(labels)} {count}")
+
+    return lines
+
+def escape(value: str) -> str:
+  return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics(object):
+  def __init__(self) -> None:
+    self.families: Dict[str, Family] = {}
+    self.enabled = False
+
+  def histogram(self, name: str, help: str, label_names: Tuple[str, ...] = ()) -> Family:
+    return self._family(Family(name, help, 'histogram', label_names))
+
+  def counter(self, name: str, help: str, label_names: Tuple[str, ...] = ()) -> Family:
+    return self._family(Family(name, help, 'counter', label_names))
+
+  def _family(self, family: Family) -> Family:
+    self.families[family.name] = family
+    return family
+
+  def render(self, gauges: Iterable[Tuple[str, str, float]] = ()) -> str:
+    # gauges are (name, help, value) computed by the caller at scrape time.
+    lines = []
+    for name, help, value in gauges:
+      lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"])
+    for family in self.families.values():
+      lines.extend(family.render())
+
+    return '\n'.join(lines) + '\n'
+
+METRICS = Metrics()
+
+PROGRESS  = METRICS.histogram('pyuno_game_progress_seconds', 'Time spent in Game.progress, by action.', ('action',))
+PLAY      = METRICS.histogram('pyuno_game_play_seconds', 'Time spent in Game.play.')
+DECK_DRAW = METRICS.histogram('pyuno_deck_draw_seconds', 'Time spent in Deck.draw.')
+SERIALIZE = METRICS.histogram('pyuno_serialize_seconds', 'Time spent rendering views to JSON, by view.', ('view',))
+REQUESTS  = METRICS.histogram('pyuno_http_request_seconds', 'Request latency, by route.', ('method', 'route'))
+RESPONSES = METRICS.counter('pyuno_http_responses_total', 'Responses sent, by route and status.', ('method', 'route', 'status'))
+
+def timed(method: Callable, family: Family, labels: Optional[Callable[..., tuple]] = None) -> Callable:
+  # Wraps method so each call is observed in family, labels gets the call's arguments.
+  # Calls labels returns None for are not observed.
+  def instrumented(*args, **kwargs):
+    start = time.perf_counter()
+    try:
+      return method(*args, **kwargs)
+    finally:
+      label_values = labels(*args, **kwargs) if labels is not None else ()
+      if label_values is not None:
+        family.observe(label_values, time.perf_counter() - start)
+
+  instrumented.__wrapped__ = method
+  return instrumented
+
+def progress_labels(game: Game, play, snapshot=None, **_) -> Optional[tuple]:
+  # What-if moves on a snapshot leave the game as it is, they are not its moves.
+  return (play.action,) if snapshot is None else None
+
+HOT_PATHS = [
+  (Game, 'progress', PROGRESS, progress_labels),
+  (Game, 'play', PLAY, None),
+  (Deck, 'draw', DECK_DRAW, None),
+]
+
+_toggle_lock = threading.Lock()
+
+def enable():
+  with _toggle_lock:
+    if METRICS.enabled:
+      return
+
+    for cls, name, family, labels in HOT_PATHS:
+      setattr(cls, name, timed(cls.__dict__[name], family, labels))
+    METRICS.enabled = True
+
+def disable():
+  with _toggle_lock:
+    if not METRICS.enabled:
+      return
+
+    for cls, name, _, _ in HOT_PATHS:
+      setattr(cls, name, cls.__dict__[name].__wrapped__)
+    METRICS.enabled = False
+
+def is_enabled() -> bool:
+  return METRICS.enabled
+
+def time_call(family: Family, labels: tuple, function: Callable, *args):
+  # function(*args), observed in family only while metrics are enabled.
+  if not METRICS.enabled:
+    return function(*args)
+
+  start = time.perf_counter()
+  try:
+    return function(*args)
+  finally:
+    family.observe(labels, time.perf_counter() - start)
+
+def record_request(method: str, route: str, status: int, seconds: float):
+  REQUESTS.observe((method, route), seconds)
+  RESPONSES.inc((method, route, status))
+
+def cards_in_play(games: Iterable[Game]) -> int:
+  # Cards in hands and on discard piles, read without the games' locks.
+  return sum(sum(len(p.hand) for p in game.players) + len(game.discard_pile) for game in games)
+
+def render(games: Callable[[], Iterable[Game]], active_games: int) -> str:
+  return METRICS.render([
+    ('pyuno_metrics_enabled', 'Whether hot path instrumentation is on.', int(METRICS.enabled)),
+    ('pyuno_active_games', 'Games in memory.', active_games),
+    ('pyuno_cards_in_play', 'Cards in hands and on discard piles of games in memory.', cards_in_play(games())),
+  ])
@@ -0,0 +1,65 @@
+import unittest
+
+import metrics
+from uno import Game, Play, Player
+
+class MetricsTest(unittest.TestCase):
+  def setUp(self):
+    self.was_enabled = metrics.is_enabled()
+
+  def tearDown(self):
+    if self.was_enabled:
+      metrics.enable()
+    else:
+      metrics.disable()
+
+  def test_histogram_render(self):
+    family = metrics.Family('test_seconds', 'Test.', 'histogram', ('action',), buckets=(0.1, 1.0))
+    family.observe(('pass',), 0.05)
+    family.observe(('pass',), 0.5)
+    family.observe(('pass',), 5)
+
+    self.assertEqual(family.render(), [
+      '# HELP test_seconds Test.',
+      '# TYPE test_seconds histogram',
+      'test_seconds_bucket{action="pass",le="0.1"} 1',
+      'test_seconds_bucket{action="pass",le="1.0"} 2',
+      'test_seconds_bucket{action="pass",le="+Inf"} 3',
+      'test_seconds_sum{action="pass"} 5.55',
+      'test_seconds_count{action="pass"} 3'
+    ])
+
+  def test_enable_timesProgressByAction(self):
+    metrics.enable()
+    game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')])
+    game.start()
+    before = metrics.PROGRESS.children[('draw',)].count if ('draw',) in metrics.PROGRESS.children else 0
+
+    game.progress(Play(game.get_current_player(), 'draw'))
+
+    self.assertEqual(metrics.PROGRESS.children[('draw',)].count, before + 1)
+
+  def test_enable_skipsSnapshotProgress(self):
+    metrics.enable()
+    game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')])
+    game.start()
+    game.progress(Play(game.get_current_player(), 'draw'))
+    before = metrics.PROGRESS.children[('draw',)].count
+
+    game.progress(Play(game.get_current_player(), 'draw'), snapshot=game.snapshot())
+    game.progress(Play(game.get_current_player(), 'draw'), game.snapshot())
+
+    self.assertEqual(metrics.PROGRESS.children[('draw',)].count, before)
+
+  def test_disable_restoresMethods(self):
+    metrics.disable()
+    original = Game.__dict__['progress']
+    metrics.enable()
+    self.assertIsNot(Game.__dict__['progress'], original)
+
+    metrics.disable()
+    metrics.disable()
+    self.assertIs(Game.__dict__['progress'], original)
+
+if __name__ == '__main__':
+  unittest.main()
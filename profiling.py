@@ -0,0 +1,114 @@
+import argparse
+import cProfile
+import glob
+import itertools
+import os
+import pstats
+import time
+from typing import List, Optional
+
+# Opt-in cProfile of sampled work: one in every N requests or simulated games,
+# and everything touching one game id. Each profile is written as a pstats file
+# to a directory that keeps only the newest MAX_PROFILES of them, e.g.
+#
+#   PYUNO_PROFILE_DIR=profiles PYUNO_PROFILE_EVERY=100 waitress-serve webserver:app
+#   python simulator.py -n 1000 --profile profiles
+#   python profiling.py profiles --top 20
+
+PROFILE_EVERY = 100
+MAX_PROFILES  = 200
+PROFILE_SUFFIX = '.prof'
+
+class Profiler(object):
+  def __init__(self, directory: str, every: int = PROFILE_EVERY, game_id: str = None, max_profiles: int = MAX_PROFILES) -> None:
+    self.directory    = directory
+    self.every        = every
+    self.game_id      = game_id
+    self.max_profiles = max_profiles
+    self._counter     = itertools.count()
+
+    os.makedirs(directory, exist_ok=True)
+
+  def should_profile(self, game_id: str = None) -> bool:
+    if self.game_id is not None:
+      return game_id == self.game_id
+
+    return self.every > 0 and next(self._counter) % self.every == 0
+
+  def start(self) -> Optional[cProfile.Profile]:
+    # None if another profile is already running where only one can (Python 3.12+).
+    profile = cProfile.Profile()
+    try:
+      profile.enable()
+    except ValueError:
+      return None
+
+    return profile
+
+  def stop(self, profile: cProfile.Profile, name: str) -> str:
+    profile.disable()
+    safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+    path = os.path.join(self.directory, f"{time.time_ns()}-{os.getpid()}-{safe_name}{PROFILE_SUFFIX}")
+    profile.dump_stats(path)
+    self._rotate()
+    return path
+
+  def _rotate(self):
+    profiles = list_profiles(self.directory)
+    for path in profiles[:max(0, len(profiles) - self.max_profiles)]:
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        # Another worker rotated it away already.
+        pass
+
+def list_profiles(directory: str) -> List[str]:
+  # Oldest first, file names start with the time they were written.
+  return sorted(glob.glob(os.path.join(directory, f"*{PROFILE_SUFFIX}")), key=os.path.basename)
+
+def top_functions(directory: str, top: int = 20, module: str = 'uno.py') -> dict:
+  # Functions from files named module, by cumulative time over every profile in directory.
+  paths = []
+  stats = None
+  for path in list_profiles(directory):
+    try:
+      if stats is None:
+        stats = pstats.Stats(path)
+      else:
+        stats.add(path)
+      paths.append(path)
+    except (OSError, EOFError, TypeError, ValueError):
+      # Being written or rotated away right now.
+      continue
+
+  functions = []
+  if stats is not None:
+    for (filename, line, name), (_, calls, total_time, cumulative_time, _) in stats.stats.items():
+      if module is None or os.path.basename(filename) == module:
+        functions.append({
+          'function': f"{os.path.basename(filename)}:{line}({name})",
+          'calls': calls,
+          'total_time': total_time,
+          'cumulative_time': cumulative_time
+        })
+
+  functions.sort(key=lambda f: f['cumulative_time'], reverse=True)
+  return {'profiles': len(paths), 'functions': functions[:top]}
+
+def print_summary(summary: dict):
+  print(f"Profiles: {summary['profiles']}")
+  print(f"{'cumulative':>12} {'total':>12} {'calls':>10}  function")
+  for f in summary['functions']:
+    print(f"{f['cumulative_time'] * 1e3:>10.2f}ms {f['total_time'] * 1e3:>10.2f}ms {f['calls']:>10}  {f['function']}")
+
+def main():
+  parser = argparse.ArgumentParser(description='List the slowest functions over the profiles in a directory.')
+  parser.add_argument('directory', help='profile directory, as given to the server or the simulator')
+  parser.add_argument('--top', type=int, default=20, help='how many functions to list')
+  parser.add_argument('--module', default='uno.py', help='only functions from files with this name, empty for all')
+  args = parser.parse_args()
+
+  print_summary(top_functions(args.directory, args.top, args.module or None))
+
+if __name__ == '__main__':
+  main()
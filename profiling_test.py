@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+
+import profiling
+from uno import Game, Player
+
+class ProfilerTest(unittest.TestCase):
+  def test_shouldProfile_oneInEvery(self):
+    with tempfile.TemporaryDirectory() as directory:
+      profiler = profiling.Profiler(directory, every=3)
+      self.assertEqual([profiler.should_profile() for _ in range(6)], [True, False, False, True, False, False])
+
+  def test_shouldProfile_gameId(self):
+    with tempfile.TemporaryDirectory() as directory:
+      profiler = profiling.Profiler(directory, game_id='slow')
+      self.assertEqual([profiler.should_profile('slow'), profiler.should_profile('other'), profiler.should_profile()], [True, False, False])
+
+  def test_stop_rotatesAndSummarizes(self):
+    with tempfile.TemporaryDirectory() as directory:
+      profiler = profiling.Profiler(directory, max_profiles=2)
+      for _ in range(3):
+        profile = profiler.start()
+        Game([Player('Player 1', 'red'), Player('Player 2', 'blue')]).start()
+        profiler.stop(profile, 'GET-/game/<game_id>')
+
+      self.assertEqual(len(os.listdir(directory)), 2)
+
+      summary = profiling.top_functions(directory, top=5)
+      self.assertEqual(summary['profiles'], 2)
+      self.assertTrue(summary['functions'])
+      self.assertTrue(all(f['function'].startswith('uno.py:') for f in summary['functions']))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,362 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from lobby import Lobby
+from store import GameStore, PickleStore
+from uno import Game
+
+DEFAULT_SHARDS = 16
+
+class LockStats(object):
+  def __init__(self) -> None:
+    self.acquisitions = 0
+    self.contended    = 0
+    self.wait_time    = 0.0
+    self.max_wait     = 0.0
+
+  def record(self, contended: bool, wait: float):
+    self.acquisitions += 1
+    if contended:
+      self.contended += 1
+      self.wait_time += wait
+      self.max_wait   = max(self.max_wait, wait)
+
+  def as_dict(self) -> dict:
+    return {
+      'acquisitions': self.acquisitions,
+      'contended': self.contended,
+      'wait_time': self.wait_time,
+      'max_wait': self.max_wait
+    }
+
+class EvictionPolicy(object):
+  # TTLs are in seconds, None disables that kind of eviction. With a spill_dir,
+  # evicted games are pickled there and loaded back the next time they are requested.
+  def __init__(
+    self,
+    finished_ttl: float = None,
+    idle_ttl: float = None,
+    max_games: int = None,
+    spill_dir: str = None,
+    sweep_interval: float = 60.0
+  ) -> None:
+    self.finished_ttl   = finished_ttl
+    self.idle_ttl       = idle_ttl
+    self.max_games      = max_games
+    self.spill_dir      = spill_dir
+    self.sweep_interval = sweep_interval
+
+class GameEntry(object):
+  def __init__(self, game: Game, now: float) -> None:
+    self.game        = game
+    self.lock        = threading.Lock()
+    self.changed     = threading.Condition(self.lock)
+    # Rendered views of the game, keyed by view, each tagged with the version it renders.
+    self.views: Dict[object, Tuple[int, object]] = {}
+    self.last_access = now
+    self.finished_at = now if game.finished else None
+    self.evicted     = False
+
+  def touch(self, now: float):
+    self.last_access = now
+    if self.finished_at is None and self.game.finished:
+      self.finished_at = now
+
+class GameLock(object):
+  # Context manager holding a single game's lock, returned by GameRegistry.locked.
+  def __init__(self, registry: 'GameRegistry', game_id: str, entry: GameEntry) -> None:
+    self.registry = registry
+    self.game_id  = game_id
+    self.entry    = entry
+    self.version  = None
+
+  def _acquire(self):
+    contended = not self.entry.lock.acquire(blocking=False)
+    wait = 0.0
+    if contended:
+      start = time.perf_counter()
+      self.entry.lock.acquire()
+      wait = time.perf_counter() - start
+
+    self.registry._record_lock(self.game_id, contended, wait)
+
+  def __enter__(self) -> Game:
+    self._acquire()
+
+    # The game may have been evicted between the lookup and getting its lock.
+    while self.entry.evicted:
+      self.entry.lock.release()
+      self.entry = self.registry._entry(self.game_id)
+      if self.entry is None:
+        raise KeyError(self.game_id)
+      self._acquire()
+
+    self.version = self.entry.game.version
+    return self.entry.game
+
+  def cached(self, key, build: Callable[[], object]):
+    # Only inside the with block. Rebuilds the view once the game version moves on.
+    version = self.entry.game.version
+    cached = self.entry.views.get(key)
+    if cached is None or cached[0] != version:
+      cached = (version, build())
+      self.entry.views[key] = cached
+
+    return cached[1]
+
+  def wait_for_version(self, version: int, timeout: float) -> bool:
+    # Only inside the with block. The game lock is released while waiting.
+    changed = self.entry.changed.wait_for(lambda: self.entry.game.version > version, timeout)
+    # Whoever changed the game already notified the other waiters.
+    self.version = self.entry.game.version
+    return changed
+
+  def __exit__(self, *exc_info):
+    # The lock is released whatever happens, or every later request on the game would hang.
+    try:
+      if self.entry.game.version != self.version:
+        self.entry.changed.notify_all()
+        self.registry.lobby.update(self.entry.game)
+        if self.registry.write_through:
+          self.registry._write_through(self.entry.game)
+    finally:
+      self.entry.touch(self.registry.clock())
+      self.entry.lock.release()
+
+# Games indexed by id across independently locked shards. Each game has its own
+# lock, so moves on one game are serialized without blocking any other game.
+# Shards are kept in least recently used order for the eviction policy's cap.
+#
+# Evicted games go to the store, if any, and are loaded back from it when asked
+# for again. With write_through every game is saved to the store each time it
+# changes too, e.g. so other processes can read it, and stays there once loaded.
+# The lobby keeps a summary of every game, evicted games included while they can
+# be loaded back.
+class GameRegistry(object):
+  def __init__(
+    self,
+    num_shards: int = DEFAULT_SHARDS,
+    policy: EvictionPolicy = None,
+    clock: Callable[[], float] = time.monotonic,
+    store: GameStore = None,
+    write_through: bool = False,
+    lobby: Lobby = None
+  ) -> None:
+    self.policy = policy if policy is not None else EvictionPolicy()
+    self.clock  = clock
+    if store is None and self.policy.spill_dir is not None:
+      store = PickleStore(self.policy.spill_dir)
+    self.store         = store
+    self.write_through = write_through and store is not None
+    self.lobby         = lobby if lobby is not None else Lobby()
+
+    self._shards: List[Dict[str, GameEntry]] = [OrderedDict() for _ in range(num_shards)]
+    self._shard_locks = [threading.Lock() for _ in range(num_shards)]
+    self._shard_stats = [LockStats() for _ in range(num_shards)]
+    # Eviction reasons and restores, per shard so they are guarded by the shard lock.
+    self._shard_counts = [Counter() for _ in range(num_shards)]
+    self._shard_cap    = math.ceil(self.policy.max_games / num_shards) if self.policy.max_games else None
+
+    self._last_sweep = self.clock()
+    self._sweep_lock = threading.Lock()
+
+  def _shard_index(self, game_id: str) -> int:
+    return hash(game_id) % len(self._shards)
+
+  def _lookup(self, index: int, game_id: str) -> Optional[GameEntry]:
+    # Callers hold the shard lock.
+    shard = self._shards[index]
+    entry = shard.get(game_id)
+    if entry is None:
+      entry = self._restore(index, game_id)
+    else:
+      shard.move_to_end(game_id)
+
+    return entry
+
+  def _entry(self, game_id: str) -> Optional[GameEntry]:
+    self.maybe_sweep()
+    index = self._shard_index(game_id)
+    with self._shard_locks[index]:
+      return self._lookup(index, game_id)
+
+  def _insert(self, index: int, game: Game) -> GameEntry:
+    # Callers hold the shard lock.
+    entry = GameEntry(game, self.clock())
+    shard = self._shards[index]
+    shard[game.id] = entry
+    shard.move_to_end(game.id)
+    self.lobby.update(game)
+
+    if self._shard_cap is not None:
+      for game_id in list(shard.keys()):
+        if len(shard) <= self._shard_cap:
+          break
+        if game_id != game.id:
+          self._evict(index, game_id, 'lru')
+
+    return entry
+
+  def get(self, game_id: str) -> Optional[Game]:
+    entry = self._entry(game_id)
+    return entry.game if entry is not None else None
+
+  def get_or_create(self, game_id: str, factory: Callable[[], Game]) -> Tuple[Game, bool]:
+    self.maybe_sweep()
+    index = self._shard_index(game_id)
+    with self._shard_locks[index]:
+      entry = self._lookup(index, game_id)
+      if entry is not None:
+        return entry.game, False
+
+      return self._insert(index, factory()).game, True
+
+  def add(self, game: Game):
+    index = self._shard_index(game.id)
+    with self._shard_locks[index]:
+      self._insert(index, game)
+
+    if self.write_through:
+      self._write_through(game)
+
+  def _write_through(self, game: Game):
+    # The game in memory stays the one served. A failed save is not the move's
+    # fault, so it is reported and the store catches up on the game's next change.
+    try:
+      self.store.save(game)
+    except Exception as e:
+      print(f"Could not save game {game.id}: {e!r}")
+
+  def remove(self, game_id: str) -> Optional[Game]:
+    index = self._shard_index(game_id)
+    with self._shard_locks[index]:
+      entry = self._shards[index].pop(game_id, None)
+      if self.store is not None:
+        self.store.delete(game_id)
+    self.lobby.remove(game_id)
+
+    return entry.game if entry is not None else None
+
+  def locked(self, game_id: str) -> GameLock:
+    # Raises KeyError right away for unknown games, before anything is locked.
+    entry = self._entry(game_id)
+    if entry is None:
+      raise KeyError(game_id)
+
+    return GameLock(self, game_id, entry)
+
+  def _record_lock(self, game_id: str, contended: bool, wait: float):
+    index = self._shard_index(game_id)
+    with self._shard_locks[index]:
+      self._shard_stats[index].record(contended, wait)
+
+  def games(self) -> Iterator[Game]:
+    for index, shard in enumerate(self._shards):
+      with self._shard_locks[index]:
+        entries = list(shard.values())
+
+      for entry in entries:
+        yield entry.game
+
+  def _evict(self, index: int, game_id: str, reason: str) -> bool:
+    # Callers hold the shard lock. Games being played right now are left alone.
+    entry = self._shards[index][game_id]
+    if not entry.lock.acquire(blocking=False):
+      return False
+
+    try:
+      if self.store is not None:
+        self.store.save(entry.game)
+      else:
+        self.lobby.remove(game_id)
+
+      del self._shards[index][game_id]
+      entry.evicted = True
+      self._shard_counts[index][reason] += 1
+    finally:
+      entry.lock.release()
+
+    return True
+
+  def _restore(self, index: int, game_id: str) -> Optional[GameEntry]:
+    # Callers hold the shard lock.
+    if self.store is None:
+      return None
+
+    game = self.store.load(game_id)
+    if game is None:
+      return None
+
+    if not self.write_through:
+      self.store.delete(game_id)
+    self._shard_counts[index]['restored'] += 1
+    return self._insert(index, game)
+
+  def maybe_sweep(self):
+    now = self.clock()
+    if now - self._last_sweep < self.policy.sweep_interval:
+      return
+
+    # Only one request pays for the sweep, the others carry on.
+    if not self._sweep_lock.acquire(blocking=False):
+      return
+
+    try:
+      self._last_sweep = now
+      self.evict_expired(now)
+    finally:
+      self._sweep_lock.release()
+
+  def evict_expired(self, now: float = None) -> int:
+    if now is None:
+      now = self.clock()
+
+    finished_ttl = self.policy.finished_ttl
+    idle_ttl     = self.policy.idle_ttl
+    evicted = 0
+
+    for index, shard in enumerate(self._shards):
+      with self._shard_locks[index]:
+        for game_id, entry in list(shard.items()):
+          if finished_ttl is not None and entry.finished_at is not None and now - entry.finished_at >= finished_ttl:
+            evicted += self._evict(index, game_id, 'finished')
+          elif idle_ttl is not None and now - entry.last_access >= idle_ttl:
+            evicted += self._evict(index, game_id, 'idle')
+
+    return evicted
+
+  def stats(self) -> dict:
+    totals = LockStats()
+    counts = Counter()
+    for index, stats in enumerate(self._shard_stats):
+      with self._shard_locks[index]:
+        totals.acquisitions += stats.acquisitions
+        totals.contended    += stats.contended
+        totals.wait_time    += stats.wait_time
+        totals.max_wait      = max(totals.max_wait, stats.max_wait)
+        counts.update(self._shard_counts[index])
+
+    restored = counts.pop('restored', 0)
+    return {
+      'games': len(self),
+      'shards': len(self._shards),
+      'locks': totals.as_dict(),
+      'evictions': dict(counts),
+      'restored': restored
+    }
+
+  def __contains__(self, game_id: str) -> bool:
+    return self._entry(game_id) is not None
+
+  def __getitem__(self, game_id: str) -> Game:
+    entry = self._entry(game_id)
+    if entry is None:
+      raise KeyError(game_id)
+
+    return entry.game
+
+  def __len__(self) -> int:
+    return sum(len(shard) for shard in self._shards)
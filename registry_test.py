@@ -0,0 +1,159 @@
+import tempfile
+import threading
+import unittest
+
+from registry import EvictionPolicy, GameRegistry
+from store import MemoryStore
+from uno import Game, Play, Player
+
+def new_game(game_id: str) -> Game:
+  return Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], game_id)
+
+class FailingStore(MemoryStore):
+  def save(self, game: Game):
+    raise ValueError(game.id)
+
+class GameRegistryTest(unittest.TestCase):
+  def test_getOrCreate_createsOnce(self):
+    registry = GameRegistry()
+
+    game, created = registry.get_or_create('abc', lambda: new_game('abc'))
+    same_game, created_again = registry.get_or_create('abc', lambda: new_game('abc'))
+
+    self.assertTrue(created)
+    self.assertFalse(created_again)
+    self.assertIs(game, same_game)
+    self.assertIn('abc', registry)
+    self.assertEqual(len(registry), 1)
+
+  def test_locked_unknownGame(self):
+    self.assertRaises(KeyError, GameRegistry().locked, 'abc')
+
+  def test_locked_serializesMoves(self):
+    registry = GameRegistry(num_shards=2)
+    registry.add(new_game('abc'))
+    counter = {'value': 0}
+
+    def worker():
+      for _ in range(1000):
+        with registry.locked('abc'):
+          counter['value'] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertEqual(counter['value'], 4000)
+    self.assertEqual(registry.stats()['locks']['acquisitions'], 4000)
+
+  def test_waitForVersion_wakesOnProgress(self):
+    registry = GameRegistry()
+    game = new_game('abc')
+    game.start()
+    registry.add(game)
+    result = {}
+
+    def waiter():
+      lock = registry.locked('abc')
+      with lock:
+        result['changed'] = lock.wait_for_version(game.version, timeout=5)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    with registry.locked('abc') as locked_game:
+      locked_game.progress(Play(locked_game.get_current_player(), 'pass'))
+    thread.join()
+
+    self.assertTrue(result['changed'])
+
+  def test_waitForVersion_timeout(self):
+    registry = GameRegistry()
+    registry.add(new_game('abc'))
+
+    lock = registry.locked('abc')
+    with lock as game:
+      self.assertFalse(lock.wait_for_version(game.version, timeout=0.01))
+
+  def test_locked_failedSaveReleasesLock(self):
+    registry = GameRegistry(store=FailingStore(), write_through=True)
+    game = new_game('abc')
+    registry.add(game)
+
+    with registry.locked('abc') as locked_game:
+      locked_game.start()
+
+    self.assertTrue(registry.locked('abc').entry.lock.acquire(blocking=False))
+
+  def test_locked_releasedOnError(self):
+    registry = GameRegistry()
+    registry.add(new_game('abc'))
+
+    with self.assertRaises(ValueError):
+      with registry.locked('abc'):
+        raise ValueError()
+
+    self.assertTrue(registry.locked('abc').entry.lock.acquire(blocking=False))
+
+  def test_remove(self):
+    registry = GameRegistry()
+    registry.add(new_game('abc'))
+
+    self.assertEqual(registry.remove('abc').id, 'abc')
+    self.assertIsNone(registry.get('abc'))
+    self.assertIsNone(registry.remove('abc'))
+
+class FakeClock(object):
+  def __init__(self) -> None:
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+class EvictionTest(unittest.TestCase):
+  def test_evictExpired_finishedAndIdle(self):
+    clock = FakeClock()
+    registry = GameRegistry(policy=EvictionPolicy(finished_ttl=10, idle_ttl=100), clock=clock)
+    registry.add(new_game('finished'))
+    registry.add(new_game('idle'))
+
+    with registry.locked('finished') as game:
+      game.finish()
+
+    clock.now = 50
+    self.assertEqual(registry.evict_expired(), 1)
+    self.assertNotIn('finished', registry)
+
+    clock.now = 150
+    self.assertEqual(registry.evict_expired(), 1)
+    self.assertEqual(len(registry), 0)
+    self.assertEqual(registry.stats()['evictions'], {'finished': 1, 'idle': 1})
+
+  def test_maxGames_evictsLeastRecentlyUsed(self):
+    registry = GameRegistry(num_shards=1, policy=EvictionPolicy(max_games=2))
+    registry.add(new_game('a'))
+    registry.add(new_game('b'))
+    registry.get('a')
+    registry.add(new_game('c'))
+
+    self.assertIn('a', registry)
+    self.assertNotIn('b', registry)
+    self.assertIn('c', registry)
+
+  def test_spill_restoresEvictedGame(self):
+    with tempfile.TemporaryDirectory() as spill_dir:
+      clock = FakeClock()
+      registry = GameRegistry(policy=EvictionPolicy(idle_ttl=10, spill_dir=spill_dir), clock=clock)
+      game = new_game('abc')
+      game.start()
+      registry.add(game)
+
+      clock.now = 20
+      registry.evict_expired()
+      self.assertEqual(len(registry), 0)
+
+      restored = registry['abc']
+      self.assertEqual(restored.get_discard_top().id, game.get_discard_top().id)
+      self.assertEqual([c.id for c in restored.players[0].hand], [c.id for c in game.players[0].hand])
+      self.assertEqual(registry.stats()['restored'], 1)
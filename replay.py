@@ -0,0 +1,111 @@
+import argparse
+import json
+import time
+from typing import List, Tuple
+
+from journal import move_play, read_entries
+from uno import Game, Player
+
+# A replay record is a game seed, its players and the list of moves made, e.g.
+#
+# {
+#   "seed": 42,
+#   "game_id": "abc",
+#   "players": [{"id": "p1", "name": "Raphael", "color": "red"}, ...],
+#   "moves": [{"player_id": "p1", "action": "play", "card_id": "12", "suit": null}, ...]
+# }
+#
+# Moves have the same shape as journal play entries.
+
+def record_game(game: Game) -> dict:
+  return {
+    'seed': game.seed,
+    'game_id': game.id,
+    'players': [{'id': p.id, 'name': p.name, 'color': p.color} for p in game.players],
+    'moves': [
+      {
+        'player_id': play.player.id,
+        'action': play.action,
+        'card_id': play.card.id if play.card is not None else None,
+        'suit': play.suit
+      }
+      for play in game.plays
+    ]
+  }
+
+def record_from_journal(directory: str, game_id: str) -> dict:
+  record = None
+  for entry in read_entries(directory):
+    if entry['game_id'] != game_id:
+      continue
+
+    if entry['type'] == 'start':
+      record = {'seed': entry['seed'], 'game_id': game_id, 'players': entry['players'], 'moves': []}
+    elif record is not None:
+      record['moves'].append(entry)
+
+  if record is None:
+    raise ValueError(f"No start for game {game_id} in journal {directory}")
+
+  return record
+
+def replay_game(record: dict) -> Tuple[Game, List[float]]:
+  players = [Player(p['name'], p['color'], id=p['id']) for p in record['players']]
+  game = Game(players, record.get('game_id'), seed=record['seed'])
+  game.start()
+
+  timings = []
+  for move in record['moves']:
+    play = move_play(game, move)
+    start = time.perf_counter()
+    game.progress(play)
+    timings.append(time.perf_counter() - start)
+
+  return game, timings
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+  return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def print_timings(record: dict, timings: List[float], top: int):
+  if not timings:
+    print("No moves to replay.")
+    return
+
+  ordered = sorted(timings)
+  print(f"Moves:  {len(timings)}")
+  print(f"Total:  {sum(timings) * 1e3:.3f}ms")
+  print(f"Mean:   {sum(timings) / len(timings) * 1e6:.1f}us")
+  print(f"p50:    {percentile(ordered, 0.5) * 1e6:.1f}us")
+  print(f"p99:    {percentile(ordered, 0.99) * 1e6:.1f}us")
+  print(f"Max:    {ordered[-1] * 1e6:.1f}us")
+
+  print(f"Slowest {top} moves:")
+  slowest = sorted(range(len(timings)), key=lambda i: timings[i], reverse=True)[:top]
+  for i in slowest:
+    move = record['moves'][i]
+    print(f"  #{i:<5} {move['action']:<5} {move['card_id'] or '':<5} {timings[i] * 1e6:.1f}us")
+
+def main():
+  parser = argparse.ArgumentParser(description='Replay a game from its seed and moves, timing every move.')
+  parser.add_argument('record', nargs='?', help='replay record JSON file')
+  parser.add_argument('--journal', help='read the game from this journal directory instead')
+  parser.add_argument('--game', help='game id to read from the journal')
+  parser.add_argument('--top', type=int, default=10, help='how many of the slowest moves to list')
+  args = parser.parse_args()
+
+  if args.journal is not None:
+    if args.game is None:
+      parser.error('--journal needs --game')
+    record = record_from_journal(args.journal, args.game)
+  elif args.record is not None:
+    with open(args.record) as f:
+      record = json.load(f)
+  else:
+    parser.error('either a record file or --journal is required')
+
+  game, timings = replay_game(record)
+  print_timings(record, timings, args.top)
+  print(f"Finished: {game.finished}, version {game.version}")
+
+if __name__ == '__main__':
+  main()
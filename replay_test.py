@@ -0,0 +1,38 @@
+import json
+import random
+import unittest
+
+from replay import record_game, replay_game
+from simulator import play_turn, greedy_policy
+from uno import Game, Player
+
+def new_players():
+  return [Player('Player 1', 'red', id='p1'), Player('Player 2', 'blue', id='p2')]
+
+class ReplayTest(unittest.TestCase):
+  def test_sameSeed_sameGame(self):
+    first, second = Game(new_players(), seed=7), Game(new_players(), seed=7)
+    first.start()
+    second.start()
+
+    self.assertEqual(first.id, second.id)
+    self.assertEqual(first.deck.id, second.deck.id)
+    self.assertEqual([c.id for c in first.deck.cards], [c.id for c in second.deck.cards])
+    self.assertNotEqual(first.id, Game(new_players(), seed=8).id)
+
+  def test_replayGame_reproducesState(self):
+    game = Game(new_players(), seed=11)
+    game.start()
+    rng = random.Random(11)
+    for _ in range(60):
+      if game.is_finished():
+        break
+      play_turn(game, greedy_policy, rng)
+
+    record = json.loads(json.dumps(record_game(game)))
+    replayed, timings = replay_game(record)
+
+    self.assertEqual(len(timings), len(game.plays))
+    self.assertEqual(replayed.version, game.version)
+    self.assertEqual([c.id for c in replayed.discard_pile], [c.id for c in game.discard_pile])
+    self.assertEqual([[c.id for c in p.hand] for p in replayed.players], [[c.id for c in p.hand] for p in game.players])
@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+import zlib
+from typing import AsyncIterator, List, Tuple
+from urllib.parse import parse_qs, quote
+
+from lobby import MAX_PAGE_SIZE, PAGE_SIZE, STATUSES, encode_cursor
+
+# Serves games from several asgi_server.py worker processes, so they are not all
+# held back by one core. Every game lives in the worker its id hashes to and this
+# router forwards /game/<id>/... requests there, so a game is only ever touched by
+# its own worker and needs no locking across processes. Run it with e.g.:
+#
+#   python router.py --workers 4 --port 5000
+#
+# /worker/<n>/... is forwarded to worker n as /..., e.g. /worker/0/metrics, and /
+# merges the lobby pages of all workers. With PYUNO_JOURNAL_DIR set every worker
+# journals to its own sub directory. Games are partitioned by worker count, keep it
+# the same across restarts or journaled games end up with the wrong worker.
+
+WORKER_BASE_PORT = 5100
+# Idle keep-alive connections kept open to each worker.
+MAX_IDLE_CONNECTIONS = 64
+WORKER_START_TIMEOUT = 30
+
+GAME_PATH   = re.compile(r'^/game/([^/]+)')
+WORKER_PATH = re.compile(r'^/worker/(\d+)(/.*)$')
+# Headers that only make sense on one connection, not forwarded either way.
+HOP_BY_HOP  = {b'connection', b'keep-alive', b'transfer-encoding', b'content-length', b'host', b'upgrade'}
+# Set again by the router's own server.
+NOT_FORWARDED = HOP_BY_HOP | {b'date', b'server'}
+NO_BODY_STATUSES = {204, 304}
+
+def worker_index(game_id: str, num_workers: int) -> int:
+  # crc32 and not hash(), which is seeded differently in every process.
+  return zlib.crc32(game_id.encode()) % num_workers
+
+class WorkerConnection(object):
+  # One keep-alive HTTP/1.1 connection to a worker, one request at a time.
+  def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    self.reader   = reader
+    self.writer   = writer
+    self.reusable = True
+
+  async def request(self, method: str, target: str, headers: List[Tuple[bytes, bytes]], body: bytes) -> Tuple[int, List[Tuple[bytes, bytes]]]:
+    head = [f"{method} {target} HTTP/1.1\r\n".encode(), b'host: worker\r\n', b'content-length: %d\r\n' % len(body)]
+    head.extend(name + b': ' + value + b'\r\n' for name, value in headers if name.lower() not in HOP_BY_HOP)
+    head.append(b'\r\n')
+    self.writer.write(b''.join(head) + body)
+    await self.writer.drain()
+
+    status_line = await self.reader.readline()
+    if not status_line:
+      raise ConnectionResetError('Worker closed the connection')
+
+    response_headers = []
+    while True:
+      line = await self.reader.readline()
+      if line in (b'\r\n', b'\n', b''):
+        break
+      name, _, value = line.partition(b':')
+      response_headers.append((name.strip().lower(), value.strip()))
+
+    return int(status_line.split()[1]), response_headers
+
+  async def body(self, status: int, headers: List[Tuple[bytes, bytes]]) -> AsyncIterator[bytes]:
+    header = dict(headers)
+    self.reusable = header.get(b'connection', b'').lower() != b'close'
+
+    if status in NO_BODY_STATUSES:
+      return
+
+    if b'content-length' in header:
+      length = int(header[b'content-length'])
+      if length:
+        yield await self.reader.readexactly(length)
+    elif header.get(b'transfer-encoding', b'').lower() == b'chunked':
+      while True:
+        size = int((await self.reader.readline()).split(b';')[0], 16)
+        if size == 0:
+          while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+          return
+        chunk = await self.reader.readexactly(size)
+        await self.reader.readline()
+        yield chunk
+    else:
+      # Body ends with the connection.
+      self.reusable = False
+      while True:
+        chunk = await self.reader.read(65536)
+        if not chunk:
+          return
+        yield chunk
+
+  def close(self):
+    self.writer.close()
+
+class Worker(object):
+  def __init__(self, host: str, port: int) -> None:
+    self.host = host
+    self.port = port
+    self.idle: List[WorkerConnection] = []
+
+  async def open(self) -> WorkerConnection:
+    reader, writer = await asyncio.open_connection(self.host, self.port)
+    return WorkerConnection(reader, writer)
+
+  def release(self, connection: WorkerConnection):
+    if connection.reusable and len(self.idle) < MAX_IDLE_CONNECTIONS:
+      self.idle.append(connection)
+    else:
+      connection.close()
+
+  async def request(self, method: str, target: str, headers: List[Tuple[bytes, bytes]], body: bytes) -> Tuple[WorkerConnection, int, list]:
+    # The connection is the caller's until it has read the body and released it.
+    reused = bool(self.idle)
+    connection = self.idle.pop() if reused else await self.open()
+    try:
+      return (connection, *await connection.request(method, target, headers, body))
+    except (ConnectionError, asyncio.IncompleteReadError):
+      connection.close()
+      if not reused:
+        raise
+
+    # Nothing came back on a kept-alive connection the worker had closed, try a new one.
+    connection = await self.open()
+    try:
+      return (connection, *await connection.request(method, target, headers, body))
+    except BaseException:
+      connection.close()
+      raise
+
+async def read_body(receive) -> bytes:
+  body = b''
+  more_body = True
+  while more_body:
+    message = await receive()
+    body += message.get('body', b'')
+    more_body = message.get('more_body', False)
+
+  return body
+
+async def wait_disconnect(receive):
+  while (await receive())['type'] != 'http.disconnect':
+    pass
+
+async def send_response(send, status: int, body: bytes, content_type: bytes = b'application/json'):
+  await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', content_type)]})
+  await send({'type': 'http.response.body', 'body': body})
+
+class Router(object):
+  # ASGI app forwarding requests to the workers.
+  def __init__(self, workers: List[Worker]) -> None:
+    self.workers = workers
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      while True:
+        message = await receive()
+        await send({'type': message['type'] + '.complete'})
+        if message['type'] == 'lifespan.shutdown':
+          return
+
+    if scope['type'] != 'http':
+      return
+
+    # Games are found by their decoded id, but the path is forwarded as the client
+    # sent it: decoded, it could hold spaces or line breaks ending the request line.
+    path = scope['path']
+    raw_path = (scope.get('raw_path') or quote(path).encode()).decode('latin-1')
+    query = scope.get('query_string', b'').decode()
+    body = await read_body(receive)
+
+    game_match = GAME_PATH.match(path)
+    worker_match = WORKER_PATH.match(raw_path)
+    if game_match is not None:
+      worker = self.workers[worker_index(game_match.group(1), len(self.workers))]
+    elif worker_match is not None and int(worker_match.group(1)) < len(self.workers):
+      worker = self.workers[int(worker_match.group(1))]
+      raw_path = worker_match.group(2)
+    elif path == '/' and scope['method'] == 'GET':
+      return await self.lobby(scope, send)
+    else:
+      return await send_response(send, 404, b'{"status": "error"}')
+
+    target = raw_path + ('?' + query if query else '')
+    await self.forward(worker, scope, target, body, receive, send)
+
+  async def forward(self, worker: Worker, scope: dict, target: str, body: bytes, receive, send):
+    # Long polls and event streams stay open, stop forwarding once the client is gone.
+    proxy = asyncio.ensure_future(self.proxy(worker, scope, target, body, send))
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+      await asyncio.wait([proxy, disconnected], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+      disconnected.cancel()
+
+    if not proxy.done():
+      proxy.cancel()
+      try:
+        await proxy
+      except asyncio.CancelledError:
+        pass
+      return
+
+    proxy.result()
+
+  async def proxy(self, worker: Worker, scope: dict, target: str, body: bytes, send):
+    try:
+      connection, status, headers = await worker.request(scope['method'], target, scope.get('headers', []), body)
+    except (OSError, asyncio.IncompleteReadError):
+      return await send_response(send, 502, b'{"status": "error", "message": "worker unavailable"}')
+
+    try:
+      forwarded = [(name, value) for name, value in headers if name not in NOT_FORWARDED]
+      await send({'type': 'http.response.start', 'status': status, 'headers': forwarded})
+      async for chunk in connection.body(status, headers):
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+      await send({'type': 'http.response.body', 'body': b''})
+    except BaseException:
+      # Cancelled half way or the worker went away, the connection is in an unknown state.
+      connection.close()
+      raise
+
+    worker.release(connection)
+
+  async def fetch(self, worker: Worker, target: str) -> bytes:
+    connection, status, headers = await worker.request('GET', target, [], b'')
+    try:
+      body = b''.join([chunk async for chunk in connection.body(status, headers)])
+    except BaseException:
+      connection.close()
+      raise
+
+    worker.release(connection)
+    return body
+
+  async def lobby(self, scope: dict, send):
+    # Every worker answers the same page query, cursors being last activity times
+    # they all page the same way. The pages are merged, newest first.
+    query = scope.get('query_string', b'').decode()
+    target = '/' + ('?' + query if query else '')
+    try:
+      responses = await asyncio.gather(*[self.fetch(worker, target) for worker in self.workers])
+      pages = [json.loads(response) for response in responses]
+    except (OSError, asyncio.IncompleteReadError):
+      return await send_response(send, 502, b'{"status": "error", "message": "worker unavailable"}')
+
+    if any('games' not in page for page in pages):
+      # The workers refused the query.
+      return await send_response(send, 400, b'{"status": "error"}')
+
+    try:
+      limit = max(1, min(int(parse_qs(query).get('limit', [PAGE_SIZE])[-1]), MAX_PAGE_SIZE))
+    except ValueError:
+      limit = PAGE_SIZE
+
+    games = sorted((game for page in pages for game in page['games']), key=lambda g: (g['last_activity'], g['id']), reverse=True)
+    more = len(games) > limit or any(page['next'] is not None for page in pages)
+    games = games[:limit]
+    counts = {status: sum(page['counts'][status] for page in pages) for status in STATUSES}
+
+    await send_response(send, 200, json.dumps({
+      'games': games,
+      'next': encode_cursor((games[-1]['last_activity'], games[-1]['id'])) if more and games else None,
+      'counts': counts
+    }).encode())
+
+def start_workers(num_workers: int, base_port: int, host: str = '127.0.0.1') -> List[subprocess.Popen]:
+  journal_dir = os.environ.get('PYUNO_JOURNAL_DIR')
+  processes = []
+  for i in range(num_workers):
+    env = dict(os.environ)
+    if journal_dir is not None:
+      env['PYUNO_JOURNAL_DIR'] = os.path.join(journal_dir, f"worker-{i}")
+
+    processes.append(subprocess.Popen(
+      [sys.executable, '-m', 'uvicorn', 'asgi_server:app', '--host', host, '--port', str(base_port + i), '--log-level', 'warning'],
+      cwd=os.path.dirname(os.path.abspath(__file__)),
+      env=env
+    ))
+
+  return processes
+
+def wait_for_port(host: str, port: int, timeout: float = WORKER_START_TIMEOUT):
+  deadline = time.monotonic() + timeout
+  while True:
+    try:
+      socket.create_connection((host, port), timeout=1).close()
+      return
+    except OSError:
+      if time.monotonic() > deadline:
+        raise
+      time.sleep(0.05)
+
+def stop_workers(processes: List[subprocess.Popen]):
+  for process in processes:
+    process.terminate()
+  for process in processes:
+    try:
+      process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+      process.kill()
+
+def main():
+  import uvicorn
+
+  parser = argparse.ArgumentParser(description='Run asgi_server.py workers behind a router partitioning games by id.')
+  parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='worker processes')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=5000)
+  parser.add_argument('--worker-port', type=int, default=WORKER_BASE_PORT, help='port of the first worker, the others follow')
+  args = parser.parse_args()
+
+  # uvicorn raises the signal it stopped on again once done, exit through the
+  # finally below so the workers are stopped with the router.
+  signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+  processes = start_workers(args.workers, args.worker_port)
+  try:
+    for i in range(args.workers):
+      wait_for_port('127.0.0.1', args.worker_port + i)
+
+    workers = [Worker('127.0.0.1', args.worker_port + i) for i in range(args.workers)]
+    uvicorn.run(Router(workers), host=args.host, port=args.port, log_level='warning')
+  finally:
+    stop_workers(processes)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import unittest
+from urllib.parse import unquote
+
+import router
+
+async def serve_worker(name: str, lobby: bytes):
+  # A worker answering every request with its name and the path, the lobby on /.
+  async def handle(reader, writer):
+    while True:
+      request_line = await reader.readline()
+      if not request_line:
+        break
+      while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+
+      path = request_line.split()[1].decode()
+      if path.startswith('/?') or path == '/':
+        body = lobby
+        writer.write(b'HTTP/1.1 200 OK\r\ncontent-length: %d\r\n\r\n' % len(body) + body)
+      else:
+        body = json.dumps({'worker': name, 'path': path}).encode()
+        # Chunked, like uvicorn answers when no content-length is set.
+        writer.write(b'HTTP/1.1 200 OK\r\ntransfer-encoding: chunked\r\n\r\n%x\r\n' % len(body) + body + b'\r\n0\r\n\r\n')
+      await writer.drain()
+    writer.close()
+
+  return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+def lobby_page(games: list, more: bool) -> bytes:
+  return json.dumps({
+    'games': [{'id': game_id, 'last_activity': last_activity} for game_id, last_activity in games],
+    'next': 'more' if more else None,
+    'counts': {'waiting': 0, 'started': len(games), 'finished': 0}
+  }).encode()
+
+async def call(app, path: str, query: str = '') -> tuple:
+  sent = []
+  messages = [{'type': 'http.request', 'body': b''}]
+
+  async def receive():
+    if messages:
+      return messages.pop(0)
+    await asyncio.sleep(3600)
+
+  async def send(message):
+    sent.append(message)
+
+  # path as the client sends it, percent-encoded.
+  await app({'type': 'http', 'method': 'GET', 'path': unquote(path), 'raw_path': path.encode(), 'query_string': query.encode(), 'headers': []}, receive, send)
+  return sent[0]['status'], json.loads(b''.join(m.get('body', b'') for m in sent[1:]))
+
+class RouterTest(unittest.TestCase):
+  def test_workerIndex_stable(self):
+    self.assertEqual(router.worker_index('abc', 4), router.worker_index('abc', 4))
+    self.assertEqual({router.worker_index(str(i), 4) for i in range(100)}, {0, 1, 2, 3})
+
+  def test_forwardsByGameId(self):
+    async def scenario():
+      servers = [await serve_worker('0', lobby_page([('a', 2.0), ('b', 1.0)], True)), await serve_worker('1', lobby_page([('c', 1.5)], False))]
+      workers = [router.Worker('127.0.0.1', server.sockets[0].getsockname()[1]) for server in servers]
+      app = router.Router(workers)
+      try:
+        return [
+          await call(app, '/game/abc', 'format=compact'),
+          await call(app, '/game/abc/player/p1'),
+          await call(app, '/game/a%20b%0D%0Ax:%201'),
+          await call(app, '/worker/1/metrics'),
+          await call(app, '/', 'limit=2'),
+          await call(app, '/nope')
+        ]
+      finally:
+        for worker in workers:
+          for connection in worker.idle:
+            connection.close()
+        for server in servers:
+          server.close()
+
+    game, player, encoded, metrics, lobby, missing = asyncio.run(scenario())
+    owner = str(router.worker_index('abc', 2))
+    self.assertEqual(game, (200, {'worker': owner, 'path': '/game/abc?format=compact'}))
+    self.assertEqual(player, (200, {'worker': owner, 'path': '/game/abc/player/p1'}))
+    self.assertEqual(encoded, (200, {'worker': str(router.worker_index('a b\r\nx: 1', 2)), 'path': '/game/a%20b%0D%0Ax:%201'}))
+    self.assertEqual(metrics, (200, {'worker': '1', 'path': '/metrics'}))
+    self.assertEqual([g['id'] for g in lobby[1]['games']], ['a', 'c'])
+    self.assertEqual(lobby[1]['next'], '1.5:c')
+    self.assertEqual(lobby[1]['counts']['started'], 3)
+    self.assertEqual(missing[0], 404)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,162 @@
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import profiling
+from uno import SUIT_CHOICES, Card, Game, Play, Player
+
+MAX_TURNS = 2000
+
+def _most_common_suit(hand: List[Card], rng: random.Random) -> str:
+  counts = Counter(c.suit for c in hand if c.suit != 'wild')
+  if not counts:
+    return rng.choice(SUIT_CHOICES)
+
+  return counts.most_common(1)[0][0]
+
+def random_policy(game: Game, player: Player, rng: random.Random) -> Optional[Play]:
+  playable = player.hand.playable(game.get_discard_top())
+  if not playable:
+    return None
+
+  card = rng.choice(playable)
+  suit = rng.choice(SUIT_CHOICES) if card.is_choose_color_card() else None
+  return Play(player, 'play', card=card, suit=suit)
+
+def greedy_policy(game: Game, player: Player, rng: random.Random) -> Optional[Play]:
+  playable = player.hand.playable(game.get_discard_top())
+  if not playable:
+    return None
+
+  # Get rid of action cards first and hold wild cards for last.
+  def rank(card: Card) -> int:
+    if card.is_choose_color_card():
+      return 2
+    return 0 if card.is_draw_card() or card.is_skip_card() or card.is_reverse_card() else 1
+
+  card = min(playable, key=rank)
+  suit = _most_common_suit(player.hand, rng) if card.is_choose_color_card() else None
+  return Play(player, 'play', card=card, suit=suit)
+
+POLICIES: Dict[str, Callable] = {
+  'random': random_policy,
+  'greedy': greedy_policy
+}
+
+def play_turn(game: Game, policy: Callable, rng: random.Random):
+  player = game.get_current_player()
+  play = policy(game, player, rng)
+
+  if play is None:
+    game.progress(Play(player, 'draw'))
+    play = policy(game, player, rng)
+
+  if play is None:
+    play = Play(player, 'pass')
+
+  game.progress(play)
+
+def play_game(policies: List[str], rng: random.Random, max_turns: int = MAX_TURNS) -> dict:
+  players = [Player(f"Bot {i + 1}", 'white', id=str(i)) for i in range(len(policies))]
+  seat_policies = {p.id: POLICIES[name] for p, name in zip(players, policies)}
+
+  game = Game(players, seed=rng.getrandbits(64))
+  game.start()
+
+  turns = 0
+  while not game.is_finished() and turns < max_turns:
+    play_turn(game, seat_policies[game.get_current_player().id], rng)
+    turns += 1
+
+  return {
+    'winner': int(game.winner.id) if game.winner is not None else None,
+    'turns': turns
+  }
+
+def _run_batch(num_games: int, policies: List[str], seed: Optional[int], max_turns: int, profile_dir: str = None, profile_every: int = 0) -> List[dict]:
+  rng = random.Random(seed)
+  profiler = profiling.Profiler(profile_dir, profile_every) if profile_dir is not None else None
+
+  results = []
+  for _ in range(num_games):
+    profile = profiler.start() if profiler is not None and profiler.should_profile() else None
+    results.append(play_game(policies, rng, max_turns))
+    if profile is not None:
+      profiler.stop(profile, 'game')
+
+  return results
+
+def simulate(
+  num_games: int,
+  policies: List[str],
+  processes: int = 1,
+  seed: int = None,
+  max_turns: int = MAX_TURNS,
+  profile_dir: str = None,
+  profile_every: int = profiling.PROFILE_EVERY
+) -> dict:
+  # With a profile_dir, one in every profile_every games is profiled there.
+  start = time.perf_counter()
+
+  if processes <= 1:
+    results = _run_batch(num_games, policies, seed, max_turns, profile_dir, profile_every)
+  else:
+    seeds = random.Random(seed).sample(range(2 ** 32), processes)
+    batch_sizes = [num_games // processes + (1 if i < num_games % processes else 0) for i in range(processes)]
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+      futures = [
+        executor.submit(_run_batch, size, policies, batch_seed, max_turns, profile_dir, profile_every)
+        for size, batch_seed in zip(batch_sizes, seeds) if size > 0
+      ]
+      for future in futures:
+        results.extend(future.result())
+
+  elapsed = time.perf_counter() - start
+  return summarize(results, policies, elapsed)
+
+def summarize(results: List[dict], policies: List[str], elapsed: float) -> dict:
+  wins = Counter(r['winner'] for r in results if r['winner'] is not None)
+  finished = sum(wins.values())
+
+  return {
+    'games': len(results),
+    'finished': finished,
+    'unfinished': len(results) - finished,
+    'elapsed': elapsed,
+    'games_per_sec': len(results) / elapsed if elapsed > 0 else float('inf'),
+    'avg_turns': sum(r['turns'] for r in results) / len(results) if results else 0,
+    'win_rates': [
+      {'seat': seat, 'policy': name, 'win_rate': wins[seat] / finished if finished else 0}
+      for seat, name in enumerate(policies)
+    ]
+  }
+
+def print_report(report: dict):
+  print(f"Games:     {report['games']} ({report['unfinished']} unfinished)")
+  print(f"Elapsed:   {report['elapsed']:.2f}s ({report['games_per_sec']:.1f} games/sec)")
+  print(f"Avg turns: {report['avg_turns']:.1f}")
+  for seat in report['win_rates']:
+    print(f"Seat {seat['seat']} ({seat['policy']}): {seat['win_rate']:.1%}")
+
+def main():
+  parser = argparse.ArgumentParser(description='Play headless Uno games between bots.')
+  parser.add_argument('-n', '--games', type=int, default=1000, help='number of games to play')
+  parser.add_argument('-p', '--policies', nargs='+', default=['greedy', 'random'], choices=list(POLICIES.keys()), help='one policy per seat')
+  parser.add_argument('-j', '--processes', type=int, default=1, help='worker processes')
+  parser.add_argument('--seed', type=int, default=None)
+  parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+  parser.add_argument('--profile', metavar='DIR', help='profile games and write the stats to this directory')
+  parser.add_argument('--profile-every', type=int, default=profiling.PROFILE_EVERY, help='profile one in every this many games')
+  args = parser.parse_args()
+
+  report = simulate(args.games, args.policies, args.processes, args.seed, args.max_turns, args.profile, args.profile_every)
+  print_report(report)
+  if args.profile is not None:
+    profiling.print_summary(profiling.top_functions(args.profile))
+
+if __name__ == '__main__':
+  main()
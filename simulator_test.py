@@ -0,0 +1,15 @@
+import random
+import unittest
+
+from simulator import play_game, simulate
+
+class SimulatorTest(unittest.TestCase):
+  def test_playGame_endsWithinMaxTurns(self):
+    result = play_game(['greedy', 'random'], random.Random(1), max_turns=50)
+    self.assertLessEqual(result['turns'], 50)
+
+  def test_simulate_report(self):
+    report = simulate(5, ['greedy', 'greedy'], seed=1)
+
+    self.assertEqual(report['games'], 5)
+    self.assertEqual(len(report['win_rates']), 2)
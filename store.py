@@ -0,0 +1,252 @@
+import hashlib
+import mmap
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from uno import Game
+
+# Where games are kept when a GameRegistry does not hold them in memory. Games
+# are loaded lazily, the first time a request asks for them. Saved games are
+# written in batches, a save only serializes the game and queues it, so it is
+# cheap to call under the game's lock.
+
+FLUSH_INTERVAL   = 0.05
+FLUSH_BATCH_SIZE = 256
+
+class GameStore(object):
+  def load(self, game_id: str) -> Optional[Game]:
+    raise NotImplementedError()
+
+  def save(self, game: Game):
+    raise NotImplementedError()
+
+  def delete(self, game_id: str):
+    raise NotImplementedError()
+
+  def flush(self):
+    pass
+
+  def close(self):
+    self.flush()
+
+class MemoryStore(GameStore):
+  # Games kept as they are, nothing is serialized. The default.
+  def __init__(self) -> None:
+    self.games: Dict[str, Game] = {}
+
+  def load(self, game_id: str) -> Optional[Game]:
+    return self.games.get(game_id)
+
+  def save(self, game: Game):
+    self.games[game.id] = game
+
+  def delete(self, game_id: str):
+    self.games.pop(game_id, None)
+
+def file_name(game_id: str) -> str:
+  # Game ids come from urls, hash them instead of using them as file names.
+  return hashlib.sha1(game_id.encode()).hexdigest()
+
+class PickleStore(GameStore):
+  # One pickle per game in a directory, written right away.
+  def __init__(self, directory: str) -> None:
+    self.directory = directory
+    os.makedirs(directory, exist_ok=True)
+
+  def _path(self, game_id: str) -> str:
+    return os.path.join(self.directory, file_name(game_id) + '.pickle')
+
+  def load(self, game_id: str) -> Optional[Game]:
+    try:
+      with open(self._path(game_id), 'rb') as f:
+        return pickle.load(f)
+    except FileNotFoundError:
+      return None
+
+  def save(self, game: Game):
+    with open(self._path(game.id), 'wb') as f:
+      pickle.dump(game, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+  def delete(self, game_id: str):
+    try:
+      os.remove(self._path(game_id))
+    except FileNotFoundError:
+      pass
+
+class BatchedStore(GameStore):
+  # Saves are queued as Game.to_bytes and written by a background thread, every
+  # flush_batch_size games or flush_interval seconds. Loads see queued games first.
+  def __init__(self, flush_interval: float = FLUSH_INTERVAL, flush_batch_size: int = FLUSH_BATCH_SIZE) -> None:
+    self.flush_interval   = flush_interval
+    self.flush_batch_size = flush_batch_size
+
+    self._lock = threading.Lock()
+    self._write_lock = threading.Lock()
+    # game id -> state, None for deleted games. Later saves replace earlier ones.
+    self._pending: Dict[str, Optional[bytes]] = {}
+    # The batch being written, still read from until it is written.
+    self._writing: Dict[str, Optional[bytes]] = {}
+    self._closed = False
+
+    self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+    self._flusher.start()
+
+  def save(self, game: Game):
+    self._queue(game.id, game.to_bytes())
+
+  def delete(self, game_id: str):
+    self._queue(game_id, None)
+
+  def _queue(self, game_id: str, state: Optional[bytes]):
+    with self._lock:
+      self._pending[game_id] = state
+      full = len(self._pending) >= self.flush_batch_size
+
+    if full:
+      self.flush()
+
+  def load(self, game_id: str) -> Optional[Game]:
+    with self._lock:
+      for queued in (self._pending, self._writing):
+        if game_id in queued:
+          state = queued[game_id]
+          break
+      else:
+        state = False
+
+    if state is not False:
+      return Game.from_bytes(state) if state is not None else None
+
+    return self._load(game_id)
+
+  def flush(self):
+    # Writes are serialized, so an older batch never lands after a newer one.
+    with self._write_lock:
+      with self._lock:
+        batch, self._pending = self._pending, {}
+        self._writing = batch
+      if not batch:
+        return
+
+      try:
+        self._write(batch)
+      finally:
+        with self._lock:
+          self._writing = {}
+
+  def _flush_periodically(self):
+    while not self._closed:
+      time.sleep(self.flush_interval)
+      self.flush()
+
+  def close(self):
+    self._closed = True
+    self.flush()
+
+  def _load(self, game_id: str) -> Optional[Game]:
+    raise NotImplementedError()
+
+  def _write(self, batch: Dict[str, Optional[bytes]]):
+    raise NotImplementedError()
+
+class SqliteStore(BatchedStore):
+  # One row per game in a SQLite database in WAL mode, so other processes can
+  # read games while this one writes.
+  def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL, flush_batch_size: int = FLUSH_BATCH_SIZE) -> None:
+    self.path = path
+    self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    self._connection_lock = threading.Lock()
+    with self._connection_lock:
+      self._connection.execute('PRAGMA journal_mode=WAL')
+      self._connection.execute('PRAGMA synchronous=NORMAL')
+      self._connection.execute('CREATE TABLE IF NOT EXISTS games (id TEXT PRIMARY KEY, state BLOB NOT NULL)')
+
+    super().__init__(flush_interval, flush_batch_size)
+
+  def _load(self, game_id: str) -> Optional[Game]:
+    with self._connection_lock:
+      row = self._connection.execute('SELECT state FROM games WHERE id = ?', (game_id,)).fetchone()
+
+    return Game.from_bytes(row[0]) if row is not None else None
+
+  def _write(self, batch: Dict[str, Optional[bytes]]):
+    saved   = [(game_id, state) for game_id, state in batch.items() if state is not None]
+    deleted = [(game_id,) for game_id, state in batch.items() if state is None]
+    with self._connection_lock:
+      self._connection.execute('BEGIN')
+      self._connection.executemany('INSERT OR REPLACE INTO games (id, state) VALUES (?, ?)', saved)
+      self._connection.executemany('DELETE FROM games WHERE id = ?', deleted)
+      self._connection.execute('COMMIT')
+
+  def close(self):
+    super().close()
+    with self._connection_lock:
+      self._connection.close()
+
+class SharedMemoryStore(BatchedStore):
+  # One file per game in a directory, /dev/shm by default so it never touches a
+  # disk. Files are replaced whole, never written in place, so any local process
+  # can map one and read the game from it without copying it first.
+  def __init__(self, directory: str = '/dev/shm/pyuno', flush_interval: float = FLUSH_INTERVAL, flush_batch_size: int = FLUSH_BATCH_SIZE) -> None:
+    self.directory = directory
+    os.makedirs(directory, exist_ok=True)
+    super().__init__(flush_interval, flush_batch_size)
+
+  def _path(self, game_id: str) -> str:
+    return os.path.join(self.directory, file_name(game_id) + '.state')
+
+  def mapped(self, game_id: str) -> Optional[Tuple[mmap.mmap, memoryview]]:
+    # The mapped state of a game as last flushed, unpack it with Game.from_bytes.
+    # The map stays valid after the file is replaced, close it when done.
+    try:
+      with open(self._path(game_id), 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+      # ValueError: an empty file can not be mapped.
+      return None
+
+    return mapped, memoryview(mapped)
+
+  def _load(self, game_id: str) -> Optional[Game]:
+    mapped = self.mapped(game_id)
+    if mapped is None:
+      return None
+
+    mapping, view = mapped
+    try:
+      return Game.from_bytes(view)
+    finally:
+      view.release()
+      mapping.close()
+
+  def _write(self, batch: Dict[str, Optional[bytes]]):
+    for game_id, state in batch.items():
+      path = self._path(game_id)
+      if state is None:
+        try:
+          os.remove(path)
+        except FileNotFoundError:
+          pass
+        continue
+
+      with open(path + '.tmp', 'wb') as f:
+        f.write(state)
+      os.replace(path + '.tmp', path)
+
+def open_store(url: str) -> GameStore:
+  # memory:, pickle:<directory>, sqlite:<database file> or shm:[<directory>].
+  kind, _, location = url.partition(':')
+  if kind == 'memory':
+    return MemoryStore()
+  if kind == 'pickle':
+    return PickleStore(location)
+  if kind == 'sqlite':
+    return SqliteStore(location)
+  if kind == 'shm':
+    return SharedMemoryStore(location) if location else SharedMemoryStore()
+
+  raise ValueError(f"Unknown store {url}, expected memory:, pickle:<dir>, sqlite:<file> or shm:[<dir>]")
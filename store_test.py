@@ -0,0 +1,85 @@
+import os
+import random
+import tempfile
+import unittest
+
+from registry import GameRegistry
+from simulator import greedy_policy, play_turn
+from store import MemoryStore, PickleStore, SharedMemoryStore, SqliteStore
+from uno import Game, Player
+
+def played_game(game_id: str, turns: int = 20) -> Game:
+  game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], game_id, seed=7)
+  game.start()
+  rng = random.Random(7)
+  for _ in range(turns):
+    if game.finished:
+      break
+    play_turn(game, greedy_policy, rng)
+
+  return game
+
+class GameStoreTest(unittest.TestCase):
+  def check_store(self, store):
+    game = played_game('abc')
+    self.assertIsNone(store.load('abc'))
+
+    store.save(game)
+    # Queued saves are seen before they are written.
+    self.assertEqual(store.load('abc').version, game.version)
+
+    store.flush()
+    loaded = store.load('abc')
+    self.assertEqual((loaded.id, loaded.version), (game.id, game.version))
+    self.assertEqual([[c.id for c in p.hand] for p in loaded.players], [[c.id for c in p.hand] for p in game.players])
+
+    store.delete('abc')
+    store.flush()
+    self.assertIsNone(store.load('abc'))
+    store.close()
+
+  def test_memory(self):
+    self.check_store(MemoryStore())
+
+  def test_pickle(self):
+    with tempfile.TemporaryDirectory() as directory:
+      self.check_store(PickleStore(directory))
+
+  def test_sqlite(self):
+    with tempfile.TemporaryDirectory() as directory:
+      self.check_store(SqliteStore(os.path.join(directory, 'games.db'), flush_interval=60))
+
+  def test_sharedMemory(self):
+    with tempfile.TemporaryDirectory() as directory:
+      self.check_store(SharedMemoryStore(directory, flush_interval=60))
+
+  def test_sharedMemory_mapped(self):
+    with tempfile.TemporaryDirectory() as directory:
+      store = SharedMemoryStore(directory, flush_interval=60)
+      game = played_game('abc')
+      store.save(game)
+      store.flush()
+
+      mapping, view = store.mapped('abc')
+      self.assertEqual(bytes(view), game.to_bytes())
+      view.release()
+      mapping.close()
+      store.close()
+
+  def test_registry_writeThrough(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'games.db')
+      registry = GameRegistry(store=SqliteStore(path), write_through=True)
+      registry.add(Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], 'abc'))
+      with registry.locked('abc') as game:
+        game.start()
+      registry.store.close()
+
+      # Another process opening the same database finds the game as it was last changed.
+      other = GameRegistry(store=SqliteStore(path), write_through=True)
+      self.assertEqual(other['abc'].version, 1)
+      self.assertEqual(other.stats()['restored'], 1)
+      other.store.close()
+
+if __name__ == '__main__':
+  unittest.main()
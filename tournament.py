@@ -0,0 +1,386 @@
+import argparse
+import math
+import random
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import bots
+import simulator
+from uno import Game, Player
+
+# Leagues of bots: entrants are seated at tables round after round, every table
+# plays a few games and the results go into the standings as each table comes
+# back, points and ratings alike. Tables are played by a process pool, at most
+# max_pending of them submitted at a time, so a long schedule is generated as the
+# pool works through it and never queued whole. e.g.:
+#
+#   python tournament.py -b greedy greedy random random -f swiss -r 5 -g 10 -j 4
+#
+# Round robin schedules are fixed up front, Swiss rounds are paired on the
+# standings after the previous round, so each of them waits for the one before.
+
+FORMATS = ('round-robin', 'swiss')
+INITIAL_RATING = 1500.0
+K_FACTOR       = 32.0
+# Tables in flight per worker process.
+PENDING_PER_PROCESS = 4
+
+# Seat players: simulator policies where there is one, they play like the bot of
+# the same name without building a bot, then the bots of bots.BOTS.
+PLAYERS = sorted(set(simulator.POLICIES) | set(bots.BOTS))
+
+class Entrant(object):
+  def __init__(self, id: str, name: str, bot: str) -> None:
+    if bot not in PLAYERS:
+      raise ValueError(f"Unknown bot {bot}, expected one of {PLAYERS}")
+
+    self.id   = id
+    self.name = name
+    self.bot  = bot
+
+class Table(NamedTuple):
+  round: int
+  number: int
+  # Entrant ids and their bots, in seating order.
+  seats: Tuple[str, ...]
+  bots: Tuple[str, ...]
+  games: int
+  seed: int
+  max_turns: int
+
+class TableResult(NamedTuple):
+  table: Table
+  # The winner of every game, None for games stopped at max_turns.
+  winners: Tuple[Optional[str], ...]
+  turns: int
+
+# Bot instances of this process, built on first use.
+_bots: Dict[str, object] = {}
+
+def _turn_player(bot: str) -> Callable[[Game, random.Random], None]:
+  if bot in simulator.POLICIES:
+    policy = simulator.POLICIES[bot]
+    return lambda game, rng: simulator.play_turn(game, policy, rng)
+
+  if bot not in _bots:
+    _bots[bot] = bots.BOTS[bot]()
+  instance = _bots[bot]
+  return lambda game, rng: bots.take_turn(instance, game)
+
+def play_table(table: Table) -> TableResult:
+  # Every game seats the entrants one place further round, so each of them starts.
+  rng = random.Random(table.seed)
+  turn_players = {entrant_id: _turn_player(bot) for entrant_id, bot in zip(table.seats, table.bots)}
+
+  winners = []
+  turns = 0
+  for i in range(table.games):
+    order = [(i + seat) % len(table.seats) for seat in range(len(table.seats))]
+    players = [Player(table.seats[seat], 'white', id=table.seats[seat], bot=table.bots[seat]) for seat in order]
+    game = Game(players, seed=rng.getrandbits(64))
+    game.start()
+
+    game_turns = 0
+    while not game.finished and game_turns < table.max_turns:
+      turn_players[game.get_current_player().id](game, rng)
+      game_turns += 1
+
+    winners.append(game.winner.id if game.winner is not None else None)
+    turns += game_turns
+
+  return TableResult(table, tuple(winners), turns)
+
+class Standing(object):
+  def __init__(self, entrant: Entrant, rating: float) -> None:
+    self.entrant = entrant
+    self.points  = 0.0
+    self.games   = 0
+    self.wins    = 0
+    self.byes    = 0
+    self.rating  = rating
+    self.opponents: Set[str] = set()
+
+  def as_dict(self) -> dict:
+    return {
+      'id': self.entrant.id,
+      'name': self.entrant.name,
+      'bot': self.entrant.bot,
+      'points': self.points,
+      'games': self.games,
+      'wins': self.wins,
+      'byes': self.byes,
+      'rating': round(self.rating, 1)
+    }
+
+class Standings(object):
+  # Updated one game at a time. A win is a point, a game without a winner splits
+  # it between the table. Ratings are Elo, a game at a bigger table counting as
+  # the winner beating each of the others and the others drawing among themselves.
+  def __init__(self, entrants: Iterable[Entrant], initial_rating: float = INITIAL_RATING, k_factor: float = K_FACTOR) -> None:
+    self.k_factor = k_factor
+    self.by_id: Dict[str, Standing] = {e.id: Standing(e, initial_rating) for e in entrants}
+    self.games = 0
+    self.turns = 0
+
+  def __getitem__(self, entrant_id: str) -> Standing:
+    return self.by_id[entrant_id]
+
+  def record_game(self, seats: Iterable[str], winner: Optional[str]):
+    table = [self.by_id[entrant_id] for entrant_id in seats]
+    k = self.k_factor / max(len(table) - 1, 1)
+    changes = [0.0] * len(table)
+    for i, j in ((i, j) for i in range(len(table)) for j in range(i + 1, len(table))):
+      a, b = table[i], table[j]
+      score = 1.0 if winner == a.entrant.id else 0.0 if winner == b.entrant.id else 0.5
+      expected = 1 / (1 + 10 ** ((b.rating - a.rating) / 400))
+      changes[i] += k * (score - expected)
+      changes[j] -= k * (score - expected)
+
+    for standing, change in zip(table, changes):
+      standing.rating += change
+      standing.games  += 1
+      standing.opponents.update(s.entrant.id for s in table if s is not standing)
+      if winner is None:
+        standing.points += 1 / len(table)
+      elif winner == standing.entrant.id:
+        standing.points += 1
+        standing.wins   += 1
+    self.games += 1
+
+  def record_bye(self, entrant_id: str, points: float):
+    standing = self.by_id[entrant_id]
+    standing.byes   += 1
+    standing.points += points
+
+  def record(self, result: TableResult):
+    for winner in result.winners:
+      self.record_game(result.table.seats, winner)
+    self.turns += result.turns
+
+  def ranking(self) -> List[Standing]:
+    return sorted(self.by_id.values(), key=lambda s: (-s.points, -s.rating, s.entrant.id))
+
+def split_tables(seats: List[str], table_size: int) -> Tuple[List[List[str]], List[str]]:
+  # Consecutive seats make a table, a last table with a single player is a bye.
+  tables = [seats[i:i + table_size] for i in range(0, len(seats), table_size)]
+  if tables and len(tables[-1]) < 2:
+    return tables[:-1], tables[-1]
+
+  return tables, []
+
+def round_robin(entrant_ids: List[str], table_size: int = 2) -> Iterator[Tuple[List[List[str]], List[str]]]:
+  # (tables, byes) of every round, by the circle method: the first entrant stays,
+  # the others rotate one place every round. With tables of two every entrant meets
+  # every other once, bigger tables are cut from the same rotation. A seat left over
+  # by bigger tables goes to whoever has rested least, so no one plays more than one
+  # table more than anyone else.
+  ids: List[Optional[str]] = list(entrant_ids)
+  if len(ids) % 2:
+    ids.append(None)
+
+  n = len(ids)
+  rest = ids[1:]
+  rested = Counter()
+  for r in range(n - 1):
+    order = [ids[0]] + rest[len(rest) - r:] + rest[:len(rest) - r]
+    pairs = [(order[i], order[n - 1 - i]) for i in range(n // 2)]
+    # Whoever is paired with the padding rests this round.
+    resting = [a if b is None else b for a, b in pairs if None in (a, b)]
+    seats = [seat for pair in pairs if None not in pair for seat in pair]
+    if len(seats) % table_size == 1:
+      # Resting with the padding is the same for everyone, only these byes count.
+      # Ties go to the first seat from a place moving round by round, or the first
+      # entrant, which the rotation never moves, would never rest.
+      start = -r % len(seats)
+      bye = min(seats[start:] + seats[:start], key=lambda seat: rested[seat])
+      seats.remove(bye)
+      seats.append(bye)
+
+    tables, byes = split_tables(seats, table_size)
+    rested.update(byes)
+    yield tables, resting + byes
+
+def swiss_round(standings: Standings, table_size: int = 2) -> Tuple[List[List[str]], List[str]]:
+  # Entrants by standing fill tables top down, each seat going to the highest ranked
+  # entrant left who has not met anyone at the table yet, or to the highest ranked
+  # one if all have. A lone entrant left over gets a bye, the lowest ranked with
+  # the fewest byes.
+  ranked = [s.entrant.id for s in standings.ranking()]
+  byes = []
+  if len(ranked) % table_size == 1:
+    bye = min(reversed(ranked), key=lambda entrant_id: standings[entrant_id].byes)
+    ranked.remove(bye)
+    byes.append(bye)
+
+  tables = []
+  while ranked:
+    table = [ranked.pop(0)]
+    while ranked and len(table) < table_size:
+      fresh = (i for i, e in enumerate(ranked) if not standings[e].opponents.intersection(table))
+      table.append(ranked.pop(next(fresh, 0)))
+    tables.append(table)
+
+  return tables, byes
+
+class Tournament(object):
+  def __init__(
+    self,
+    entrants: List[Entrant],
+    format: str = 'round-robin',
+    rounds: int = None,
+    table_size: int = 2,
+    games_per_table: int = 1,
+    processes: int = 1,
+    max_pending: int = None,
+    seed: int = None,
+    max_turns: int = simulator.MAX_TURNS,
+    on_result: Callable[[TableResult, Standings], None] = None
+  ) -> None:
+    if format not in FORMATS:
+      raise ValueError(f"Unknown format {format}, expected one of {FORMATS}")
+    if table_size < 2 or len(entrants) < 2:
+      raise ValueError('A tournament needs at least two entrants and tables of two')
+
+    self.entrants        = entrants
+    self.format          = format
+    # Round robin plays every rotation once by default, Swiss enough rounds to
+    # single out a winner.
+    self.rounds          = rounds if rounds is not None else (
+      len(entrants) - 1 + len(entrants) % 2 if format == 'round-robin' else math.ceil(math.log2(len(entrants)))
+    )
+    self.table_size      = table_size
+    self.games_per_table = games_per_table
+    self.processes       = processes
+    self.max_pending     = max_pending if max_pending is not None else max(processes, 1) * PENDING_PER_PROCESS
+    self.rng             = random.Random(seed)
+    self.max_turns       = max_turns
+    self.on_result       = on_result
+    self.standings       = Standings(entrants)
+    self.elapsed         = 0.0
+    self._bots           = {e.id: e.bot for e in entrants}
+
+  def _tables(self, round: int, seatings: List[List[str]]) -> Iterator[Table]:
+    for number, seats in enumerate(seatings):
+      yield Table(
+        round     = round,
+        number    = number,
+        seats     = tuple(seats),
+        bots      = tuple(self._bots[entrant_id] for entrant_id in seats),
+        games     = self.games_per_table,
+        seed      = self.rng.getrandbits(64),
+        max_turns = self.max_turns
+      )
+
+  def _round_robin_tables(self) -> Iterator[Table]:
+    # Round robin byes are rest rounds, worth nothing.
+    ids = [e.id for e in self.entrants]
+    rotations: Iterator = iter(())
+    for round in range(self.rounds):
+      rotation = next(rotations, None)
+      if rotation is None:
+        # Every rotation played, start over.
+        rotations = round_robin(ids, self.table_size)
+        rotation = next(rotations)
+
+      seatings, byes = rotation
+      for entrant_id in byes:
+        self.standings.record_bye(entrant_id, 0)
+      yield from self._tables(round, seatings)
+
+  def run(self) -> Standings:
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=self.processes) if self.processes > 1 else None
+    try:
+      if self.format == 'round-robin':
+        self._play(self._round_robin_tables(), executor)
+      else:
+        for round in range(self.rounds):
+          # A Swiss bye is worth winning every game of the table.
+          seatings, byes = swiss_round(self.standings, self.table_size)
+          for entrant_id in byes:
+            self.standings.record_bye(entrant_id, self.games_per_table)
+          # The next round is paired on this one's results.
+          self._play(self._tables(round, seatings), executor)
+    finally:
+      if executor is not None:
+        executor.shutdown()
+      self.elapsed = time.perf_counter() - start
+
+    return self.standings
+
+  def _play(self, tables: Iterable[Table], executor: Optional[ProcessPoolExecutor]):
+    if executor is None:
+      for table in tables:
+        self._record(play_table(table))
+      return
+
+    # Tables are only taken from the schedule when the pool has room for them.
+    pending: Set[Future] = set()
+    for table in tables:
+      if len(pending) >= self.max_pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+          self._record(future.result())
+      pending.add(executor.submit(play_table, table))
+
+    while pending:
+      done, pending = wait(pending, return_when=FIRST_COMPLETED)
+      for future in done:
+        self._record(future.result())
+
+  def _record(self, result: TableResult):
+    self.standings.record(result)
+    if self.on_result is not None:
+      self.on_result(result, self.standings)
+
+  def report(self) -> dict:
+    return {
+      'format': self.format,
+      'rounds': self.rounds,
+      'games': self.standings.games,
+      'elapsed': self.elapsed,
+      'games_per_min': self.standings.games / self.elapsed * 60 if self.elapsed > 0 else float('inf'),
+      'avg_turns': self.standings.turns / self.standings.games if self.standings.games else 0,
+      'standings': [s.as_dict() for s in self.standings.ranking()]
+    }
+
+def print_report(report: dict):
+  print(f"{report['format']}, {report['rounds']} rounds")
+  print(f"Games:     {report['games']}")
+  print(f"Elapsed:   {report['elapsed']:.2f}s ({report['games_per_min']:.0f} games/min)")
+  print(f"Avg turns: {report['avg_turns']:.1f}")
+  for rank, standing in enumerate(report['standings'], 1):
+    print(f"{rank:>3}. {standing['name']:<16} {standing['points']:>7.1f} pts {standing['wins']:>6}/{standing['games']:<6} rating {standing['rating']:.0f}")
+
+def main():
+  parser = argparse.ArgumentParser(description='Play a tournament between bots.')
+  parser.add_argument('-b', '--bots', nargs='+', default=['greedy', 'greedy', 'random', 'random'], choices=PLAYERS, help='one bot per entrant')
+  parser.add_argument('-f', '--format', default='round-robin', choices=FORMATS)
+  parser.add_argument('-r', '--rounds', type=int, default=None, help='rounds to play, by default a full round robin or log2(entrants) Swiss rounds')
+  parser.add_argument('-t', '--table-size', type=int, default=2, help='players per table')
+  parser.add_argument('-g', '--games', type=int, default=1, help='games per table')
+  parser.add_argument('-j', '--processes', type=int, default=1, help='worker processes')
+  parser.add_argument('--max-pending', type=int, default=None, help='tables submitted to the workers at a time')
+  parser.add_argument('--seed', type=int, default=None)
+  parser.add_argument('--max-turns', type=int, default=simulator.MAX_TURNS)
+  args = parser.parse_args()
+
+  entrants = [Entrant(str(i), f"{bot} {i + 1}", bot) for i, bot in enumerate(args.bots)]
+  tournament = Tournament(
+    entrants,
+    format          = args.format,
+    rounds          = args.rounds,
+    table_size      = args.table_size,
+    games_per_table = args.games,
+    processes       = args.processes,
+    max_pending     = args.max_pending,
+    seed            = args.seed,
+    max_turns       = args.max_turns
+  )
+  tournament.run()
+  print_report(tournament.report())
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,88 @@
+import itertools
+import unittest
+from collections import Counter
+
+from tournament import Entrant, Standings, Table, Tournament, play_table, round_robin, swiss_round
+
+def new_entrants(bots: list) -> list:
+  return [Entrant(str(i), f"{bot} {i + 1}", bot) for i, bot in enumerate(bots)]
+
+class ScheduleTest(unittest.TestCase):
+  def test_roundRobin_everyPairMeetsOnce(self):
+    ids = [str(i) for i in range(5)]
+    rounds = list(round_robin(ids))
+
+    pairs = [frozenset(table) for tables, _ in rounds for table in tables]
+    self.assertEqual(len(rounds), 5)
+    self.assertEqual(sorted(pairs, key=sorted), sorted(map(frozenset, itertools.combinations(ids, 2)), key=sorted))
+    self.assertEqual(sorted(bye for _, byes in rounds for bye in byes), ids)
+
+  def test_roundRobin_byesGoRoundWithBiggerTables(self):
+    rounds = list(round_robin([str(i) for i in range(4)], table_size=3))
+    byes = [bye for _, byes in rounds for bye in byes]
+
+    self.assertIn('0', byes)
+    self.assertEqual(len(set(byes)), 3)
+
+    for num_entrants, table_size in itertools.product(range(3, 13), (3, 4, 5)):
+      ids = [str(i) for i in range(num_entrants)]
+      tables_played = Counter(seat for tables, _ in round_robin(ids, table_size) for table in tables for seat in table)
+      self.assertLessEqual(max(tables_played.values()) - min(tables_played[i] for i in ids), 1)
+
+  def test_swissRound_avoidsRematches(self):
+    standings = Standings(new_entrants(['greedy'] * 4))
+    standings.record_game(['0', '1'], '0')
+    standings.record_game(['2', '3'], '2')
+
+    tables, byes = swiss_round(standings)
+
+    self.assertEqual(tables, [['0', '2'], ['1', '3']])
+    self.assertEqual(byes, [])
+
+  def test_swissRound_byeForLowestRanked(self):
+    standings = Standings(new_entrants(['greedy'] * 3))
+    standings.record_game(['0', '1'], '0')
+
+    tables, byes = swiss_round(standings)
+
+    self.assertEqual(byes, ['1'])
+    self.assertEqual(tables, [['0', '2']])
+
+class StandingsTest(unittest.TestCase):
+  def test_recordGame_ratingsMoveTowardsWinner(self):
+    standings = Standings(new_entrants(['greedy', 'random', 'random']))
+    standings.record_game(['0', '1', '2'], '0')
+    standings.record_game(['0', '1'], None)
+
+    self.assertGreater(standings['0'].rating, standings['1'].rating)
+    self.assertAlmostEqual(sum(s.rating for s in standings.by_id.values()), 3 * 1500)
+    self.assertEqual((standings['0'].points, standings['1'].points), (1.5, 0.5))
+
+class TournamentTest(unittest.TestCase):
+  def test_playTable_sameForSameSeed(self):
+    table = Table(round=0, number=0, seats=('0', '1'), bots=('greedy', 'random'), games=4, seed=1, max_turns=500)
+    self.assertEqual(play_table(table), play_table(table))
+
+  def test_run_roundRobin(self):
+    tournament = Tournament(new_entrants(['greedy', 'greedy', 'random']), games_per_table=2, seed=1)
+    standings = tournament.run()
+
+    self.assertEqual(tournament.rounds, 3)
+    self.assertEqual(standings.games, 6)
+    self.assertEqual([s.games for s in standings.by_id.values()], [4, 4, 4])
+
+  def test_run_swissOnProcessPool(self):
+    results = []
+    tournament = Tournament(
+      new_entrants(['greedy', 'random', 'greedy', 'random']),
+      format='swiss', games_per_table=3, processes=2, max_pending=1, seed=1,
+      on_result=lambda result, _: results.append(result)
+    )
+    standings = tournament.run()
+
+    self.assertEqual(tournament.rounds, 2)
+    self.assertEqual(len(results), 4)
+    self.assertEqual(standings.games, 12)
+
+if __name__ == '__main__':
+  unittest.main()
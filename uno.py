@@ -1,7 +1,11 @@
 
+import itertools
+import json
 import random
+import struct
 import uuid
-from typing import List
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 SUITS        = ['red', 'green', 'blue', 'yellow', 'wild']
 VALUES       = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '+2', '+4', 'skip', 'reverse', 'wild']
@@ -9,7 +13,82 @@ SUIT_CHOICES = list(SUITS)
 SUIT_CHOICES.remove('wild')
 PLAYER_HAND_SIZE = 7
 
+# Cards are packed into a single small int: suit index in the high bits,
+# value index in the low VALUE_BITS bits.
+VALUE_BITS  = 4
+VALUE_MASK  = (1 << VALUE_BITS) - 1
+SUIT_CODES  = {suit: i for i, suit in enumerate(SUITS)}
+VALUE_CODES = {value: i for i, value in enumerate(VALUES)}
+
+def encode_card(value: str, suit: str) -> int:
+  return SUIT_CODES[suit] << VALUE_BITS | VALUE_CODES[value]
+
+def decode_card(code: int) -> Tuple[str, str]:
+  return VALUES[code & VALUE_MASK], SUITS[code >> VALUE_BITS]
+
+def random_id(rng: random.Random) -> str:
+  # Shaped like a uuid4, but reproducible from the rng's seed.
+  return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+# Compact binary state of players and games, see Game.to_bytes. It is a list of
+# length prefixed sections, cards are (ordinal, code) byte pairs so only cards
+# dealt from a Deck can be packed. Random states are in native byte order, the
+# format is for storing games on the machine that runs them.
+STATE_FORMAT = 2
+ACTIONS      = ['play', 'draw', 'pass']
+NO_CARD      = 255
+
+def pack_sections(sections: List[bytes]) -> bytes:
+  return b''.join(struct.pack('<I', len(section)) + section for section in sections)
+
+def unpack_sections(data) -> List[bytes]:
+  # data may be any buffer, e.g. an mmap, sections are memoryview slices of it.
+  data = memoryview(data)
+  sections = []
+  offset = 0
+  while offset < len(data):
+    (length,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    sections.append(data[offset:offset + length])
+    offset += length
+
+  return sections
+
+def pack_cards(cards: Iterable['Card']) -> bytes:
+  packed = bytearray()
+  for card in cards:
+    packed.append(int(card.id))
+    packed.append(card.code)
+
+  return bytes(packed)
+
+def unpack_cards(data, cards: Dict[int, 'Card']) -> List['Card']:
+  # cards holds the Card objects already unpacked by ordinal, so every ordinal is one object.
+  unpacked = []
+  for i in range(0, len(data), 2):
+    ordinal, code = data[i], data[i + 1]
+    card = cards.get(ordinal)
+    if card is None:
+      card = cards[ordinal] = Card.from_code(code, str(ordinal))
+    unpacked.append(card)
+
+  return unpacked
+
+def pack_random(rng: random.Random) -> bytes:
+  version, internal_state, gauss_next = rng.getstate()
+  return json.dumps([version, gauss_next]).encode() + b'\n' + array('I', internal_state).tobytes()
+
+def unpack_random(data) -> random.Random:
+  data = bytes(data)
+  header, _, internal_state = data.partition(b'\n')
+  version, gauss_next = json.loads(header)
+  rng = random.Random()
+  rng.setstate((version, tuple(array('I', internal_state)), gauss_next))
+  return rng
+
 class UnoObject(object):
+  __slots__ = ('id',)
+
   def __init__(self, id: str = None) -> None:
     if id is None:
       self.id = str(uuid.uuid4())
@@ -19,6 +98,8 @@ class UnoObject(object):
   def as_dict(): raise NotImplementedError()
 
 class Card(UnoObject):
+  __slots__ = ('value', '_suit', 'code')
+
   def __init__(self, value: str, suit: str, id: str = None) -> None:
     super().__init__(id)
     if value not in VALUES:
@@ -30,6 +111,26 @@ class Card(UnoObject):
     self.value = value
     self.suit  = suit
   
+  @staticmethod
+  def from_code(code: int, id: str):
+    # Skips validation and uuid generation, codes come from a trusted template.
+    card = Card.__new__(Card)
+    card.id   = id
+    card.code = code
+    card.value, card._suit = decode_card(code)
+    return card
+
+  @property
+  def suit(self) -> str:
+    return self._suit
+
+  @suit.setter
+  def suit(self, suit: str):
+    # Keeps the code in sync. Cards come from a shared deck, the suit chosen for a
+    # wild card is kept by the Game, see Game.top_suit.
+    self._suit = suit
+    self.code  = encode_card(self.value, suit)
+
   def is_skip_card(self) -> bool:
     return self.value in ['+2', 'skip']
   
@@ -66,77 +167,210 @@ class Card(UnoObject):
       suit  = card_dict['suit']
     )
 
+  def as_compact(self) -> list:
+    # [ordinal, code] on the compact wire format. Deck card ids are ordinals already.
+    return [int(self.id) if self.id.isdigit() else self.id, self.code]
+
+  @staticmethod
+  def from_compact(compact: list):
+    ordinal, code = compact
+    value, suit = decode_card(code)
+    return Card(value, suit, id=str(ordinal))
+
   def __str__(self):
     return f"Card({self.value}, {self.suit}, {self.id})"
   
   def __repr__(self) -> str:
       return str(self)
-class Deck(UnoObject):
-  def __init__(self, half: bool = False, id: str = None) -> None:
-    super().__init__(id)
-    self.cards = []
-    self.cards_by_suit = {}
-    self.half = half
-    
-    for suit in SUITS:
-      self.cards_by_suit[suit] = []
-      self._makedeck(suit)
 
-  def _makedeck(self, suit: str):
+def _make_deck_template(half: bool) -> array:
+  codes = array('B')
+  for suit in SUITS:
     if suit != 'wild':
-      zero_card = Card('0', suit)
-      self.cards.append(zero_card)
-      self.cards_by_suit[suit].append(zero_card)
-      for j in range(2 if not self.half else 1):
+      codes.append(encode_card('0', suit))
+      for j in range(2 if not half else 1):
         for i in range(1, 10):
-          card = Card(str(i), suit) 
-          self.cards.append(card)
-          self.cards_by_suit[suit].append(card)
-      
-      for i in range(2 if not self.half else 1):
-        plus2_card = Card('+2', suit)
-        reverse_card = Card('reverse', suit)
-        skip_card = Card('skip', suit)
-
-        self.cards.append(plus2_card)
-        self.cards.append(reverse_card)
-        self.cards.append(skip_card)
-        self.cards_by_suit[suit].append(plus2_card)
-        self.cards_by_suit[suit].append(reverse_card)
-        self.cards_by_suit[suit].append(skip_card)
+          codes.append(encode_card(str(i), suit))
+
+      for i in range(2 if not half else 1):
+        codes.append(encode_card('+2', suit))
+        codes.append(encode_card('reverse', suit))
+        codes.append(encode_card('skip', suit))
     else:
-      for i in range(4 if not self.half else 2):
-        draw4_card = Card('+4', 'wild')
-        wild_card = Card('wild', 'wild')
-        self.cards.append(draw4_card)
-        self.cards.append(wild_card)
-        self.cards_by_suit['wild'].append(draw4_card)
-        self.cards_by_suit['wild'].append(wild_card)
-  
+      for i in range(4 if not half else 2):
+        codes.append(encode_card('+4', 'wild'))
+        codes.append(encode_card('wild', 'wild'))
+
+  return codes
+
+DECK_TEMPLATES: Dict[bool, array] = {
+  False: _make_deck_template(half=False),
+  True:  _make_deck_template(half=True)
+}
+
+class Deck(UnoObject):
+  def __init__(self, half: bool = False, id: str = None, rng: random.Random = None) -> None:
+    super().__init__(id)
+    self.half = half
+    self.rng  = rng if rng is not None else random.Random()
+    # Card ids are the card's ordinal in the deck template, unique per deck.
+    self.cards = [Card.from_code(code, str(ordinal)) for ordinal, code in enumerate(DECK_TEMPLATES[half])]
+    self.cards_by_suit = {suit: [] for suit in SUITS}
+
+    for card in self.cards:
+      self.cards_by_suit[card.suit].append(card)
+
   def shuffle(self):
-    random.shuffle(self.cards)
+    self.rng.shuffle(self.cards)
 
   def get_hand(self) -> List[Card]:
     return self.draw(PLAYER_HAND_SIZE)
   
+  # self.cards is used as a stack, the top of the draw pile is the end of the list.
   def draw(self, num_cards = 1) -> List[Card]:
-    cards = []
-    for _ in range(num_cards):
-      card = self.cards.pop()
-      cards.append(card)
-    
+    if num_cards > len(self.cards):
+      raise IndexError(f"Cannot draw {num_cards} cards from a deck of {len(self.cards)}")
+
+    if num_cards <= 0:
+      return []
+
+    cards = self.cards[-num_cards:]
+    del self.cards[-num_cards:]
+    cards.reverse()
+
     return cards
 
+  def draw_first(self, predicate: Callable[[Card], bool]) -> Card:
+    # Takes the card closest to the top matching predicate, leaving the ones above it in place.
+    for i in range(len(self.cards) - 1, -1, -1):
+      if predicate(self.cards[i]):
+        return self.cards.pop(i)
+
+    raise IndexError("No card in the deck matches")
+
+  def refill(self, cards: List[Card]):
+    # Recycled cards go under the remaining draw pile.
+    self.rng.shuffle(cards)
+    self.cards[:0] = cards
+
   def size(self) -> int:
     return len(self.cards)
 
 
+# A player's cards in the order they were received, indexed by id. Cards are also
+# bucketed by suit and by value, so finding the cards that can go on a discard top
+# does not need to scan the whole hand.
+class Hand(object):
+  def __init__(self, cards: Iterable[Card] = ()) -> None:
+    self._cards: Dict[str, Card] = {}
+    self._by_suit: Dict[str, Dict[str, Card]]  = {suit: {} for suit in SUITS}
+    self._by_value: Dict[str, Dict[str, Card]] = {value: {} for value in VALUES}
+    self._code_counts: Dict[int, int] = {}
+    self._ordered: Optional[List[Card]] = None
+    self.extend(cards)
+
+  def append(self, card: Card):
+    self._cards[card.id] = card
+    self._by_suit[card.suit][card.id] = card
+    self._by_value[card.value][card.id] = card
+    self._code_counts[card.code] = self._code_counts.get(card.code, 0) + 1
+    self._ordered = None
+
+  def extend(self, cards: Iterable[Card]):
+    for card in cards:
+      self.append(card)
+
+  def remove(self, card: Card):
+    if card.id not in self._cards:
+      raise ValueError(f"{card} is not in hand")
+
+    self.remove_by_id(card.id)
+
+  def index(self, card: Card) -> int:
+    return list(self._cards).index(card.id)
+
+  def insert(self, index: int, card: Card):
+    self.append(card)
+    ordered = list(self._cards.values())
+    ordered.insert(index, ordered.pop())
+    self._cards = {c.id: c for c in ordered}
+
+  def remove_by_id(self, card_id: str) -> Card:
+    card = self._cards.pop(card_id)
+    del self._by_suit[card.suit][card_id]
+    del self._by_value[card.value][card_id]
+    self._code_counts[card.code] -= 1
+    self._ordered = None
+    return card
+
+  def get(self, card_id: str) -> Optional[Card]:
+    return self._cards.get(card_id)
+
+  def count_suit(self, suit: str) -> int:
+    return len(self._by_suit[suit])
+
+  def count_value(self, value: str) -> int:
+    return len(self._by_value[value])
+
+  def _count_code(self, value: str, suit: str) -> int:
+    return self._code_counts.get(encode_card(value, suit), 0)
+
+  def count_playable(self, discard_top: Card) -> int:
+    suit, value = discard_top.suit, discard_top.value
+    # Cards matching the suit, the value or being wild, counted by inclusion-exclusion.
+    same_suit  = self.count_suit(suit)
+    same_value = self.count_value(value)
+    wild       = self.count_suit('wild')
+    suit_and_value = self._count_code(value, suit)
+    suit_and_wild  = same_suit if suit == 'wild' else 0
+    value_and_wild = self._count_code(value, 'wild')
+    all_three      = suit_and_value if suit == 'wild' else 0
+
+    return same_suit + same_value + wild - suit_and_value - suit_and_wild - value_and_wild + all_three
+
+  # Not necessarily in hand order.
+  def playable(self, discard_top: Card) -> List[Card]:
+    playable = dict(self._by_suit[discard_top.suit])
+    playable.update(self._by_value[discard_top.value])
+    playable.update(self._by_suit['wild'])
+    return list(playable.values())
+
+  def _as_list(self) -> List[Card]:
+    if self._ordered is None:
+      self._ordered = list(self._cards.values())
+    return self._ordered
+
+  def __getitem__(self, index):
+    return self._as_list()[index]
+
+  def __contains__(self, card: Card) -> bool:
+    return self._cards.get(card.id) is card
+
+  def __iter__(self) -> Iterator[Card]:
+    return iter(self._cards.values())
+
+  def __len__(self) -> int:
+    return len(self._cards)
+
+  def __repr__(self) -> str:
+    return f"Hand({self._as_list()})"
+
 class Player(UnoObject):
-  def __init__(self, name: str, color: str, id: str = None) -> None:
+  def __init__(self, name: str, color: str, id: str = None, bot: str = None) -> None:
     super().__init__(id)
     self.name = name
     self.color = color
-    self.hand = []
+    self.hand = Hand()
+    # Name of the bot making this player's moves, see bots.BOTS. None for humans.
+    self.bot = bot
+
+  @property
+  def hand(self) -> Hand:
+    return self._hand
+
+  @hand.setter
+  def hand(self, cards: Iterable[Card]):
+    self._hand = cards if isinstance(cards, Hand) else Hand(cards)
   
   def as_dict(self):
     return {
@@ -155,10 +389,25 @@ class Player(UnoObject):
     )
 
     if 'hand' in player_dict:
-      player.hand = [Card.from_dict(c_dict) for c_dict in player_dict['hand']]
+      player.hand = [
+        Card.from_compact(c) if isinstance(c, list) else Card.from_dict(c)
+        for c in player_dict['hand']
+      ]
     
     return player
 
+  def to_bytes(self) -> bytes:
+    header = json.dumps({'id': self.id, 'name': self.name, 'color': self.color, 'bot': self.bot}).encode()
+    return pack_sections([header, pack_cards(self.hand)])
+
+  @staticmethod
+  def from_bytes(data, cards: Dict[int, Card] = None):
+    header, hand = unpack_sections(data)
+    fields = json.loads(bytes(header))
+    player = Player(fields['name'], fields['color'], id=fields['id'], bot=fields.get('bot'))
+    player.hand = unpack_cards(hand, cards if cards is not None else {})
+    return player
+
 class Play(UnoObject):
   def __init__(self, player: Player, action: str, card: Card = None, suit: str = None, id: str = None) -> None:
     super().__init__(id)
@@ -167,6 +416,9 @@ class Play(UnoObject):
     self.card   = card
     self.suit   = suit
 
+    if self.action not in ACTIONS:
+      raise ValueError(f"Action must be one of {ACTIONS}. It is {self.action}")
+
     if self.action == 'play':
       if self.card is None:
         raise ValueError(f"Play argument must be a card. It is {self.card}")
@@ -188,16 +440,105 @@ class Play(UnoObject):
       'suit': self.suit
     }
 
-def is_card_playable(card: Card, discard_top: Card) -> bool:
+def _matches(card: Card, discard_top: Card) -> bool:
   return card.value == discard_top.value \
     or card.suit == discard_top.suit \
     or card.suit == 'wild'
 
+CARD_CODES = len(SUITS) << VALUE_BITS
+
+def _make_playable_table() -> bytes:
+  cards = [Card(value, suit) for suit in SUITS for value in VALUES]
+  table = bytearray(CARD_CODES * CARD_CODES)
+  for top in cards:
+    for card in cards:
+      table[top.code * CARD_CODES + card.code] = _matches(card, top)
+
+  return bytes(table)
+
+# Whether a card can go on a discard top, one flat suit x value grid of codes:
+# PLAYABLE[top.code * CARD_CODES + card.code].
+PLAYABLE = _make_playable_table()
+
+def is_card_playable(card: Card, discard_top: Card) -> bool:
+  return PLAYABLE[discard_top.code * CARD_CODES + card.code] == 1
+
+# Everything about a Game that moves can change, see Game.snapshot. Cards are their
+# ordinals in the deck template, so piles and hands are a few bytes each and a
+# snapshot is copied in O(cards) without any Card object. Ids, names, the plays
+# log and the random state are left out, they belong to the game the snapshot is
+# restored into.
+class GameSnapshot(NamedTuple):
+  half: bool
+  deck: bytes
+  discard_pile: bytes
+  hands: Tuple[bytes, ...]
+  # The suit chosen for a wild or +4 card on top of the discard pile.
+  top_suit: Optional[str]
+  direction: int
+  current_player_index: int
+  started: bool
+  finished: bool
+  winner: Optional[int]
+  version: int
+
+def _ordinals(cards: Iterable[Card]) -> bytes:
+  return bytes([int(card.id) for card in cards])
+
+# What one play changed, enough to take it back, see Game.undo. Nothing is copied:
+# the cards are the game's own and the discard pile, when drawing shuffled it back
+# into the deck, is the list it replaced. Drawn cards are the ones a hand grew by.
+class PlayDelta(object):
+  __slots__ = (
+    'hand_index', 'drawer', 'drawer_hand_size', 'recycled', 'rng_state',
+    'top_suit', 'direction', 'current_player_index', 'finished', 'winner'
+  )
+
+  def __init__(self, game: 'Game', play: Play) -> None:
+    self.top_suit   = game.top_suit
+    self.direction  = game.direction
+    self.current_player_index = game.current_player_index
+    self.finished   = game.finished
+    self.winner     = game.winner
+    # Where the played card was in its hand.
+    self.hand_index: Optional[int] = None
+    self.drawer: Optional[Player]  = None
+    self.drawer_hand_size = 0
+    self.recycled: Optional[List[Card]] = None
+    self.rng_state  = None
+    if play.action == 'pass':
+      return
+
+    player = game.get_current_player()
+    if play.action == 'play' and play.card is not None and play.card in player.hand:
+      self.hand_index = player.hand.index(play.card)
+
+    draws = _cards_drawn(play)
+    if draws:
+      self.drawer = player if play.action == 'draw' else game.players[game._get_next_player_index(0)]
+      self.drawer_hand_size = len(self.drawer.hand)
+      if game.deck.size() < draws:
+        # The play shuffles, redoing it shuffles the same.
+        self.rng_state = game.rng.getstate()
+
+def _cards_drawn(play: Play) -> int:
+  if play.card is not None and play.card.is_draw_card():
+    return play.card.draw_how_many()
+
+  return 1 if play.action == 'draw' else 0
+
 class Game(UnoObject):
-  def __init__(self, players: List[Player], id: str = None) -> None:
-    super().__init__(id)
+  def __init__(self, players: List[Player], id: str = None, seed: int = None) -> None:
+    # All the game's randomness comes from its seed, so a game can be replayed from it.
+    # Ids are drawn from their own rng, creating more objects does not change the shuffles.
+    self.seed   = seed if seed is not None else random.getrandbits(64)
+    self.rng    = random.Random(self.seed)
+    self.id_rng = random.Random(f"{self.seed}-ids")
+
+    generated_id = self.new_id()
+    super().__init__(id if id is not None else generated_id)
     
-    self.deck = Deck(half=True)
+    self.deck = Deck(half=True, id=self.new_id(), rng=self.rng)
     self.discard_pile   = []
     self.players        = players
     self._players_by_id = {p.id: p for p in self.players}
@@ -205,6 +546,19 @@ class Game(UnoObject):
     self.finished       = False
     self.direction      = +1
     self.winner         = None
+    # Bumped on every state change, lets clients wait for or skip unchanged states.
+    self.version        = 0
+    # Every play made through progress, the last one produced the current version.
+    self.plays          = []
+    # How to take back the last len(history) plays, and the plays taken back.
+    self.history: List[PlayDelta] = []
+    self.undone:  List[Play]      = []
+    # Undo moves the version on like any change, so the state before an undo is never
+    # mistaken for the one after. The plays before the last undo are not reached
+    # by version any more, see plays_since.
+    self.undo_version = 0
+    # The suit chosen for a wild or +4 card on top of the discard pile, the card keeps its own.
+    self.top_suit: Optional[str]  = None
     
     self.current_player_index = 0
     
@@ -217,6 +571,10 @@ class Game(UnoObject):
 
       self._draw_discard()
       self.started = True
+      self.version += 1
+
+  def new_id(self) -> str:
+    return random_id(self.id_rng)
 
   def get_current_player(self) -> Player:
     return self.players[self.current_player_index]   
@@ -224,10 +582,22 @@ class Game(UnoObject):
   def get_player_by_id(self, player_id):
     return self._players_by_id[player_id]
 
-  def progress(self, play: Play):
+  def progress(self, play: Play, snapshot: GameSnapshot = None) -> Optional[GameSnapshot]:
+    # With a snapshot, play is made on it instead and the snapshot it leads to is
+    # returned, the game itself is left as it was. play is one of this game's.
+    if snapshot is not None:
+      return self._progress_snapshot(play, snapshot)
+
+    self._progress(play)
+    # Undone plays can not be redone after a new one.
+    self.undone = []
+
+  def _progress(self, play: Play):
     if self.get_current_player() != play.player:
       raise ValueError(f"Current player should be {self.get_current_player()}")    
     
+    delta = PlayDelta(self, play)
+    discard_pile = self.discard_pile
     if play.action == 'play':
       self.play(play)
     elif play.action == 'draw':
@@ -235,14 +605,241 @@ class Game(UnoObject):
     elif play.action == 'pass':
       self.skip()
 
+    if self.discard_pile is not discard_pile:
+      delta.recycled = discard_pile
+
+    self.plays.append(play)
+    self.history.append(delta)
+    self.version += 1
+
+  def undo(self) -> Play:
+    # Takes back the last play, redo makes it again until another play is made.
+    # Both are a new version.
+    if not self.history:
+      raise IndexError('No play to undo')
+
+    delta = self.history.pop()
+    play  = self.plays.pop()
+
+    drawn = len(delta.drawer.hand) - delta.drawer_hand_size if delta.drawer is not None else 0
+    if drawn > 0:
+      # Back on the draw pile in the order they came off it.
+      cards = delta.drawer.hand[-drawn:]
+      for card in cards:
+        delta.drawer.hand.remove(card)
+      self.deck.cards.extend(reversed(cards))
+
+    if delta.recycled is not None:
+      del self.deck.cards[:len(delta.recycled) - 1]
+      self.discard_pile = delta.recycled
+    if delta.rng_state is not None:
+      self.rng.setstate(delta.rng_state)
+
+    if delta.hand_index is not None:
+      play.player.hand.insert(delta.hand_index, self.discard_pile.pop())
+
+    self.top_suit             = delta.top_suit
+    self.direction            = delta.direction
+    self.current_player_index = delta.current_player_index
+    self.finished             = delta.finished
+    self.winner               = delta.winner
+    self.version += 1
+    self.undo_version = self.version
+
+    self.undone.append(play)
+    return play
+
+  def redo(self) -> Play:
+    if not self.undone:
+      raise IndexError('No play to redo')
+
+    play = self.undone.pop()
+    self._progress(play)
+    return play
+
+  def state_at(self, version: int) -> GameSnapshot:
+    # The game as it was at version, undoing the plays since and redoing them after.
+    # The game's version is left as it was.
+    first_version = max(self.version - len(self.history), self.undo_version)
+    if not first_version <= version <= self.version:
+      raise ValueError(f"Version {version} is not in the history, it goes back to {first_version}")
+
+    current_version, undo_version, undone = self.version, self.undo_version, self.undone
+    self.undone = []
+    try:
+      for _ in range(current_version - version):
+        self.undo()
+      return self.snapshot()._replace(version=version)
+    finally:
+      while self.undone:
+        self.redo()
+      self.version, self.undo_version, self.undone = current_version, undo_version, undone
+
+  def _progress_snapshot(self, play: Play, snapshot: GameSnapshot) -> GameSnapshot:
+    # The rules of progress, play and draw applied to the snapshot's bytes, no Card
+    # or pile of the game is touched. Cards are played by ordinal.
+    hands     = list(snapshot.hands)
+    current   = snapshot.current_player_index
+    direction = snapshot.direction
+    top_suit  = snapshot.top_suit
+    finished, winner = snapshot.finished, snapshot.winner
+    deck, discard_pile = snapshot.deck, snapshot.discard_pile
+
+    if self.players[current] != play.player:
+      raise ValueError(f"Current player should be {self.players[current]}")
+
+    skip = 0
+    if play.action == 'play':
+      card = play.get_card()
+      top  = DECK_TEMPLATES[snapshot.half][discard_pile[-1]]
+      if top_suit is not None:
+        top = encode_card(decode_card(top)[0], top_suit)
+      ordinal = bytes([int(card.id)]) if card is not None else b''
+      if card is None or ordinal not in hands[current] or not PLAYABLE[top * CARD_CODES + card.code]:
+        raise ValueError(f"Play card is invalid: {card}")
+
+      hands[current] = hands[current].replace(ordinal, b'')
+      discard_pile += ordinal
+      if not hands[current]:
+        finished, winner = True, current
+      if card.is_reverse_card():
+        direction = -1
+      if card.is_skip_card():
+        skip = 1
+      if card.is_draw_card():
+        next_player = (current + direction) % len(hands)
+        deck, discard_pile, drawn = self._draw_snapshot(deck, discard_pile, card.draw_how_many())
+        hands[next_player] += drawn
+      top_suit = play.get_suit() if card.is_choose_color_card() else None
+    elif play.action == 'draw':
+      deck, discard_pile, drawn = self._draw_snapshot(deck, discard_pile, 1)
+      hands[current] += drawn
+
+    if play.action in ('play', 'pass'):
+      current = (current + (1 + skip) * direction) % len(hands)
+
+    return snapshot._replace(
+      deck                 = deck,
+      discard_pile         = discard_pile,
+      hands                = tuple(hands),
+      top_suit             = top_suit,
+      direction            = direction,
+      current_player_index = current,
+      finished             = finished,
+      winner               = winner,
+      version              = snapshot.version + 1
+    )
+
+  def _draw_snapshot(self, deck: bytes, discard_pile: bytes, num_cards: int) -> Tuple[bytes, bytes, bytes]:
+    # Deck.draw and _recycle_discard_pile on ordinals. A shuffle uses a copy of the
+    # game's random state, so the game's own shuffles do not change.
+    if len(deck) < num_cards:
+      rng = random.Random()
+      rng.setstate(self.rng.getstate())
+      recycled = bytearray(discard_pile[:-1])
+      rng.shuffle(recycled)
+      deck, discard_pile = bytes(recycled) + deck, discard_pile[-1:]
+
+    num_cards = min(num_cards, len(deck))
+    if num_cards <= 0:
+      return deck, discard_pile, b''
+
+    return deck[:-num_cards], discard_pile, deck[:-num_cards - 1:-1]
+
+  def snapshot(self) -> GameSnapshot:
+    return GameSnapshot(
+      half                 = self.deck.half,
+      deck                 = _ordinals(self.deck.cards),
+      discard_pile         = _ordinals(self.discard_pile),
+      hands                = tuple(_ordinals(p.hand) for p in self.players),
+      top_suit             = self.top_suit,
+      direction            = self.direction,
+      current_player_index = self.current_player_index,
+      started              = self.started,
+      finished             = self.finished,
+      winner               = self.players.index(self.winner) if self.winner is not None else None,
+      version              = self.version
+    )
+
+  def restore(self, snapshot: GameSnapshot):
+    # Puts the game's own Card objects back where snapshot has them. The plays log and
+    # the history are cut back to snapshot's version, or emptied if the snapshot is
+    # not from the game's past. Undone plays are dropped.
+    cards: List[Optional[Card]] = [None] * len(DECK_TEMPLATES[self.deck.half])
+    for pile in [self.deck.cards, self.discard_pile] + [p.hand for p in self.players]:
+      for card in pile:
+        cards[int(card.id)] = card
+
+    self.deck.cards   = [cards[o] for o in snapshot.deck]
+    self.discard_pile = [cards[o] for o in snapshot.discard_pile]
+    for player, hand in zip(self.players, snapshot.hands):
+      player.hand = [cards[o] for o in hand]
+
+    for log in (self.plays, self.history):
+      kept = len(log) - (self.version - snapshot.version)
+      del log[kept if 0 <= kept <= len(log) and snapshot.version >= self.undo_version else 0:]
+    self.undone = []
+    self.undo_version = min(self.undo_version, snapshot.version)
+
+    self.top_suit             = snapshot.top_suit
+    self.direction            = snapshot.direction
+    self.current_player_index = snapshot.current_player_index
+    self.started              = snapshot.started
+    self.finished             = snapshot.finished
+    self.winner               = self.players[snapshot.winner] if snapshot.winner is not None else None
+    self.version              = snapshot.version
+
+  def legal_moves(self, player: Player) -> List[Play]:
+    # Every play player can make right now: each playable card, once per suit choice
+    # for wild and +4 cards, then draw and pass. Empty when it is not their turn.
+    if not self.started or self.finished or player != self.get_current_player():
+      return []
+
+    # Ids are only unique within this version, moves are not kept after it changes.
+    ids = (f"{self.version}-{i}" for i in itertools.count())
+    row = self.get_discard_top().code * CARD_CODES
+    moves = []
+    for card in player.hand:
+      if not PLAYABLE[row + card.code]:
+        continue
+
+      if card.is_choose_color_card():
+        moves.extend(Play(player, 'play', card, suit, next(ids)) for suit in SUIT_CHOICES)
+      else:
+        moves.append(Play(player, 'play', card, id=next(ids)))
+
+    moves.append(Play(player, 'draw', id=next(ids)))
+    moves.append(Play(player, 'pass', id=next(ids)))
+    return moves
+
+  def plays_since(self, version: int) -> Optional[List[Play]]:
+    # None when version predates the plays log, i.e. the game was not started yet,
+    # or the last undo.
+    if version < max(self.version - len(self.plays), self.undo_version):
+      return None
+
+    return self.plays[len(self.plays) - (self.version - version):]
+
   def draw(self, play: Play, player: Player = None) -> List[Card]:
     if player is None:
       player = self.get_current_player()
 
     if play.get_card() is not None and play.get_card().is_draw_card():
-      player.hand.extend(self.deck.draw(play.get_card().draw_how_many()))
+      player.hand.extend(self._draw_from_deck(play.get_card().draw_how_many()))
     elif play.action == 'draw':
-      player.hand.extend(self.deck.draw())
+      player.hand.extend(self._draw_from_deck(1))
+
+  def _draw_from_deck(self, num_cards: int) -> List[Card]:
+    if self.deck.size() < num_cards:
+      self._recycle_discard_pile()
+
+    # With every other card in someone's hand there may still not be enough to draw.
+    return self.deck.draw(min(num_cards, self.deck.size()))
+
+  def _recycle_discard_pile(self):
+    # A new discard pile, the old one is left as it was for undo.
+    self.deck.refill(self.discard_pile[:-1])
+    self.discard_pile = self.discard_pile[-1:]
     
   def play(self, play: Play):
     if play.get_card() is None or not is_card_playable(play.get_card(), self.get_discard_top()):
@@ -265,8 +862,7 @@ class Game(UnoObject):
     if play.get_card().is_draw_card():
       self.draw(play, self.players[self._get_next_player_index(0)])
 
-    if play.get_card().is_choose_color_card():
-      self.get_discard_top().suit = play.get_suit()
+    self.top_suit = play.get_suit() if play.get_card().is_choose_color_card() else None
     
     self._set_next_player(skip)
   
@@ -280,7 +876,12 @@ class Game(UnoObject):
       return (self.current_player_index + (1 + skip) * self.direction) % len(self.players)
 
   def get_discard_top(self) -> Card:
-    return self.discard_pile[-1]
+    # A wild card on top shows the suit chosen for it, on a card of its own.
+    top = self.discard_pile[-1]
+    if self.top_suit is None:
+      return top
+
+    return Card.from_code(encode_card(top.value, self.top_suit), top.id)
   
   def finish(self, winner: Player = None):
     self.finished = True
@@ -290,12 +891,106 @@ class Game(UnoObject):
     return self.finished
 
   def _draw_discard(self):
-    card = self.deck.cards.pop()
-    while not self._validate_discard_top(card):
-      self.deck.cards.insert(0, card)
-      card = self.deck.cards.pop()
-    
+    card = self.deck.draw_first(self._validate_discard_top)
     self.discard_pile.append(card)
 
   def _validate_discard_top(self, card: Card):
-    return card.value not in ['+2', '+4', 'skip', 'reverse', 'wild']
\ No newline at end of file
+    return card.value not in ['+2', '+4', 'skip', 'reverse', 'wild']
+
+  def to_bytes(self) -> bytes:
+    # A few hundred bytes of cards and plays plus the two random states, see STATE_FORMAT.
+    header = {
+      'format': STATE_FORMAT,
+      'id': self.id,
+      'seed': self.seed,
+      'deck_id': self.deck.id,
+      'half': self.deck.half,
+      'started': self.started,
+      'finished': self.finished,
+      'direction': self.direction,
+      'winner': self.players.index(self.winner) if self.winner is not None else None,
+      'current_player_index': self.current_player_index,
+      'top_suit': self.top_suit,
+      'undo_version': self.undo_version,
+      'version': self.version
+    }
+
+    player_indexes = {p.id: i for i, p in enumerate(self.players)}
+    plays = bytearray()
+    for play in self.plays:
+      plays.append(player_indexes[play.player.id])
+      plays.append(ACTIONS.index(play.action))
+      plays.append(int(play.card.id) if play.card is not None else NO_CARD)
+      plays.append(SUIT_CODES[play.suit] if play.suit is not None else NO_CARD)
+
+    return pack_sections([
+      json.dumps(header).encode(),
+      pack_random(self.rng),
+      pack_random(self.id_rng),
+      pack_cards(self.deck.cards),
+      pack_cards(self.discard_pile),
+      bytes(plays)
+    ] + [p.to_bytes() for p in self.players])
+
+  @staticmethod
+  def from_bytes(data):
+    header, rng, id_rng, deck_cards, discard_pile, plays, *players = unpack_sections(data)
+    fields = json.loads(bytes(header))
+    if fields['format'] not in (1, STATE_FORMAT):
+      raise ValueError(f"Unknown game state format {fields['format']}")
+
+    cards: Dict[int, Card] = {}
+    game = Game.__new__(Game)
+    game.id        = fields['id']
+    game.seed      = fields['seed']
+    game.rng       = unpack_random(rng)
+    game.id_rng    = unpack_random(id_rng)
+    game.started   = fields['started']
+    game.finished  = fields['finished']
+    game.direction = fields['direction']
+    game.version   = fields['version']
+    game.current_player_index = fields['current_player_index']
+    game.top_suit  = fields.get('top_suit')
+    game.undo_version = fields.get('undo_version', 0)
+    # Loaded games have no history to undo.
+    game.history   = []
+    game.undone    = []
+
+    game.deck = Deck.__new__(Deck)
+    game.deck.id    = fields['deck_id']
+    game.deck.half  = fields['half']
+    game.deck.rng   = game.rng
+    game.deck.cards = unpack_cards(deck_cards, cards)
+    game.discard_pile = unpack_cards(discard_pile, cards)
+    if fields['format'] == 1:
+      # The suit chosen for the top card used to be written on the card itself.
+      top = game.discard_pile[-1] if game.discard_pile else None
+      if top is not None and top.is_choose_color_card() and top.suit != 'wild':
+        game.top_suit = top.suit
+      for card in game.discard_pile:
+        if card.is_choose_color_card():
+          card.suit = 'wild'
+
+    game.players = [Player.from_bytes(p, cards) for p in players]
+    game._players_by_id = {p.id: p for p in game.players}
+    game.winner = game.players[fields['winner']] if fields['winner'] is not None else None
+
+    game.deck.cards_by_suit = {suit: [] for suit in SUITS}
+    for ordinal in sorted(cards):
+      card = cards[ordinal]
+      game.deck.cards_by_suit[decode_card(DECK_TEMPLATES[game.deck.half][ordinal])[1]].append(card)
+
+    # Play ids are not kept, a restored play's id is the version it produced.
+    first_version = game.version - len(plays) // 4
+    game.plays = []
+    for i in range(0, len(plays), 4):
+      player, action, card, suit = plays[i:i + 4]
+      game.plays.append(Play(
+        game.players[player],
+        ACTIONS[action],
+        card = cards[card] if card != NO_CARD else None,
+        suit = SUITS[suit] if suit != NO_CARD else None,
+        id   = str(first_version + i // 4 + 1)
+      ))
+
+    return game
\ No newline at end of file
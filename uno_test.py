@@ -1,6 +1,7 @@
+import random
 import unittest
 import re
-from uno import PLAYER_HAND_SIZE, Card, VALUES, SUITS, Deck, Game, Player
+from uno import PLAYER_HAND_SIZE, Card, VALUES, SUITS, Deck, Game, Hand, Play, Player, is_card_playable
 
 class CardTest(unittest.TestCase):
   def testCardConstructor_okValue_okSuit(self):
@@ -26,6 +27,23 @@ class CardTest(unittest.TestCase):
   def testCard_isSkipCard_skip(self):
     card = Card('3', 'red')
     self.assertFalse(card.is_skip_card(), f"Card {card.value} should be a skip card")
+
+  def testCard_code_roundTrip(self):
+    for suit in SUITS:
+      for value in VALUES:
+        card = Card.from_code(Card(value, suit).code, 'abc')
+        self.assertEqual((card.value, card.suit, card.id), (value, suit, 'abc'))
+
+  def testCard_dict_roundTrip(self):
+    card = Deck().cards[0]
+    copy = Card.from_dict(card.as_dict())
+    self.assertEqual((copy.id, copy.value, copy.suit), (card.id, card.value, card.suit))
+
+  def testCard_compact_roundTrip(self):
+    card = Deck().cards[0]
+    copy = Card.from_compact(card.as_compact())
+    self.assertEqual(card.as_compact(), [int(card.id), card.code])
+    self.assertEqual((copy.id, copy.value, copy.suit), (card.id, card.value, card.suit))
 class DeckTest(unittest.TestCase):
   def testConstructDeck(self):
     decks = [Deck(half=False), Deck(half=True)]
@@ -33,6 +51,10 @@ class DeckTest(unittest.TestCase):
     for deck in decks:
       self._test_deck(deck)
 
+  def testConstructDeck_uniqueIds(self):
+    deck = Deck()
+    self.assertEqual(len({c.id for c in deck.cards}), deck.size())
+
   def _test_deck(self, deck):
       expected_deck_cards = 56 if deck.half else 108
       self.assertEqual(len(deck.cards), expected_deck_cards, f"There should be {expected_deck_cards} cards in a {'half' if deck.half else 'full'} deck")
@@ -82,6 +104,49 @@ class DeckTest(unittest.TestCase):
     self.assertEqual(hand_size,   PLAYER_HAND_SIZE,   f"Expected hand size to be {PLAYER_HAND_SIZE}")
     self.assertEqual(deck.size(), expected_deck_size, f"Expected new deck size to be {expected_deck_size}")
 
+  def test_draw_takesFromTop(self):
+    deck = Deck()
+    expected = list(reversed(deck.cards[-4:]))
+
+    self.assertEqual(deck.draw(4), expected)
+    self.assertEqual(deck.size(), 104)
+    self.assertRaises(IndexError, deck.draw, 105)
+
+class HandTest(unittest.TestCase):
+  def test_keepsOrder(self):
+    cards = Deck().cards[:10]
+    hand = Hand(cards)
+    hand.remove(cards[3])
+
+    expected = cards[:3] + cards[4:]
+    self.assertEqual(list(hand), expected)
+    self.assertEqual(hand[3], expected[3])
+    self.assertEqual(len(hand), 9)
+
+  def test_getAndRemoveById(self):
+    cards = Deck().cards[:5]
+    hand = Hand(cards)
+
+    self.assertIs(hand.get(cards[2].id), cards[2])
+    self.assertIs(hand.remove_by_id(cards[2].id), cards[2])
+    self.assertIsNone(hand.get(cards[2].id))
+    self.assertRaises(ValueError, hand.remove, cards[2])
+
+  def test_playable_matchesIsCardPlayable(self):
+    hand = Hand(Deck().cards)
+    for top in [Card('5', 'red'), Card('wild', 'blue'), Card('skip', 'yellow')]:
+      expected = [c for c in hand if is_card_playable(c, top)]
+
+      self.assertEqual(hand.count_playable(top), len(expected))
+      self.assertCountEqual(hand.playable(top), expected)
+
+class PlayTest(unittest.TestCase):
+  def testPlayConstructor_unknownAction(self):
+    self.assertRaises(ValueError, Play, Player('Player 1', 'red'), 'dance')
+
+  def testPlayConstructor_wildWithoutSuit(self):
+    self.assertRaises(ValueError, Play, Player('Player 1', 'red'), 'play', Card('wild', 'wild'))
+
 PLAYERS = [
   Player('Player 1', 'red'),
   Player('Player 2', 'green'),
@@ -101,4 +166,132 @@ class GameTest(unittest.TestCase):
     game = Game(PLAYERS)
     self.assertEqual(len(game.players), 3)
     self.assertFalse(game.deck.half, "Expected a two player game to be full deck.")
-    DeckTest()._test_deck(game.deck)
\ No newline at end of file
+    DeckTest()._test_deck(game.deck)
+
+  def test_legalMoves(self):
+    game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], seed=3)
+    game.start()
+    player = game.get_current_player()
+    player.hand = [Card('5', 'red'), Card('7', 'blue'), Card('wild', 'wild'), Card('+4', 'wild')]
+    game.discard_pile.append(Card('5', 'green'))
+
+    moves = game.legal_moves(player)
+
+    self.assertEqual([(m.action, m.card.value if m.card else None) for m in moves[:1] + moves[-2:]], [('play', '5'), ('draw', None), ('pass', None)])
+    self.assertEqual([m.suit for m in moves if m.card is not None and m.card.suit == 'wild'], ['red', 'green', 'blue', 'yellow'] * 2)
+    self.assertEqual(len(moves), 1 + 8 + 2)
+    self.assertEqual(game.legal_moves(game.players[1]), [])
+
+    game.progress(moves[-3])
+    self.assertEqual((game.get_discard_top().value, game.get_discard_top().suit), ('+4', 'yellow'))
+    # The chosen suit is the game's, not the card's.
+    self.assertEqual(moves[-3].card.suit, 'wild')
+
+  def test_snapshot_restore(self):
+    game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], seed=5)
+    game.start()
+    snapshot = game.snapshot()
+    cards = {id(c) for c in game.deck.cards}
+
+    rng = random.Random(5)
+    for _ in range(30):
+      game.progress(rng.choice(game.legal_moves(game.get_current_player())))
+    game.restore(snapshot)
+
+    self.assertEqual(game.snapshot(), snapshot)
+    self.assertEqual(game.plays, [])
+    self.assertEqual({id(c) for c in game.deck.cards}, cards)
+
+  def test_progress_onSnapshot(self):
+    game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], seed=5)
+    game.start()
+    before = game.snapshot()
+    play = game.legal_moves(game.get_current_player())[0]
+
+    after = game.progress(play, before)
+
+    self.assertEqual(game.snapshot(), before)
+    self.assertEqual(game.plays, [])
+    game.progress(play)
+    self.assertEqual(game.snapshot(), after)
+    # The snapshot's hands count, not the game's.
+    self.assertRaises(ValueError, game.progress, play, before._replace(hands=(b'', b'')))
+
+  def test_undo_redo(self):
+    game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], seed=7)
+    game.start()
+    rng = random.Random(7)
+    snapshots = [game.snapshot()]
+    # Mostly draws, so the discard pile gets shuffled back in.
+    while len(snapshots) < 120 and not game.finished:
+      moves = game.legal_moves(game.get_current_player())
+      game.progress(moves[-2] if rng.random() < 0.6 else rng.choice(moves))
+      snapshots.append(game.snapshot())
+    plays = list(game.plays)
+
+    for snapshot in reversed(snapshots[:-1]):
+      version = game.version
+      game.undo()
+      # The same state, but a version of its own.
+      self.assertEqual(game.version, version + 1)
+      self.assertEqual(game.snapshot()._replace(version=0), snapshot._replace(version=0))
+    self.assertRaises(IndexError, game.undo)
+    self.assertIsNone(game.plays_since(game.version - 1))
+
+    while game.undone:
+      game.redo()
+    self.assertEqual(game.snapshot()._replace(version=0), snapshots[-1]._replace(version=0))
+    self.assertEqual(game.plays, plays)
+    self.assertEqual(game.plays_since(game.version - 1), plays[-1:])
+
+  def test_stateAt(self):
+    game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], seed=5)
+    game.start()
+    rng = random.Random(5)
+    snapshots = {game.version: game.snapshot()}
+    for _ in range(30):
+      game.progress(rng.choice(game.legal_moves(game.get_current_player())))
+      snapshots[game.version] = game.snapshot()
+
+    self.assertEqual(game.state_at(10), snapshots[10])
+    self.assertEqual(game.snapshot(), snapshots[game.version])
+    self.assertRaises(ValueError, game.state_at, 0)
+
+    # Not past an undo.
+    game.undo()
+    self.assertRaises(ValueError, game.state_at, 10)
+    self.assertEqual(game.state_at(game.version), game.snapshot())
+
+  def test_toBytes_roundTrip(self):
+    game = Game([Player('Player 1', 'red'), Player('Player 2', 'blue')], seed=3)
+    game.start()
+    game.progress(Play(game.get_current_player(), 'draw'))
+    game.progress(Play(game.get_current_player(), 'pass'))
+
+    restored = Game.from_bytes(game.to_bytes())
+
+    self.assertEqual(restored.to_bytes(), game.to_bytes())
+    self.assertEqual([p.id for p in restored.players], [p.id for p in game.players])
+    self.assertEqual([p.action for p in restored.plays], ['draw', 'pass'])
+    # The random states come along, both games go on the same.
+    self.assertEqual(restored.new_id(), game.new_id())
+    self.assertEqual(restored.rng.random(), game.rng.random())
+
+  def test_draw_recyclesDiscardPile(self):
+    players = [Player('Player 1', 'red'), Player('Player 2', 'blue')]
+    game = Game(players)
+    game.start()
+
+    wild = Card('wild', 'wild')
+    game.discard_pile.insert(0, wild)
+    top = game.get_discard_top()
+    game.deck.cards = game.deck.cards[:1]
+
+    game.progress(Play(players[0], 'draw'))
+    game.progress(Play(players[0], 'pass'))
+    game.progress(Play(players[1], 'draw'))
+
+    self.assertEqual(game.discard_pile, [top])
+    self.assertEqual(game.deck.size(), 0)
+    self.assertEqual(wild.suit, 'wild')
+    self.assertIn(wild, players[1].hand)
@@ -0,0 +1,219 @@
+import json
+import weakref
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from lobby import PAGE_SIZE, STATUSES, Lobby
+from uno import Card, Game, Play, Player
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+# Views of a game shared by the Flask and the asyncio servers.
+#
+# public_info/player views are dicts, public_info_json/player_json render the
+# same views straight to bytes. With compact=True cards are [ordinal, code]
+# pairs instead of dicts, see Card.as_compact.
+
+# Cards only ever change through the suit given to a wild card, so a card's JSON
+# is keyed by (id, code, compact). Deck card ids are ordinals, which keeps this small.
+MAX_CARD_FRAGMENTS = 1 << 16
+_CARD_FRAGMENTS: Dict[Tuple[str, int, bool], bytes] = {}
+# '{"id":...,"name":...,"color":...' for every player, they never change either.
+_PLAYER_FRAGMENTS = weakref.WeakKeyDictionary()
+
+class MoveError(Exception):
+  # A move the server refuses, status is the HTTP status to answer with.
+  def __init__(self, status: int, message: str) -> None:
+    super().__init__(message)
+    self.status = status
+
+def players_from_request(content: dict, bots: Iterable[str] = ()) -> List[Player]:
+  # Seats with a "bot" are played by that bot, which must be one of bots.
+  if not content['players']:
+    raise ValueError('A game needs at least one player')
+
+  players = []
+  for p in content['players']:
+    bot = p.get('bot')
+    if bot is not None and bot not in bots:
+      raise ValueError(f"Unknown bot {bot}, expected one of {list(bots)}")
+    players.append(Player(p['name'], p['color'], bot=bot))
+
+  return players
+
+def move_request(content) -> dict:
+  # The body of a play or moves request, which must be a JSON object.
+  if not isinstance(content, dict):
+    raise MoveError(400, f"Not a move: {content}")
+
+  return content
+
+def play_from_request(game: Game, player_id: str, move: dict) -> Play:
+  if not isinstance(move, dict):
+    raise MoveError(400, f"Not a move: {move}")
+
+  current_player = game.get_current_player()
+  if player_id != current_player.id:
+    raise MoveError(403, f"It is not {player_id}'s turn")
+
+  card_id = move.get('card_id')
+  card = current_player.hand.get(card_id) if card_id is not None else None
+  if card_id is not None and card is None:
+    raise MoveError(400, f"Card {card_id} not present on player's hand")
+
+  action = move['action']
+  return Play(
+    player = current_player,
+    action = action,
+    card   = card if action == 'play' else None,
+    suit   = move.get('suit') if action == 'play' else None
+  )
+
+def apply_moves(game: Game, player_id: str, moves: List[dict]) -> List[Play]:
+  # All or nothing: if any move is refused the game is put back as it was before
+  # the first one. Each move is read against the state the previous ones left,
+  # so a card drawn by one move can be played by the next.
+  if not isinstance(moves, list) or not moves:
+    raise MoveError(400, 'moves must be a non empty list')
+
+  version, undo_version, undone = game.version, game.undo_version, game.undone
+  plays = []
+  try:
+    for move in moves:
+      play = play_from_request(game, player_id, move)
+      game.progress(play)
+      plays.append(play)
+  except Exception:
+    for _ in plays:
+      game.undo()
+    # Under the game's lock, nobody saw the versions in between: the game is back
+    # at its version as if the batch never came.
+    game.version, game.undo_version, game.undone = version, undo_version, undone
+    raise
+
+  return plays
+
+def public_info(game: Game) -> dict:
+  player_dicts = [p.as_dict() for p in game.players]
+
+  for player_info in player_dicts:
+    player_info['hand_size'] = len(player_info['hand'])
+    del player_info['hand']
+  
+  return {
+    'version': game.version,
+    'finished': game.finished,
+    'started': game.started,
+    'players': player_dicts,
+    'discard_top': game.get_discard_top().as_dict(),
+    'current_player': game.get_current_player().id,
+    'winner_id': game.winner.id if game.winner is not None else None
+  }
+
+def card_view(card: Card, compact: bool = False):
+  return card.as_compact() if compact else card.as_dict()
+
+def public_play(play: Play, version: int, compact: bool = False) -> dict:
+  return {
+    'version': version,
+    'player_id': play.player.id,
+    'action': play.action,
+    'card': card_view(play.card, compact) if play.card is not None else None,
+    'suit': play.suit
+  }
+
+def plays_since(game: Game, since: int, compact: bool = False) -> Optional[dict]:
+  # None when since predates the game start, clients need the full view then.
+  plays = game.plays_since(since)
+  if plays is None:
+    return None
+
+  first_version = game.version - len(plays) + 1
+  return {
+    'version': game.version,
+    'plays': [public_play(play, first_version + i, compact) for i, play in enumerate(plays)]
+  }
+
+def lobby_json(lobby: Lobby, args: Mapping[str, str]) -> bytes:
+  # A page of the lobby for the query arguments: status (comma separated), players,
+  # active_since (unix time), limit and cursor (the previous page's next).
+  # Raises ValueError for arguments that do not parse.
+  statuses = args['status'].split(',') if args.get('status') else STATUSES
+  unknown = set(statuses) - set(STATUSES)
+  if unknown:
+    raise ValueError(f"Unknown status {sorted(unknown)}, expected some of {list(STATUSES)}")
+
+  return json_body(lobby.page(
+    statuses     = statuses,
+    players      = int(args['players']) if args.get('players') else None,
+    active_since = float(args['active_since']) if args.get('active_since') else None,
+    limit        = int(args['limit']) if args.get('limit') else PAGE_SIZE,
+    cursor       = args.get('cursor') or None
+  ))
+
+def json_body(view) -> bytes:
+  if orjson is not None:
+    return orjson.dumps(view)
+
+  return json.dumps(view, separators=(',', ':')).encode()
+
+def card_json(card: Card, compact: bool = False) -> bytes:
+  key = (card.id, card.code, compact)
+  fragment = _CARD_FRAGMENTS.get(key)
+  if fragment is None:
+    if len(_CARD_FRAGMENTS) >= MAX_CARD_FRAGMENTS:
+      _CARD_FRAGMENTS.clear()
+    fragment = json_body(card_view(card, compact))
+    _CARD_FRAGMENTS[key] = fragment
+
+  return fragment
+
+def _player_fragment(player: Player) -> bytes:
+  fragment = _PLAYER_FRAGMENTS.get(player)
+  if fragment is None:
+    # Drops the closing brace, the caller appends the rest of the object.
+    fragment = json_body({'id': player.id, 'name': player.name, 'color': player.color})[:-1]
+    _PLAYER_FRAGMENTS[player] = fragment
+
+  return fragment
+
+def player_json(player: Player, compact: bool = False) -> bytes:
+  # Same as json_body(player.as_dict()), compact hands are lists of [ordinal, code].
+  hand = b','.join([card_json(card, compact) for card in player.hand])
+  return _player_fragment(player) + b',"hand":[' + hand + b']}'
+
+def move_view(play: Play) -> dict:
+  # Shaped like a /play request without its player_id.
+  return {
+    'action': play.action,
+    'card_id': play.card.id if play.card is not None else None,
+    'suit': play.suit
+  }
+
+def legal_moves_json(game: Game, player: Player) -> bytes:
+  return json_body({
+    'version': game.version,
+    'player_id': player.id,
+    'moves': [move_view(play) for play in game.legal_moves(player)]
+  })
+
+def moves_json(public: bytes, player: bytes) -> bytes:
+  # Answer to a batch of moves: the public view and the mover's own view after them.
+  return b'{"status":"ok","game":' + public + b',"player":' + player + b'}'
+
+def public_info_json(game: Game, compact: bool = False) -> bytes:
+  # Same as json_body(public_info(game)), compact only changes discard_top.
+  players = b','.join([_player_fragment(p) + b',"hand_size":%d}' % len(p.hand) for p in game.players])
+  winner = json_body(game.winner.id) if game.winner is not None else b'null'
+  return b''.join([
+    b'{"version":%d' % game.version,
+    b',"finished":', b'true' if game.finished else b'false',
+    b',"started":', b'true' if game.started else b'false',
+    b',"players":[', players,
+    b'],"discard_top":', card_json(game.get_discard_top(), compact),
+    b',"current_player":', json_body(game.get_current_player().id),
+    b',"winner_id":', winner,
+    b'}'
+  ])
@@ -0,0 +1,35 @@
+import json
+import unittest
+
+import views
+from uno import Game, Player
+
+class ViewsTest(unittest.TestCase):
+  def setUp(self):
+    self.game = Game([Player('Player 1', 'red'), Player('Player "2"', 'blue')], seed=1)
+    self.game.start()
+
+  def test_publicInfoJson_sameAsDict(self):
+    self.assertEqual(json.loads(views.public_info_json(self.game)), views.public_info(self.game))
+
+  def test_playerJson_sameAsDict(self):
+    player = self.game.players[1]
+    self.assertEqual(json.loads(views.player_json(player)), player.as_dict())
+
+  def test_compact_cardsAsOrdinalAndCode(self):
+    player = self.game.players[0]
+    hand = json.loads(views.player_json(player, compact=True))['hand']
+    self.assertEqual(hand, [c.as_compact() for c in player.hand])
+
+    top = json.loads(views.public_info_json(self.game, compact=True))['discard_top']
+    self.assertEqual(top, self.game.get_discard_top().as_compact())
+
+  def test_cardJson_followsWildSuit(self):
+    card = self.game.get_discard_top()
+    before = views.card_json(card)
+    card.suit = 'wild' if card.suit != 'wild' else 'red'
+    self.assertNotEqual(views.card_json(card), before)
+    self.assertEqual(json.loads(views.card_json(card)), card.as_dict())
+
+if __name__ == '__main__':
+  unittest.main()
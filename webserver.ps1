@@ -1,2 +1,2 @@
 pip install -r .\requirements_devel.txt -r .\requirements_web.txt
-waitress-serve --listen=*:5000 webserver:app
\ No newline at end of file
+waitress-serve --listen=*:5000 --threads=64 webserver:app
\ No newline at end of file
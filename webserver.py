@@ -1,112 +1,358 @@
+import os
+import pickle
 import sys
-from flask import Flask, request, abort
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Set
+from flask import Flask, Response, request, abort, g
 
-from uno import Game, Play, Player
+import bots
+import journal
+import metrics
+import profiling
+from registry import EvictionPolicy, GameLock, GameRegistry
+from store import open_store
+from uno import Game, Player
+from views import (
+  MoveError, apply_moves, json_body, legal_moves_json, lobby_json, move_request, moves_json,
+  play_from_request, player_json, players_from_request, plays_since, public_info_json
+)
+
+# Seconds a game stays in memory once finished, or without any request.
+FINISHED_GAME_TTL = 10 * 60
+IDLE_GAME_TTL     = 24 * 60 * 60
+MAX_GAMES         = 10000
+# Evicted games are written here, if set, so late requests can still be answered.
+SPILL_DIR         = os.environ.get('PYUNO_SPILL_DIR')
+# If set, games are saved to this store every time they change and loaded from it
+# when not in memory, e.g. sqlite:games.db or shm:/dev/shm/pyuno. See store.open_store.
+STORE             = os.environ.get('PYUNO_STORE')
+# Longest a /wait request is held open before answering with the unchanged state.
+LONG_POLL_TIMEOUT = 30
+# Starts and plays are journaled here, if set, and replayed when the server starts.
+JOURNAL_DIR       = os.environ.get('PYUNO_JOURNAL_DIR')
+# Instrumentation is on unless PYUNO_METRICS=0, it can be switched at runtime with POST /metrics.
+METRICS_ENABLED   = os.environ.get('PYUNO_METRICS', '1') != '0'
+# Profiles of one in every PYUNO_PROFILE_EVERY requests, or of the requests on game
+# PYUNO_PROFILE_GAME, are written here if set. See profiling.py.
+PROFILE_DIR       = os.environ.get('PYUNO_PROFILE_DIR')
+PROFILE_EVERY     = int(os.environ.get('PYUNO_PROFILE_EVERY', profiling.PROFILE_EVERY))
+PROFILE_GAME      = os.environ.get('PYUNO_PROFILE_GAME')
+# Seconds the ismcts bot thinks per move, over this many processes (0 thinks in the bot thread).
+BOT_BUDGET        = float(os.environ.get('PYUNO_BOT_BUDGET', bots.TIME_BUDGET))
+BOT_PROCESSES     = int(os.environ.get('PYUNO_BOT_PROCESSES', 0))
+# Threads playing bot seats, off the request threads.
+BOT_THREADS       = int(os.environ.get('PYUNO_BOT_THREADS', 2))
 
 app = Flask('pyuno')
-GAMES_BY_ID = {}
+GAMES = GameRegistry(policy=EvictionPolicy(
+  finished_ttl = FINISHED_GAME_TTL,
+  idle_ttl     = IDLE_GAME_TTL,
+  max_games    = MAX_GAMES,
+  spill_dir    = SPILL_DIR
+), store=open_store(STORE) if STORE is not None else None, write_through=STORE is not None)
+JOURNAL = None
+PROFILER = profiling.Profiler(PROFILE_DIR, PROFILE_EVERY, PROFILE_GAME) if PROFILE_DIR is not None else None
+BOTS = {
+  'greedy': bots.GreedyBot(),
+  'ismcts': bots.MonteCarloBot(BOT_BUDGET, BOT_PROCESSES)
+}
+BOT_RUNNER = ThreadPoolExecutor(max_workers=BOT_THREADS, thread_name_prefix='pyuno-bots')
+# Games with bot turns being played, at most one runner per game.
+_bot_games: Set[str] = set()
+_bot_games_lock = threading.Lock()
+
+def pickled_games():
+  for game in GAMES.games():
+    try:
+      lock = GAMES.locked(game.id)
+    except KeyError:
+      continue
+
+    with lock as locked:
+      data = pickle.dumps(locked, protocol=pickle.HIGHEST_PROTOCOL)
+    yield game.id, data
+
+def open_journal(directory: str):
+  global JOURNAL
+  for game in journal.replay(directory).values():
+    GAMES.add(game)
+
+  JOURNAL = journal.Journal(directory)
+
+def journal_snapshot():
+  # Called once game locks are released, the snapshot takes every game's lock.
+  if JOURNAL is not None and JOURNAL.needs_snapshot():
+    JOURNAL.snapshot(pickled_games)
+
+def play_bots(game: Game):
+  # Under the game's lock, once a human has moved. The bot seats play in the
+  # background, the request is answered without waiting for them.
+  if not game.started or game.finished or game.get_current_player().bot not in BOTS:
+    return
 
-def get_game(game_id : str) -> Game:
-  if game_id not in GAMES_BY_ID:
+  with _bot_games_lock:
+    if game.id in _bot_games:
+      return
+    _bot_games.add(game.id)
+  BOT_RUNNER.submit(run_bots, game.id)
+
+def run_bots(game_id: str):
+  # One bot turn per hold of the game's lock, so requests on the game go on
+  # between turns, until it is a human's turn again.
+  running = True
+  try:
+    moves = 0
+    while moves < bots.MAX_BOT_MOVES:
+      try:
+        lock = GAMES.locked(game_id)
+      except KeyError:
+        return
+
+      with lock as game:
+        plays = bots.play_bot_turn(game, BOTS)
+        if not plays:
+          # Under the lock: a human moving after this starts the bots again.
+          with _bot_games_lock:
+            _bot_games.discard(game_id)
+          running = False
+          return
+
+        if JOURNAL is not None:
+          for i, play in enumerate(plays):
+            JOURNAL.record_play(game, play, game.version - len(plays) + i + 1)
+      moves += len(plays)
+      journal_snapshot()
+  except Exception as e:
+    print(f"Bots stopped on game {game_id}: {e!r}")
+  finally:
+    if running:
+      with _bot_games_lock:
+        _bot_games.discard(game_id)
+
+def locked_game(game_id : str) -> GameLock:
+  try:
+    return GAMES.locked(game_id)
+  except KeyError:
     abort(404)
-  
-  return GAMES_BY_ID[game_id]
 
-def get_players(request):
-  content = request.json
+@app.before_request
+def start_timer():
+  if metrics.is_enabled():
+    g.request_start = time.perf_counter()
 
-  players = []
-  for player_content in content['players']:
-    players.append(
-      Player(player_content['name'], player_content['color'])
-    )
+  if PROFILER is not None and PROFILER.should_profile((request.view_args or {}).get('game_id')):
+    g.profile = PROFILER.start()
+
+@app.after_request
+def record_request(response: Response) -> Response:
+  # Aborted requests get here too, with their 4xx status.
+  route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+  start = g.pop('request_start', None)
+  if start is not None:
+    metrics.record_request(request.method, route, response.status_code, time.perf_counter() - start)
 
-  return players
+  profile = g.pop('profile', None)
+  if profile is not None:
+    PROFILER.stop(profile, f"{request.method}-{route}")
+
+  return response
 
 @app.route('/')
 def hello():
-  result = {}
-  for game in GAMES_BY_ID.values():
-    result[game.id] = get_game_public_info(game.id)
+  # The lobby, a page of game summaries, see lobby_json for the arguments.
+  try:
+    return json_response(lobby_json(GAMES.lobby, request.args))
+  except ValueError as e:
+    print(e)
+    abort(400)
+
+@app.route('/stats')
+def get_stats():
+  return GAMES.stats()
+
+@app.route('/metrics')
+def get_metrics():
+  return Response(metrics.render(GAMES.games, len(GAMES)), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics', methods = ['POST'])
+def set_metrics():
+  # {"enabled": false} switches instrumentation off, true back on.
+  try:
+    enabled = request.json['enabled']
+  except (KeyError, TypeError) as e:
+    print(f"Refused metrics switch: {e!r}")
+    abort(400)
+
+  if enabled:
+    metrics.enable()
+  else:
+    metrics.disable()
+
+  return {"enabled": metrics.is_enabled()}
+
+@app.route('/profiles')
+def get_profiles():
+  # ?top=<n> slowest functions of uno.py by cumulative time over the kept profiles.
+  if PROFILER is None:
+    abort(404)
 
-  return result
+  return profiling.top_functions(PROFILER.directory, request.args.get('top', 20, type=int))
+
+def compact_requested() -> bool:
+  # ?format=compact sends cards as [ordinal, code] pairs.
+  return request.args.get('format') == 'compact'
+
+def json_response(body: bytes) -> Response:
+  return Response(body, mimetype='application/json')
+
+# Views are rendered once per game version and shared by every request until the game moves.
+def cached_public_info(lock: GameLock, game: Game, compact: bool) -> bytes:
+  return lock.cached(('public', compact), lambda: metrics.time_call(metrics.SERIALIZE, ('public',), public_info_json, game, compact))
+
+def render_player(player: Player, compact: bool) -> bytes:
+  return metrics.time_call(metrics.SERIALIZE, ('player',), player_json, player, compact)
+
+def versioned_response(game: Game, render: Callable[[], bytes]) -> Response:
+  etag = str(game.version)
+  if request.if_none_match.contains(etag):
+    response = Response(status=304)
+  else:
+    response = json_response(render())
+
+  response.set_etag(etag)
+  return response
 
 @app.route('/game/<game_id>')
 def get_game_public_info(game_id):
-  game = get_game(game_id)
-
-  player_dicts = [p.as_dict() for p in game.players]
-
-  for player_info in player_dicts:
-    player_info['hand_size'] = len(player_info['hand'])
-    del player_info['hand']
-  
-  return {
-    'finished': game.finished,
-    'started': game.started,
-    'players': player_dicts,
-    'discard_top': game.get_discard_top().as_dict(),
-    'current_player': game.get_current_player().id,
-    'winner_id': game.winner.id if game.winner is not None else None
-  }
+  lock = locked_game(game_id)
+  with lock as game:
+    # ?since=<version> only sends the plays made after that version. Clients whose
+    # version predates the game start get the full view instead.
+    compact = compact_requested()
+    since = request.args.get('since', type=int)
+    delta = plays_since(game, since, compact) if since is not None else None
+    if delta is not None:
+      return json_response(json_body(delta))
+
+    return versioned_response(game, lambda: cached_public_info(lock, game, compact))
+
+@app.route('/game/<game_id>/wait')
+def wait_game_change(game_id):
+  # Long-poll: answers as soon as the game moves past ?version=, or on timeout.
+  version = request.args.get('version', -1, type=int)
+  timeout = min(request.args.get('timeout', LONG_POLL_TIMEOUT, type=float), LONG_POLL_TIMEOUT)
+
+  lock = locked_game(game_id)
+  with lock as game:
+    lock.wait_for_version(version, timeout)
+    return json_response(cached_public_info(lock, game, compact_requested()))
 
 @app.route('/game/<game_id>/player/<player_id>')
 def get_player_data(game_id, player_id):
-  try:
-    game   = get_game(game_id)
-    player = game.get_player_by_id(player_id)
+  lock = locked_game(game_id)
+  with lock as game:
+    try:
+      player = game.get_player_by_id(player_id)
+    except KeyError:
+      abort(404)
 
-    player_dict = player.as_dict()
+    compact = compact_requested()
+    return versioned_response(game, lambda: lock.cached(('player', player_id, compact), lambda: render_player(player, compact)))
 
-    return player_dict
-  except KeyError:
-    abort(404)
+@app.route('/game/<game_id>/player/<player_id>/moves')
+def get_legal_moves(game_id, player_id):
+  # Every move the player can send to /play right now, none when it is not their turn.
+  lock = locked_game(game_id)
+  with lock as game:
+    try:
+      player = game.get_player_by_id(player_id)
+    except KeyError:
+      abort(404)
+
+    return versioned_response(game, lambda: lock.cached(('moves', player_id), lambda: legal_moves_json(game, player)))
 
 
 @app.route('/game/<game_id>/start', methods = ['POST'])
 def start_game(game_id: str):
-  players = get_players(request)
-  game_existed = True
-  if not game_id in GAMES_BY_ID:
-    GAMES_BY_ID[game_id] = Game(players, game_id)
-    game_existed = False
-  
-  game = get_game(game_id)
+  try:
+    players = players_from_request(request.json, BOTS)
+  except ValueError as e:
+    print(e)
+    abort(400)
 
-  game.start()
+  _, created = GAMES.get_or_create(game_id, lambda: Game(players, game_id))
 
-  return {"status": "ok"} if game_existed else {"status": "created"}
+  with locked_game(game_id) as game:
+    started = not game.started
+    game.start()
+    if started and JOURNAL is not None:
+      JOURNAL.record_start(game)
+    play_bots(game)
+
+  journal_snapshot()
+  return {"status": "created"} if created else {"status": "ok"}
 
 @app.route('/game/<game_id>/play', methods = ['POST'])
 def play(game_id: str):
-  game = get_game(game_id)
-  current_player = game.get_current_player()
-  content = request.json
-  player_cards_by_id = {c.id: c for c in current_player.hand}
-
-  player_id = content['player_id']
-  card_id   = content['card_id']
-  suit      = content['suit']
-
-  if player_id != current_player.id:
-    abort(403)
-  
-  if card_id is not None and not card_id in player_cards_by_id:
-    print(f"Card {card_id} not present on player's hand")
-    abort(400)
-  
-  action = content['action']
-  game.progress(
-    Play(
-      player = current_player,
-      action = action,
-      card   = player_cards_by_id[card_id] if action == 'play' else None,
-      suit   = suit if action == 'play' else None
-    )
-  )
+  with locked_game(game_id) as game:
+    try:
+      content = move_request(request.json)
+      play = play_from_request(game, content['player_id'], content)
+      game.progress(play)
+    except MoveError as e:
+      print(e)
+      abort(e.status)
+    except (KeyError, ValueError) as e:
+      print(f"Refused play: {e}")
+      abort(400)
+
+    if JOURNAL is not None:
+      JOURNAL.record_play(game, play)
+    play_bots(game)
 
+  journal_snapshot()
   return {"status": "ok"}
 
+@app.route('/game/<game_id>/moves', methods = ['POST'])
+def moves(game_id: str):
+  # Several moves of the current player in one go, e.g. draw then pass. Either all
+  # of them are made or none is, the answer holds the public and the player's view.
+  compact = compact_requested()
+  lock = locked_game(game_id)
+  with lock as game:
+    try:
+      content = move_request(request.json)
+      player_id = content['player_id']
+      plays = apply_moves(game, player_id, content['moves'])
+    except MoveError as e:
+      print(e)
+      abort(e.status)
+    except (KeyError, ValueError) as e:
+      print(f"Refused moves: {e}")
+      abort(400)
+
+    if JOURNAL is not None:
+      for i, play in enumerate(plays):
+        JOURNAL.record_play(game, play, game.version - len(plays) + i + 1)
+    play_bots(game)
+
+    player = game.get_player_by_id(player_id)
+    body = moves_json(
+      cached_public_info(lock, game, compact),
+      lock.cached(('player', player_id, compact), lambda: render_player(player, compact))
+    )
+
+  journal_snapshot()
+  return json_response(body)
+
+if JOURNAL_DIR is not None:
+  open_journal(JOURNAL_DIR)
+
+if METRICS_ENABLED:
+  metrics.enable()
+
 if __name__ == '__main__':
   debug_active = len(sys.argv) > 1 and sys.argv[1] == '--debug'
   app.run(debug=debug_active)
\ No newline at end of file
@@ -0,0 +1,211 @@
+import json
+import tempfile
+import unittest
+
+import journal
+import metrics
+import webserver
+from uno import Card
+
+START = {
+  'players': [
+    {'name': 'Player 1', 'color': 'red'},
+    {'name': 'Player 2', 'color': 'blue'}
+  ]
+}
+
+class WebserverTest(unittest.TestCase):
+  def setUp(self):
+    self.client = webserver.app.test_client()
+    webserver.GAMES.remove('test')
+    self.client.post('/game/test/start', json=START)
+
+  def pass_turn(self):
+    player_id = self.client.get('/game/test').json['current_player']
+    return self.client.post('/game/test/play', json={'player_id': player_id, 'action': 'pass', 'card_id': None, 'suit': None})
+
+  def test_start_createsGame(self):
+    response = self.client.get('/game/test')
+
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.json['started'])
+    self.assertEqual([p['hand_size'] for p in response.json['players']], [7, 7])
+
+  def test_unknownGame(self):
+    self.assertEqual(self.client.get('/game/nope').status_code, 404)
+
+  def test_play_wrongPlayer(self):
+    response = self.client.post('/game/test/play', json={'player_id': 'nope', 'action': 'pass', 'card_id': None, 'suit': None})
+    self.assertEqual(response.status_code, 403)
+
+  def test_start_noPlayers(self):
+    response = self.client.post('/game/empty/start', json={'players': []})
+
+    self.assertEqual(response.status_code, 400)
+    self.assertNotIn('empty', webserver.GAMES)
+
+  def test_play_badRequest(self):
+    game = self.client.get('/game/test').json
+    player_id, version = game['current_player'], game['version']
+    wild = Card('wild', 'wild')
+    webserver.GAMES['test'].get_player_by_id(player_id).hand.append(wild)
+
+    missing_player = self.client.post('/game/test/play', json={'action': 'pass', 'card_id': None, 'suit': None})
+    no_suit = self.client.post('/game/test/play', json={'player_id': player_id, 'action': 'play', 'card_id': wild.id, 'suit': None})
+
+    unknown_action = self.client.post('/game/test/play', json={'player_id': player_id, 'action': 'dance'})
+    not_a_dict = self.client.post('/game/test/play', json=[1])
+
+    self.assertEqual(missing_player.status_code, 400)
+    self.assertEqual(no_suit.status_code, 400)
+    self.assertEqual(unknown_action.status_code, 400)
+    self.assertEqual(not_a_dict.status_code, 400)
+    self.assertEqual(self.client.get('/game/test').json['version'], version)
+
+  def test_etag_notModifiedUntilProgress(self):
+    etag = self.client.get('/game/test').headers['ETag']
+
+    self.assertEqual(self.client.get('/game/test', headers={'If-None-Match': etag}).status_code, 304)
+    self.pass_turn()
+    self.assertEqual(self.client.get('/game/test', headers={'If-None-Match': etag}).status_code, 200)
+
+  def test_since_onlyNewPlays(self):
+    version = self.client.get('/game/test').json['version']
+    self.pass_turn()
+    self.pass_turn()
+
+    delta = self.client.get(f"/game/test?since={version}").json
+    self.assertEqual([p['action'] for p in delta['plays']], ['pass', 'pass'])
+    self.assertEqual([p['version'] for p in delta['plays']], [version + 1, version + 2])
+    self.assertEqual(delta['version'], version + 2)
+
+  def test_wait_returnsNewerVersion(self):
+    version = self.client.get('/game/test').json['version']
+    self.pass_turn()
+
+    response = self.client.get(f"/game/test/wait?version={version}")
+    self.assertEqual(response.json['version'], version + 1)
+
+  def test_moves_drawThenPass(self):
+    game = self.client.get('/game/test').json
+    player_id = game['current_player']
+
+    response = self.client.post('/game/test/moves', json={'player_id': player_id, 'moves': [{'action': 'draw'}, {'action': 'pass'}]})
+
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json['game']['version'], game['version'] + 2)
+    self.assertNotEqual(response.json['game']['current_player'], player_id)
+    self.assertEqual(len(response.json['player']['hand']), 8)
+
+  def test_moves_refusedBatchChangesNothing(self):
+    before = self.client.get('/game/test').json
+    player_id = before['current_player']
+
+    response = self.client.post('/game/test/moves', json={'player_id': player_id, 'moves': [{'action': 'draw'}, {'action': 'play', 'card_id': 'nope'}]})
+
+    self.assertEqual(response.status_code, 400)
+    self.assertEqual(self.client.get('/game/test').json, before)
+    self.assertEqual(len(self.client.get(f"/game/test/player/{player_id}").json['hand']), 7)
+
+  def test_moves_badRequest(self):
+    before = self.client.get('/game/test').json
+
+    missing_player = self.client.post('/game/test/moves', json={'moves': [{'action': 'draw'}]})
+    not_a_dict = self.client.post('/game/test/moves', json=[{'action': 'draw'}])
+
+    self.assertEqual(missing_player.status_code, 400)
+    self.assertEqual(not_a_dict.status_code, 400)
+    self.assertEqual(self.client.get('/game/test').json, before)
+
+  def test_legalMoves(self):
+    game = self.client.get('/game/test').json
+    waiting = next(p['id'] for p in game['players'] if p['id'] != game['current_player'])
+
+    moves = self.client.get(f"/game/test/player/{game['current_player']}/moves").json
+
+    self.assertEqual(moves['version'], game['version'])
+    self.assertEqual(moves['moves'][-2:], [{'action': 'draw', 'card_id': None, 'suit': None}, {'action': 'pass', 'card_id': None, 'suit': None}])
+    self.assertEqual(self.client.get(f"/game/test/player/{waiting}/moves").json['moves'], [])
+    self.assertEqual(self.client.get('/game/test/player/nope/moves').status_code, 404)
+
+    response = self.client.post('/game/test/play', json=dict(moves['moves'][0], player_id=game['current_player']))
+    self.assertEqual(response.status_code, 200)
+
+  def test_botSeat_playsAfterHuman(self):
+    webserver.GAMES.remove('bots')
+    start = {'players': [{'name': 'Human', 'color': 'red'}, {'name': 'Bot', 'color': 'blue', 'bot': 'greedy'}]}
+    self.client.post('/game/bots/start', json=start)
+    game = self.client.get('/game/bots').json
+    human = game['players'][0]['id']
+
+    self.client.post('/game/bots/play', json={'player_id': human, 'action': 'pass', 'card_id': None, 'suit': None})
+
+    # The bot plays in the background.
+    game = self.client.get('/game/bots').json
+    for _ in range(10):
+      if game['finished'] or game['current_player'] == human:
+        break
+      game = self.client.get(f"/game/bots/wait?version={game['version']}&timeout=5").json
+    self.assertGreater(game['version'], 2)
+    self.assertTrue(game['finished'] or game['current_player'] == human)
+    self.assertEqual(self.client.post('/game/nobot/start', json={'players': [{'name': 'Bot', 'color': 'blue', 'bot': 'nope'}]}).status_code, 400)
+
+  def test_compactFormat(self):
+    game = self.client.get('/game/test?format=compact').json
+    player = self.client.get(f"/game/test/player/{game['current_player']}?format=compact").json
+
+    self.assertEqual(len(game['discard_top']), 2)
+    self.assertTrue(all(isinstance(card, list) for card in player['hand']))
+    self.assertEqual(len(player['hand']), 7)
+
+  def test_metrics(self):
+    self.pass_turn()
+    body = self.client.get('/metrics').data.decode()
+
+    self.assertIn('pyuno_active_games ', body)
+    self.assertIn('pyuno_game_progress_seconds_count{action="pass"}', body)
+    self.assertIn('pyuno_http_responses_total{method="GET",route="/game/<game_id>",status="200"}', body)
+
+  def test_metrics_switchedOff(self):
+    try:
+      self.assertEqual(self.client.post('/metrics', json={'enabled': False}).json, {'enabled': False})
+      self.assertIn('pyuno_metrics_enabled 0', self.client.get('/metrics').data.decode())
+    finally:
+      self.client.post('/metrics', json={'enabled': True})
+
+  def test_metrics_badSwitch(self):
+    self.assertEqual(self.client.post('/metrics', json={}).status_code, 400)
+    self.assertEqual(self.client.post('/metrics', json=[True]).status_code, 400)
+    self.assertTrue(metrics.is_enabled())
+
+  def test_lobby(self):
+    self.pass_turn()
+    body = json.loads(self.client.get('/?status=started&players=2').data)
+
+    self.assertEqual(body['games'][0]['id'], 'test')
+    self.assertEqual(body['games'][0]['version'], 2)
+    self.assertNotIn('test', [g['id'] for g in json.loads(self.client.get('/?status=waiting,finished').data)['games']])
+    self.assertEqual(self.client.get('/?status=nope').status_code, 400)
+
+class JournalTest(unittest.TestCase):
+  def test_journaledGamesAreReplayed(self):
+    client = webserver.app.test_client()
+    with tempfile.TemporaryDirectory() as directory:
+      webserver.JOURNAL = journal.Journal(directory)
+      try:
+        webserver.GAMES.remove('journaled')
+        client.post('/game/journaled/start', json=START)
+        for _ in range(3):
+          player_id = client.get('/game/journaled').json['current_player']
+          client.post('/game/journaled/play', json={'player_id': player_id, 'action': 'draw', 'card_id': None, 'suit': None})
+        player_id = client.get('/game/journaled').json['current_player']
+        client.post('/game/journaled/moves', json={'player_id': player_id, 'moves': [{'action': 'draw'}, {'action': 'pass'}]})
+        webserver.JOURNAL.close()
+      finally:
+        webserver.JOURNAL = None
+
+      game = webserver.GAMES['journaled']
+      replayed = journal.replay(directory)['journaled']
+
+      self.assertEqual(replayed.version, game.version)
+      self.assertEqual([[c.id for c in p.hand] for p in replayed.players], [[c.id for c in p.hand] for p in game.players])